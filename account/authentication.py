@@ -0,0 +1,93 @@
+from django.core import signing
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BasicAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from account.cache import (
+    cache_token,
+    cache_user,
+    cache_verified_basic_credentials,
+    get_cached_token,
+    get_cached_user,
+    get_verified_basic_credentials,
+)
+from account.models import User
+from account.tokens import accepts_token, is_signed_token, verify_token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that keeps tokens and users in the auth caches,
+    so a cached request runs no query before the view.
+
+    Deleted tokens and saved or deleted users are invalidated by the signal
+    handlers in ``account.signals``. Unknown keys are not cached.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = get_cached_token(key)
+        user = get_cached_user(cached[0]) if cached is not None else None
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache_token(token)
+            cache_user(user)
+            return user, token
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+        token = Token(key=key, user=user, created=cached[1])
+        token._state.adding = False
+        token._state.db = user._state.db
+        return user, token
+
+
+class SignedTokenAuthentication(CachedTokenAuthentication):
+    """Accepts the token formats allowed by ``AUTH_TOKEN_FORMAT``: signed
+    tokens are verified without a query once their user is cached, database
+    tokens go through ``CachedTokenAuthentication``.
+    """
+
+    def authenticate_credentials(self, key):
+        if not accepts_token(key):
+            raise AuthenticationFailed(_("Invalid token."))
+        if not is_signed_token(key):
+            return super().authenticate_credentials(key)
+        try:
+            user = verify_token(key)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed(_("Token expired."))
+        except signing.BadSignature:
+            raise AuthenticationFailed(_("Invalid token."))
+        return user, key
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """``BasicAuthentication`` that hashes a password once per
+    ``AUTH_BASIC_CACHE_TTL`` instead of on every request.
+
+    A cached entry only stands while the user's username and password hash
+    are unchanged, so a password change invalidates it.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        verified = get_verified_basic_credentials(userid, password)
+        if verified is not None:
+            user_id, password_hash = verified
+            user = get_cached_user(user_id)
+            if user is None:
+                user = User.objects.filter(pk=user_id).first()
+                if user is not None:
+                    cache_user(user)
+            if (
+                user is not None
+                and user.password == password_hash
+                and user.get_username() == userid
+            ):
+                if not user.is_active:
+                    raise AuthenticationFailed(_("User inactive or deleted."))
+                return user, None
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        cache_verified_basic_credentials(userid, password, user)
+        cache_user(user)
+        return user, auth
@@ -0,0 +1,307 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import oss2
+import requests
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from account.models import Social
+from dependency.http_client import HttpClient
+from dependency.oss_storage import get_oss_manager
+
+logger = logging.getLogger(__name__)
+
+AVATAR_SUBDIRECTORY = "wechat-avatar"
+# Square thumbnails rendered at ingest time: variant -> edge in pixels.
+AVATAR_VARIANTS = {"small": 64, "medium": 160, "large": 480}
+# Variant stored in Social.avatar_url, for clients that ignore avatar_variants.
+AVATAR_DEFAULT_VARIANT = "medium"
+# Refuse to decode larger images, whatever their file size.
+AVATAR_MAX_PIXELS = 25_000_000
+
+
+class AvatarRejected(Exception):
+    """The remote avatar can never be ingested, retrying will not help."""
+
+
+_download_client = None
+_download_client_lock = threading.Lock()
+
+
+def get_download_client():
+    # Separate from the API client: ingest_avatar retries whole downloads
+    # itself, so the transport must not retry on top of that.
+    global _download_client
+    if _download_client is None:
+        with _download_client_lock:
+            if _download_client is None:
+                _download_client = HttpClient(
+                    retries=0, pool_maxsize=settings.AVATAR_INGEST_WORKERS
+                )
+    return _download_client
+
+
+def download_avatar(url, timeout=None, max_bytes=None):
+    """Download an image, giving up after ``timeout`` seconds in total or
+    past ``max_bytes``.
+
+    :return: the image bytes
+    :raise AvatarRejected: for client errors, non-images and oversized files
+    :raise requests.RequestException: for errors worth retrying
+    """
+    timeout = timeout or settings.AVATAR_DOWNLOAD_TIMEOUT
+    max_bytes = max_bytes or settings.AVATAR_MAX_BYTES
+    deadline = time.monotonic() + timeout
+    response = get_download_client().get(url, stream=True, timeout=(timeout, timeout))
+    with response:
+        if 400 <= response.status_code < 500:
+            raise AvatarRejected(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if content_type and not content_type.startswith("image/"):
+            raise AvatarRejected(f"Not an image: {content_type}")
+        if int(response.headers.get("Content-Length") or 0) > max_bytes:
+            raise AvatarRejected("Avatar too large")
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=8192):
+            content += chunk
+            if len(content) > max_bytes:
+                raise AvatarRejected("Avatar too large")
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"Download took more than {timeout}s")
+    return bytes(content)
+
+
+def render_avatar_variants(content, webp=None):
+    """Render the square ``AVATAR_VARIANTS`` thumbnails of an image, as
+    progressive JPEG and, with ``webp`` (default ``AVATAR_WEBP``), WebP.
+
+    :return: {variant name: (bytes, content type, extension)}, WebP variants
+        are named "<variant>_webp"
+    :raise AvatarRejected: when ``content`` is not a decodable image
+    """
+    webp = settings.AVATAR_WEBP if webp is None else webp
+    try:
+        image = Image.open(io.BytesIO(content))
+        if image.width * image.height > AVATAR_MAX_PIXELS:
+            raise AvatarRejected("Avatar too large")
+        # Lets JPEG decode at a reduced scale, much cheaper than full size.
+        edge = max(AVATAR_VARIANTS.values())
+        image.draft("RGB", (edge, edge))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+        variants = {}
+        for name, edge in AVATAR_VARIANTS.items():
+            # Truncated images only fail here, when the pixels are decoded.
+            thumbnail = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            thumbnail.save(output, "JPEG", quality=85, optimize=True, progressive=True)
+            variants[name] = (output.getvalue(), "image/jpeg", "jpg")
+            if webp:
+                output = io.BytesIO()
+                thumbnail.save(output, "WEBP", quality=80, method=4)
+                variants[f"{name}_webp"] = (output.getvalue(), "image/webp", "webp")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise AvatarRejected(f"Not an image: {exc}"[:255])
+    return variants
+
+
+def store_avatar_variants(user_id, content):
+    """Render and upload the variants of an avatar under deterministic keys
+    ``<user id>/<content digest>/<variant>.<ext>``, so the same image is
+    stored once and its objects can be cached forever.
+
+    :return: {variant name: object key}
+    """
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    manager = get_oss_manager(AVATAR_SUBDIRECTORY)
+    return {
+        name: manager.upload_object(
+            f"{user_id}/{digest}/{name.split('_')[0]}.{extension}",
+            data,
+            content_type=content_type,
+            immutable=True,
+        )
+        for name, (data, content_type, extension) in render_avatar_variants(
+            content
+        ).items()
+    }
+
+
+def _pending(user_id, url):
+    return Social.objects.filter(
+        user_id=user_id, application_type="mp", avatar_pending_url=url
+    )
+
+
+def _record_failure(user_id, url, attempts, exc, give_up=False):
+    """Count failed attempts. The avatar stays pending for
+    retry_avatar_ingestion until ``AVATAR_INGEST_MAX_ATTEMPTS``, or not at all
+    with ``give_up``.
+    """
+    max_attempts = settings.AVATAR_INGEST_MAX_ATTEMPTS
+    _pending(user_id, url).update(
+        avatar_pending_url=(
+            None
+            if give_up
+            else Case(
+                When(avatar_attempts__gte=max_attempts - attempts, then=Value(None)),
+                default=F("avatar_pending_url"),
+            )
+        ),
+        avatar_attempts=F("avatar_attempts") + attempts,
+        avatar_error=str(exc)[:255],
+        updated_at=timezone.now(),
+    )
+
+
+def ingest_avatar(user_id, url):
+    """Store the variants of the avatar at ``url`` in OSS and point the user's
+    WeChat accounts at them, retrying transient errors
+    ``AVATAR_INGEST_RETRIES`` times.
+
+    Rows whose pending avatar changed in the meantime are left to the newer
+    ingestion. Every failed attempt is counted, unexpected errors included,
+    which are then raised.
+
+    :return: True if the avatar was stored
+    """
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            variants = store_avatar_variants(user_id, download_avatar(url))
+        except AvatarRejected as exc:
+            _record_failure(user_id, url, attempts, exc, give_up=True)
+            return False
+        except (requests.RequestException, oss2.exceptions.OssError) as exc:
+            if attempts <= settings.AVATAR_INGEST_RETRIES:
+                time.sleep(settings.AVATAR_INGEST_RETRY_DELAY * 2 ** (attempts - 1))
+                continue
+            logger.warning("Failed to ingest the avatar of user %s: %s", user_id, exc)
+            _record_failure(user_id, url, attempts, exc)
+            return False
+        except Exception as exc:
+            _record_failure(user_id, url, attempts, exc)
+            raise
+        _pending(user_id, url).update(
+            avatar_url=variants[AVATAR_DEFAULT_VARIANT],
+            avatar_variants=variants,
+            avatar_pending_url=None,
+            avatar_attempts=F("avatar_attempts") + attempts,
+            avatar_error=None,
+            updated_at=timezone.now(),
+        )
+        return True
+
+
+def pending_avatars(updated_before, max_attempts, limit=None):
+    """:return: [(user_id, url)] of the avatars still waiting for ingestion,
+    oldest first
+    """
+    pending = (
+        Social.objects.filter(
+            avatar_pending_url__isnull=False,
+            updated_at__lt=updated_before,
+            avatar_attempts__lt=max_attempts,
+        )
+        .order_by("updated_at")
+        .values_list("user_id", "avatar_pending_url")
+    )
+    return list(dict.fromkeys(pending[:limit] if limit else pending))
+
+
+class AvatarIngestor:
+    """Runs ``ingest_avatar`` on a pool of ``max_workers`` threads.
+
+    At most ``max_pending`` avatars wait or run at once; past that ``submit``
+    refuses and the avatar stays pending for ``retry_avatar_ingestion``.
+    """
+
+    def __init__(self, max_workers=4, max_pending=100):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Started lazily in the gunicorn worker that receives the request.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="avatar-ingest"
+                )
+            return self._executor
+
+    def submit(self, user_id, url):
+        """:return: a future, or None when the pool is full"""
+        if not self._slots.acquire(blocking=False):
+            logger.warning(
+                "Avatar ingestion backlog full, user %s left pending", user_id
+            )
+            return None
+        try:
+            future = self._get_executor().submit(self._run, user_id, url)
+        except Exception:
+            self._slots.release()
+            raise
+        return future
+
+    def _run(self, user_id, url):
+        close_old_connections()
+        try:
+            return ingest_avatar(user_id, url)
+        except Exception:
+            logger.exception("Avatar ingestion of user %s crashed", user_id)
+            return False
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
+
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+
+def get_avatar_ingestor():
+    global _ingestor
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                _ingestor = AvatarIngestor(
+                    max_workers=settings.AVATAR_INGEST_WORKERS,
+                    max_pending=settings.AVATAR_INGEST_MAX_PENDING,
+                )
+    return _ingestor
+
+
+def request_avatar_ingestion(user, url):
+    """Record ``url`` as the pending avatar of the user's WeChat accounts and
+    ingest it in the background once the current transaction commits.
+    """
+    Social.objects.filter(user=user, application_type="mp").update(
+        avatar_pending_url=url,
+        avatar_attempts=0,
+        avatar_error=None,
+        updated_at=timezone.now(),
+    )
+    user_id = user.pk
+    transaction.on_commit(lambda: get_avatar_ingestor().submit(user_id, url))
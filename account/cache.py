@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+
+from account.models import User
+from utils.cache import LRUCache, TieredCache, is_shared_cache
+
+# Part of every shared key. Bump it when the layout of a cached payload
+# changes; user payloads are also keyed by their field names, so adding or
+# removing a User field needs no bump.
+CACHE_SCHEMA_VERSION = 2
+
+_caches = {}
+_caches_lock = threading.Lock()
+_basic_cache = None
+_password_cache = None
+
+
+def _shared_ttl():
+    # A per-process "shared" tier would outlive invalidations made by other
+    # workers, so it is only used with a cache that all of them see.
+    if not is_shared_cache(settings.AUTH_CACHE_ALIAS):
+        return 0
+    return settings.AUTH_CACHE_SHARED_TTL
+
+
+def _tiered_cache(name):
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = _caches[name] = TieredCache(
+                    f"auth:v{CACHE_SCHEMA_VERSION}:{name}",
+                    max_size=settings.AUTH_CACHE_SIZE,
+                    local_ttl=settings.AUTH_CACHE_LOCAL_TTL,
+                    shared_ttl=_shared_ttl(),
+                    alias=settings.AUTH_CACHE_ALIAS,
+                )
+    return cache
+
+
+def _token_cache_key(key):
+    # Token keys are credentials, never store them in clear in a shared cache.
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@functools.cache
+def _user_fields():
+    # The password hash is never written to the shared tier, see
+    # _password_hashes.
+    return [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+@functools.cache
+def _user_schema():
+    return hashlib.sha256(",".join(_user_fields()).encode()).hexdigest()[:8]
+
+
+def _user_cache_key(user_id):
+    return f"{_user_schema()}:{user_id}"
+
+
+def _password_hashes():
+    """In-process only cache of the password hashes of the cached users."""
+    global _password_cache
+    if _password_cache is None:
+        with _caches_lock:
+            if _password_cache is None:
+                _password_cache = LRUCache(
+                    settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_LOCAL_TTL
+                )
+    return _password_cache
+
+
+def get_cached_token(key):
+    """:return: (user_id, created) of the token, or None if not cached"""
+    return _tiered_cache("token").get(_token_cache_key(key))
+
+
+def cache_token(token):
+    _tiered_cache("token").set(
+        _token_cache_key(token.key), (token.user_id, token.created)
+    )
+
+
+def invalidate_token(key):
+    transaction.on_commit(lambda: _tiered_cache("token").delete(_token_cache_key(key)))
+
+
+def get_cached_user(user_id):
+    """:return: a fresh User instance built from the cache, or None. Its
+    password is deferred unless this process cached the user itself.
+    """
+    values = _tiered_cache("user").get(_user_cache_key(user_id))
+    if values is None:
+        return None
+    user = User.from_db(DEFAULT_DB_ALIAS, _user_fields(), values)
+    password = _password_hashes().get(str(user_id))
+    if password is not None:
+        user.password = password
+    return user
+
+
+def cache_user(user):
+    _tiered_cache("user").set(
+        _user_cache_key(user.pk),
+        tuple(getattr(user, name) for name in _user_fields()),
+    )
+    # Not user.password, which would load a deferred password.
+    password = user.__dict__.get("password")
+    if password:
+        _password_hashes().set(str(user.pk), password)
+
+
+def _delete_user(user_id):
+    _tiered_cache("user").delete(_user_cache_key(user_id))
+    _password_hashes().delete(str(user_id))
+
+
+def invalidate_user(user_id):
+    """Forget the cached user once the current transaction commits, so a
+    concurrent request can not cache the old row again in between.
+    ``invalidate_token`` works the same way.
+    """
+    transaction.on_commit(lambda: _delete_user(user_id))
+
+
+def _basic_credentials_cache():
+    global _basic_cache
+    if _basic_cache is None:
+        with _caches_lock:
+            if _basic_cache is None:
+                _basic_cache = LRUCache(
+                    settings.AUTH_BASIC_CACHE_SIZE, settings.AUTH_BASIC_CACHE_TTL
+                )
+    return _basic_cache
+
+
+def _basic_cache_key(username, password):
+    # Keyed with SECRET_KEY, so the cache holds no usable password digest.
+    return salted_hmac(
+        "account.cache.basic", f"{username}\0{password}", algorithm="sha256"
+    ).digest()
+
+
+def get_verified_basic_credentials(username, password):
+    """:return: (user_id, password hash) of credentials verified recently by
+    this process, or None
+    """
+    return _basic_credentials_cache().get(_basic_cache_key(username, password))
+
+
+def cache_verified_basic_credentials(username, password, user):
+    """Remember that ``password`` matched ``user``'s current password hash.
+    Only kept in process, never in the shared cache.
+    """
+    _basic_credentials_cache().set(
+        _basic_cache_key(username, password), (user.pk, user.password)
+    )
+
+
+def clear_auth_caches():
+    """Clear the local tiers, e.g. between tests."""
+    for cache in _caches.values():
+        cache.clear()
+    if _basic_cache is not None:
+        _basic_cache.clear()
+    if _password_cache is not None:
+        _password_cache.clear()
+
+
+@receiver(setting_changed)
+def _reset_auth_caches(setting, **kwargs):
+    """Rebuild the caches with new settings, e.g. ``override_settings``."""
+    global _basic_cache, _password_cache
+    if setting == "CACHES" or setting.startswith("AUTH_"):
+        with _caches_lock:
+            _caches.clear()
+            _basic_cache = _password_cache = None
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from dependency.http_client import HttpClient
+from utils.benchmark import format_ms, percentile
+from utils.stub_upstream import StubUpstream
+
+
+class Command(BaseCommand):
+    help = (
+        "Call a local stub upstream from concurrent threads, as gunicorn "
+        "threads calling WeChat would: one new connection per call without "
+        "timeouts vs the pooled client, against a healthy and a slow upstream."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--delay", type=float, default=0.02)
+        parser.add_argument("--slow-delay", type=float, default=1.0)
+        parser.add_argument("--read-timeout", type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        with StubUpstream(payload={"openid": "bench"}) as upstream:
+            for scenario, delay in (
+                ("healthy", options["delay"]),
+                ("slow", options["slow_delay"]),
+            ):
+                upstream.delay = delay
+                client = HttpClient(
+                    read_timeout=options["read_timeout"],
+                    retries=0,
+                    pool_maxsize=options["concurrency"],
+                )
+                callers = [
+                    ("new connection", lambda url: requests.get(url)),
+                    ("pooled client", client.get),
+                ]
+                for name, call in callers:
+                    upstream.reset()
+                    self.run_caller(upstream, scenario, name, call, options)
+                client.close()
+
+    def run_caller(self, upstream, scenario, name, call, options):
+        def timed_call(_):
+            t0 = time.perf_counter()
+            try:
+                call(upstream.url).json()
+                ok = True
+            except requests.RequestException:
+                ok = False
+            return ok, time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            results = list(executor.map(timed_call, range(options["requests"])))
+        elapsed = time.perf_counter() - t0
+        latencies = [latency for _, latency in results]
+        failed = sum(1 for ok, _ in results if not ok)
+        self.stdout.write(
+            f"{scenario:>7} {name:>14}: {len(results) / elapsed:8.1f} calls/s "
+            f"failed={failed} upstream_calls={upstream.requests} "
+            f"connections={len(upstream.connections)} "
+            f"p50={format_ms(percentile(latencies, 50))} "
+            f"p99={format_ms(percentile(latencies, 99))}"
+        )
@@ -0,0 +1,125 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from account.avatars import AVATAR_SUBDIRECTORY, render_avatar_variants
+from dependency.oss_storage import OSSManager
+from dependency.storage import (
+    STORAGE_LOCAL,
+    STORAGE_MEMORY,
+    InMemoryBackend,
+    LocalFileSystemBackend,
+)
+from utils.benchmark import format_ms, percentile
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Storage throughput without network: write and read objects of "
+        "several sizes (streamed, multipart above the threshold) on the "
+        "in-memory and local filesystem backends, then run the avatar "
+        "thumbnail pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backends",
+            nargs="+",
+            choices=[STORAGE_MEMORY, STORAGE_LOCAL],
+            default=[STORAGE_MEMORY, STORAGE_LOCAL],
+        )
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[16 * 1024, 32 * 1024 * 1024]
+        )
+        parser.add_argument("--objects", type=int, default=32)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--avatars", type=int, default=40)
+
+    def handle(self, *args, **options):
+        root = tempfile.mkdtemp(prefix="wristcheck-storage-")
+        kwargs = dict(
+            multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD,
+            part_size=settings.STORAGE_PART_SIZE,
+        )
+        try:
+            for name in options["backends"]:
+                if name == STORAGE_LOCAL:
+                    backend = LocalFileSystemBackend(root, **kwargs)
+                else:
+                    backend = InMemoryBackend(**kwargs)
+                for size in options["sizes"]:
+                    self.run_objects(name, backend, size, options)
+                self.run_avatars(name, backend, options)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def run_parallel(self, func, count, concurrency):
+        def timed(index):
+            t0 = time.perf_counter()
+            func(index)
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            latencies = list(executor.map(timed, range(count)))
+        return time.perf_counter() - t0, latencies
+
+    def run_objects(self, name, backend, size, options):
+        payload = os.urandom(size)
+
+        def stream():
+            for start in range(0, size, STREAM_CHUNK_SIZE):
+                yield payload[start : start + STREAM_CHUNK_SIZE]
+
+        def write(index):
+            backend.put(f"bench/{size}/{index}", stream())
+
+        def read(index):
+            for _ in backend.iter_chunks(f"bench/{size}/{index}"):
+                pass
+
+        count = options["objects"]
+        for operation, func in (("write", write), ("read", read)):
+            elapsed, latencies = self.run_parallel(func, count, options["concurrency"])
+            self.stdout.write(
+                f"{name:>6} {operation:>5} {size:>10}B: "
+                f"{count * size / elapsed / 1024 / 1024:9.1f} MB/s "
+                f"{count / elapsed:8.1f} ops/s "
+                f"p50={format_ms(percentile(latencies, 50))} "
+                f"p99={format_ms(percentile(latencies, 99))}"
+            )
+        for index in range(count):
+            backend.delete(f"bench/{size}/{index}")
+
+    def run_avatars(self, name, backend, options):
+        output = io.BytesIO()
+        Image.effect_noise((1280, 1280), 64).convert("RGB").save(output, "JPEG")
+        original = output.getvalue()
+        manager = OSSManager(subdirectory=AVATAR_SUBDIRECTORY, backend=backend)
+
+        def ingest(index):
+            for variant, (data, content_type, extension) in render_avatar_variants(
+                original
+            ).items():
+                manager.upload_object(
+                    f"bench/{index}/{variant}.{extension}", data, content_type
+                )
+
+        elapsed, latencies = self.run_parallel(
+            ingest, options["avatars"], options["concurrency"]
+        )
+        self.stdout.write(
+            f"{name:>6} avatar {len(original):>9}B: "
+            f"{options['avatars'] / elapsed:8.1f} avatars/s "
+            f"p50={format_ms(percentile(latencies, 50))} "
+            f"p99={format_ms(percentile(latencies, 99))}"
+        )
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from account.avatars import ingest_avatar, pending_avatars
+
+
+def _ingest(args):
+    close_old_connections()
+    try:
+        return ingest_avatar(*args)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingest the WeChat avatars still pending, e.g. after failed attempts, "
+        "a full backlog or a worker restart."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=300,
+            help="Only avatars pending for that many seconds, to skip in-flight ones.",
+        )
+        parser.add_argument(
+            "--max-attempts", type=int, default=settings.AVATAR_INGEST_MAX_ATTEMPTS
+        )
+        parser.add_argument("--limit", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=settings.AVATAR_INGEST_WORKERS
+        )
+
+    def handle(self, *args, **options):
+        pending = pending_avatars(
+            timezone.now() - timedelta(seconds=options["older_than"]),
+            options["max_attempts"],
+            options["limit"],
+        )
+        with ThreadPoolExecutor(options["workers"]) as executor:
+            stored = sum(executor.map(_ingest, pending))
+        self.stdout.write(f"Ingested {stored} of {len(pending)} pending avatar(s).")
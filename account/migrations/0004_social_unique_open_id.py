@@ -0,0 +1,61 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:22
+from functools import reduce
+from operator import or_
+
+from django.db import migrations, models, transaction
+
+DEDUPE_BATCH_SIZE = 1000
+
+
+def dedupe_socials(apps, schema_editor):
+    """Keep the oldest Social of every (application_type, open_id), the one
+    login used to pick, and delete the others one batch of groups at a time.
+    """
+    Social = apps.get_model("account", "Social")
+    db = schema_editor.connection.alias
+    duplicates = (
+        Social.objects.using(db)
+        .values("application_type", "open_id")
+        .annotate(keep=models.Min("id"), rows=models.Count("id"))
+        .filter(rows__gt=1)
+        .order_by("keep")
+    )
+    last_keep = 0
+    while True:
+        batch = list(duplicates.filter(keep__gt=last_keep)[:DEDUPE_BATCH_SIZE])
+        if not batch:
+            return
+        last_keep = batch[-1]["keep"]
+        lookup = reduce(
+            or_,
+            (
+                models.Q(
+                    application_type=group["application_type"],
+                    open_id=group["open_id"],
+                )
+                & ~models.Q(id=group["keep"])
+                for group in batch
+            ),
+        )
+        with transaction.atomic(using=db):
+            Social.objects.using(db).filter(lookup).delete()
+
+
+class Migration(migrations.Migration):
+    # Commit every batch on its own instead of holding one long transaction.
+    atomic = False
+
+    dependencies = [
+        ("account", "0003_user_token_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_socials, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="social",
+            constraint=models.UniqueConstraint(
+                fields=("application_type", "open_id"),
+                name="account_social_unique_open_id",
+            ),
+        ),
+    ]
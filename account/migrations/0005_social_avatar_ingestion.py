@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0004_social_unique_open_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="social",
+            name="avatar_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="social",
+            name="avatar_error",
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="social",
+            name="avatar_pending_url",
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="social",
+            index=models.Index(
+                condition=models.Q(("avatar_pending_url__isnull", False)),
+                fields=["updated_at"],
+                name="account_social_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("account", "0005_social_avatar_ingestion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="social",
+            name="avatar_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -9,6 +9,7 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.db import models
+from django.utils import timezone
 
 
 class UserManager(BaseUserManager):
@@ -56,12 +57,20 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(null=True, blank=True)
+    # Signed access tokens carry this counter; bumping it revokes them all.
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
 
+    class Meta:
+        indexes = [
+            # Admin user list, ordered by -last_login by default.
+            models.Index(fields=["last_login"], name="account_user_last_login_idx"),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -73,9 +82,31 @@ class User(AbstractBaseUser, PermissionsMixin):
             raise ValidationError("A user with this email already exists.")
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.full_clean()
+        elif update_fields:
+            # Only validate what is written, e.g. no uniqueness queries when
+            # just last_login changes.
+            update_fields = set(update_fields)
+            exclude = {
+                field.name
+                for field in self._meta.concrete_fields
+                if field.name not in update_fields
+                and field.attname not in update_fields
+            }
+            self.clean_fields(exclude=exclude)
+            if "email" in update_fields:
+                self.clean()
+            self.validate_unique(exclude=exclude)
+            self.validate_constraints(exclude=exclude)
         super(User, self).save(*args, **kwargs)
 
+    def touch_last_login(self, when=None):
+        """Set last_login with a single UPDATE, without validation or signals."""
+        self.last_login = when or timezone.now()
+        User.objects.filter(pk=self.pk).update(last_login=self.last_login)
+
 
 class Social(TimestampedModel):
     user = models.ForeignKey(
@@ -85,6 +116,30 @@ class Social(TimestampedModel):
     open_id = models.CharField(max_length=255, null=False, blank=False)
     nickname = models.CharField(max_length=100, blank=True, null=True)
     avatar_url = models.CharField(max_length=255, blank=True, null=True)
+    # Remote avatar waiting to be copied to OSS by account.avatars.
+    avatar_pending_url = models.CharField(max_length=1024, blank=True, null=True)
+    avatar_attempts = models.PositiveSmallIntegerField(default=0)
+    avatar_error = models.CharField(max_length=255, blank=True, null=True)
+    # Thumbnail object keys by variant, see account.avatars.AVATAR_VARIANTS.
+    avatar_variants = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # retry_avatar_ingestion only looks at pending avatars.
+            models.Index(
+                fields=["updated_at"],
+                name="account_social_pending_idx",
+                condition=models.Q(avatar_pending_url__isnull=False),
+            ),
+        ]
+        constraints = [
+            # Backs the login lookup and stops concurrent first logins from
+            # creating the same WeChat account twice.
+            models.UniqueConstraint(
+                fields=["application_type", "open_id"],
+                name="account_social_unique_open_id",
+            ),
+        ]
 
     def __str__(self):
         return f"open_id:{self.open_id}"
@@ -8,6 +8,7 @@ from account.serializers.serializers import (
     LoginValidateErrorSerializer,
     WechatLoginValidateErrorSerializer,
     LoginResponseSerializer,
+    RefreshTokenRequestSerializer,
     WechatProfilePostSerializer,
 )
 from utils.schemas import (
@@ -91,6 +92,44 @@ wechat_mini_login_schema_info = dict(
         status.HTTP_500_INTERNAL_SERVER_ERROR: response_schema(
             status.HTTP_500_INTERNAL_SERVER_ERROR, ErrorResponseSerializer
         ),
+        status.HTTP_503_SERVICE_UNAVAILABLE: response_schema(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            ErrorResponseSerializer,
+            description="WeChat or the WristCheck API did not answer in time.",
+        ),
+    },
+)
+
+refresh_token_schema_info = dict(
+    tags=["user"],
+    summary="refresh_token",
+    description="Exchange a signed token, expired or not, for a new one "
+    "until AUTH_SIGNED_TOKEN_REFRESH_TTL after the login it descends from.",
+    request=RefreshTokenRequestSerializer,
+    responses={
+        status.HTTP_200_OK: response_schema(
+            status.HTTP_200_OK, LoginResponseSerializer, many=False
+        ),
+        status.HTTP_400_BAD_REQUEST: response_schema(
+            status.HTTP_400_BAD_REQUEST, ErrorResponseSerializer
+        ),
+        status.HTTP_401_UNAUTHORIZED: response_schema(
+            status.HTTP_401_UNAUTHORIZED, ErrorResponseSerializer
+        ),
+    },
+)
+
+revoke_tokens_schema_info = dict(
+    tags=["user"],
+    summary="revoke_tokens",
+    description="**PERMISSION**: Allows access only to authenticated users.<br>"
+    "Revoke every token of the current user, signed or not.",
+    request=None,
+    responses={
+        status.HTTP_204_NO_CONTENT: response_schema(status.HTTP_204_NO_CONTENT, None),
+        status.HTTP_401_UNAUTHORIZED: response_schema(
+            status.HTTP_401_UNAUTHORIZED, ErrorResponseSerializer
+        ),
     },
 )
 
@@ -1,21 +1,27 @@
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from account.models import Social, User
-from wristcheck_api.settings import env
+from utils.urls import static_url
 
 
 class SocialSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Social
-        fields = "__all__"
+        exclude = ["avatar_attempts", "avatar_error"]
 
     @staticmethod
     def get_avatar_url(obj):
-        if obj.avatar_url:
-            return f'{env.str("STATIC_DOMAIN")}/{obj.avatar_url}'
-        return None
+        return static_url(obj.avatar_url)
+
+    @staticmethod
+    @extend_schema_field(serializers.DictField(child=serializers.URLField()))
+    def get_avatar_variants(obj):
+        """URLs of the avatar thumbnails by variant, e.g. "small", "small_webp"."""
+        return {name: static_url(key) for name, key in obj.avatar_variants.items()}
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -23,4 +29,4 @@ class UserSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        exclude = ["password"]
+        exclude = ["password", "token_version"]
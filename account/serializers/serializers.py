@@ -9,6 +9,13 @@ class LoginRequestSerializer(serializers.Serializer):
 
 class LoginResponseSerializer(serializers.Serializer):
     token = serializers.CharField()
+    expires_at = serializers.DateTimeField(
+        allow_null=True, required=False, help_text="Null for non-expiring tokens."
+    )
+
+
+class RefreshTokenRequestSerializer(serializers.Serializer):
+    token = serializers.CharField(required=True)
 
 
 class LoginValidateErrorSerializer(serializers.Serializer):
@@ -1,13 +1,62 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
 import uuid
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch, MagicMock
 
 import pytest
+import requests
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from factory import Faker
 from factory.django import DjangoModelFactory
-from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
 
+from account.avatars import (
+    AVATAR_VARIANTS,
+    AvatarIngestor,
+    ingest_avatar,
+    render_avatar_variants,
+)
+from account.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from account.cache import CACHE_SCHEMA_VERSION, _user_cache_key, clear_auth_caches
+from account.tokens import (
+    TOKEN_FORMAT_BOTH,
+    TOKEN_FORMAT_DB,
+    TOKEN_FORMAT_SIGNED,
+    is_signed_token,
+    sign_token,
+)
 from account.models import User, Social
+from account.serializers.model import SocialSerializer
+from dependency.http_client import CircuitOpenError, HttpClient
+from dependency.oss_storage import OSSManager
+from dependency.storage import (
+    CACHE_FOREVER,
+    InMemoryBackend,
+    LocalFileSystemBackend,
+    ObjectNotFound,
+    OSSBackend,
+    StorageBackend,
+)
+from utils.stub_upstream import StubUpstream
 
 
 # Factory to create test users
@@ -102,6 +151,38 @@ class TestUserListView:
             for user in response.data["results"]
         )
 
+    def test_user_list_query_count_does_not_grow_with_page_size(self):
+        for user in UserFactory.create_batch(20):
+            Social.objects.create(user=user, open_id=f"open-id-{user.pk}")
+        self.client.force_authenticate(self.admin_user)
+
+        def count_queries(page_size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    "/user/", {"page_size": page_size}, secure=True
+                )
+            assert len(response.data["results"]) == page_size
+            return queries
+
+        few, many = count_queries(2), count_queries(20)
+        assert len(few) == len(many)
+        user_query = next(
+            query["sql"]
+            for query in many
+            if '"account_user"."username"' in query["sql"]
+        )
+        assert '"password"' not in user_query
+        assert '"token_version"' not in user_query
+
+    def test_user_profile_reuses_authenticated_user(self, django_assert_num_queries):
+        Social.objects.create(user=self.normal_user, open_id="open-id")
+        self.client.force_authenticate(self.normal_user)
+        # social accounts, groups and permissions; the user row is not read again
+        with django_assert_num_queries(3):
+            response = self.client.get("/user/profile/", secure=True)
+        assert response.data["id"] == str(self.normal_user.id)
+        assert len(response.data["social_accounts"]) == 1
+
     def test_user_profile_authenticated(self):
         # Prepare authenticated request
         self.client.login(username=self.admin_user.username, password="password")
@@ -202,20 +283,20 @@ class TestUserAuthEndpoints:
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
         assert response.data["detail"] == "Invalid credentials"
 
-    @patch("account.utils.signinup.requests.post")
-    @patch("account.views.requests.get")
-    def test_wechat_mini_login_success(self, mock_requests_get, mock_requests_post):
-        # Mock requests.get to return mocked data
-        mock_requests_get.return_value.json.return_value = {
+    @patch("account.utils.signinup.get_http_client")
+    @patch("account.views.get_http_client")
+    def test_wechat_mini_login_success(self, mock_views_client, mock_signinup_client):
+        # Mock the WeChat call to return mocked data
+        mock_views_client.return_value.get.return_value.json.return_value = {
             "session_key": "session_key",
             "openid": "openid",
         }
 
-        # Mock requests.post to return mocked data
+        # Mock the signinup call to return mocked data
         mock_response_post = MagicMock()
         mock_response_post.status_code = 201
         mock_response_post.json.return_value = {"user": {"id": str(uuid.uuid4())}}
-        mock_requests_post.return_value = mock_response_post
+        mock_signinup_client.return_value.post.return_value = mock_response_post
 
         # Make wechat_mini_login request
         response = self.client.post(
@@ -225,6 +306,9 @@ class TestUserAuthEndpoints:
         # Assert response
         assert response.status_code == status.HTTP_200_OK
         assert "token" in response.data
+        # The one-time js_code must not be retried.
+        wechat_call = mock_views_client.return_value.get.call_args
+        assert wechat_call.kwargs["idempotent"] is False
 
     def test_wechat_mini_login_missing_code(self):
         # Make wechat_mini_login request without code
@@ -234,10 +318,10 @@ class TestUserAuthEndpoints:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert response.data["code"][0] == "This field is required."
 
-    @patch("account.views.requests.get")
-    def test_wechat_mini_login_failure(self, mock_requests_get):
-        # Mock requests.get to return empty data
-        mock_requests_get.return_value.json.return_value = {}
+    @patch("account.views.get_http_client")
+    def test_wechat_mini_login_failure(self, mock_views_client):
+        # Mock the WeChat call to return empty data
+        mock_views_client.return_value.get.return_value.json.return_value = {}
 
         # Make wechat_mini_login request
         response = self.client.post(
@@ -248,6 +332,81 @@ class TestUserAuthEndpoints:
         assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
         assert response.data["detail"] == "Can not get wechat openid"
 
+    @patch("account.views.get_http_client")
+    def test_wechat_mini_login_upstream_unavailable(self, mock_views_client):
+        mock_views_client.return_value.get.side_effect = CircuitOpenError("open")
+
+        response = self.client.post(
+            "/user/wechat_mini_login/", {"code": "mocked_code"}, secure=True
+        )
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.data["detail"] == "WeChat is unavailable"
+
+
+class TestHttpClient:
+    def test_reuses_connections_per_host(self):
+        client = HttpClient(retries=0)
+        with StubUpstream(payload={"openid": "openid"}) as upstream:
+            for _ in range(5):
+                assert client.get(upstream.url).json() == {"openid": "openid"}
+            client.close()
+        assert upstream.requests == 5
+        assert len(upstream.connections) == 1
+
+    def test_read_timeout(self):
+        client = HttpClient(read_timeout=0.05, retries=0)
+        with StubUpstream(delay=0.5) as upstream:
+            with pytest.raises(requests.RequestException, match="Read timed out"):
+                client.get(upstream.url)
+            client.close()
+
+    def test_retries_idempotent_server_errors(self):
+        client = HttpClient(retries=2, backoff_factor=0)
+        with StubUpstream(status=503) as upstream:
+            assert client.get(upstream.url).status_code == 503
+            assert upstream.requests == 3
+            upstream.reset()
+            assert client.post(upstream.url, json={}).status_code == 503
+            assert upstream.requests == 1
+            upstream.reset()
+            assert client.get(upstream.url, idempotent=False).status_code == 503
+            assert upstream.requests == 1
+            client.close()
+
+    def test_circuit_breaker(self):
+        client = HttpClient(
+            retries=0, failure_threshold=2, reset_timeout=0.1, read_timeout=1
+        )
+        with StubUpstream(status=500) as upstream:
+            client.get(upstream.url)
+            client.get(upstream.url)
+            with pytest.raises(CircuitOpenError):
+                client.get(upstream.url)
+            assert upstream.requests == 2
+
+            time.sleep(0.15)
+            upstream.status = 200
+            assert client.get(upstream.url).status_code == 200
+            assert not client.breaker(upstream.url).is_open
+            client.close()
+
+    def test_circuit_breaker_trial_ends_on_unexpected_errors(self):
+        client = HttpClient(retries=0, failure_threshold=1, reset_timeout=0.05)
+        with StubUpstream(status=500) as upstream:
+            client.get(upstream.url)
+            time.sleep(0.1)
+            with patch(
+                "requests.Session.request", side_effect=ValueError("unexpected")
+            ):
+                with pytest.raises(ValueError):
+                    client.get(upstream.url)
+
+            time.sleep(0.1)
+            upstream.status = 200
+            assert client.get(upstream.url).status_code == 200
+            client.close()
+
 
 @pytest.mark.django_db
 class TestWechatProfile:
@@ -274,13 +433,593 @@ class TestWechatProfile:
         response = self.client.post("/user/wechat_profile/", {}, secure=True)
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
-    @patch("dependency.oss_storage.OSSManager.stream_upload_avatar_from_url")
-    def test_wechat_profile_success(self, mock_stream_upload):
-        mock_stream_upload.return_value = {"object_key": "mocked_object_key"}
+    @patch("account.avatars.get_avatar_ingestor")
+    def test_wechat_profile_success(
+        self, mock_get_ingestor, django_capture_on_commit_callbacks
+    ):
         self.client.login(username=self.wechat_user.username, password="password")
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self.client.post(
+                "/user/wechat_profile/",
+                {"nickname": "nickname", "avatar_url": "avatar_url"},
+                secure=True,
+            )
+        assert response.status_code == status.HTTP_200_OK
+        self.social.refresh_from_db()
+        assert self.social.nickname == "nickname"
+        assert self.social.avatar_pending_url == "avatar_url"
+        mock_get_ingestor.return_value.submit.assert_called_once_with(
+            self.wechat_user.pk, "avatar_url"
+        )
+
+
+@pytest.mark.django_db
+class TestAvatarIngestion:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.AVATAR_INGEST_RETRIES = 1
+        settings.AVATAR_INGEST_RETRY_DELAY = 0
+        self.user = UserFactory()
+        self.social = Social.objects.create(user=self.user, open_id="open_id")
+        self.image = jpeg_bytes(1000, 600)
+        self.upstream = StubUpstream(payload=self.image, content_type="image/jpeg")
+        self.upstream.start()
+        self.url = f"{self.upstream.url}/avatar.jpg"
+        Social.objects.filter(pk=self.social.pk).update(avatar_pending_url=self.url)
+        self.storage = InMemoryBackend()
+        manager = OSSManager(subdirectory="wechat-avatar", backend=self.storage)
+        with patch("account.avatars.get_oss_manager", return_value=manager):
+            yield
+        self.upstream.stop()
+
+    def test_ingest(self):
+        assert ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        digest = hashlib.sha256(self.image).hexdigest()[:16]
+        prefix = f"wechat-avatar/{self.user.pk}/{digest}"
+        assert self.social.avatar_variants == {
+            name: f"{prefix}/{name}.jpg" for name in AVATAR_VARIANTS
+        }
+        assert set(self.storage.objects) == set(self.social.avatar_variants.values())
+        assert self.storage.headers[f"{prefix}/small.jpg"] == {
+            "Content-Type": "image/jpeg",
+            "Cache-Control": CACHE_FOREVER,
+        }
+        assert self.social.avatar_url == f"{prefix}/medium.jpg"
+        assert self.social.avatar_pending_url is None
+        assert self.social.avatar_attempts == 1
+
+    def test_not_an_image_is_rejected(self):
+        self.upstream.payload = b"\xff\xd8 not really a jpeg"
+        assert not ingest_avatar(self.user.pk, self.url)
+        assert not self.storage.objects
+        self.social.refresh_from_db()
+        assert self.social.avatar_pending_url is None
+        assert self.social.avatar_error.startswith("Not an image")
+
+    def test_variant_urls(self, settings):
+        settings.STATIC_DOMAIN = "https://static.example.com"
+        ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        data = SocialSerializer(self.social).data
+        assert data["avatar_url"] == (
+            f"https://static.example.com/{self.social.avatar_url}"
+        )
+        assert data["avatar_variants"]["small"].endswith("/small.jpg")
+        assert "avatar_error" not in data
+
+    def test_oversized_avatar_is_rejected(self, settings):
+        settings.AVATAR_MAX_BYTES = 4
+        assert not ingest_avatar(self.user.pk, self.url)
+        assert not self.storage.objects
+        self.social.refresh_from_db()
+        assert self.social.avatar_pending_url is None
+        assert self.social.avatar_error == "Avatar too large"
+
+    def test_slow_upstream_is_retried_then_left_pending(self, settings):
+        settings.AVATAR_DOWNLOAD_TIMEOUT = 0.05
+        self.upstream.delay = 0.5
+        assert not ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        assert self.social.avatar_pending_url == self.url
+        assert self.social.avatar_attempts == 2
+        assert self.upstream.requests == 2
+
+    def test_truncated_image_is_rejected(self):
+        self.upstream.payload = self.image[: len(self.image) // 2]
+        assert not ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        assert self.social.avatar_pending_url is None
+        assert self.social.avatar_error.startswith("Not an image")
+
+    def test_unexpected_errors_count_until_given_up(self, settings):
+        settings.AVATAR_INGEST_MAX_ATTEMPTS = 2
+        with patch(
+            "account.avatars.store_avatar_variants", side_effect=RuntimeError("bug")
+        ):
+            with pytest.raises(RuntimeError):
+                ingest_avatar(self.user.pk, self.url)
+            self.social.refresh_from_db()
+            assert self.social.avatar_attempts == 1
+            assert self.social.avatar_pending_url == self.url
+
+            with pytest.raises(RuntimeError):
+                ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        assert self.social.avatar_attempts == 2
+        assert self.social.avatar_pending_url is None
+        assert self.social.avatar_error == "bug"
+
+    def test_newer_avatar_is_not_overwritten(self):
+        Social.objects.filter(pk=self.social.pk).update(avatar_pending_url="newer")
+        ingest_avatar(self.user.pk, self.url)
+        self.social.refresh_from_db()
+        assert self.social.avatar_url is None
+        assert self.social.avatar_pending_url == "newer"
+
+    def test_retry_command(self):
+        Social.objects.filter(pk=self.social.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        with patch(
+            "account.management.commands.retry_avatar_ingestion.ingest_avatar",
+            return_value=True,
+        ) as ingest:
+            call_command("retry_avatar_ingestion", stdout=StringIO())
+        ingest.assert_called_once_with(self.user.pk, self.url)
+
+
+@pytest.fixture(params=["memory", "local"])
+def storage_backend(request, tmp_path):
+    kwargs = dict(multipart_threshold=100, part_size=64)
+    if request.param == "local":
+        return LocalFileSystemBackend(tmp_path, **kwargs)
+    return InMemoryBackend(**kwargs)
+
+
+class TestStorageBackends:
+    def test_put_and_read(self, storage_backend):
+        assert storage_backend.put("a/small", b"small") == 5
+        assert storage_backend.get("a/small") == b"small"
+        assert storage_backend.exists("a/small")
+        storage_backend.delete("a/small")
+        assert not storage_backend.exists("a/small")
+        with pytest.raises(ObjectNotFound):
+            storage_backend.get("a/small")
+
+    def test_multipart(self, storage_backend):
+        content = os.urandom(1000)
+        with patch.object(
+            storage_backend, "_upload_part", wraps=storage_backend._upload_part
+        ) as upload_part:
+            assert storage_backend.put("large", content) == 1000
+        assert upload_part.call_count == 16
+        assert storage_backend.get("large") == content
+
+        stream = (content[i : i + 7] for i in range(0, 1000, 7))
+        assert storage_backend.put("streamed", stream) == 1000
+        assert b"".join(storage_backend.iter_chunks("streamed", 100)) == content
+
+    def test_failed_stream_is_aborted(self, storage_backend):
+        def stream():
+            yield b"x" * 200
+            raise requests.ConnectionError("upstream went away")
+
+        with pytest.raises(requests.ConnectionError):
+            storage_backend.put("broken", stream())
+        assert not storage_backend.exists("broken")
+
+    def test_incomplete_backend_can_not_be_created(self):
+        class WriteOnlyBackend(StorageBackend):
+            def _put(self, key, content, headers):
+                pass
+
+        with pytest.raises(TypeError, match="abstract"):
+            WriteOnlyBackend()
+
+    def test_local_keys_stay_under_root(self, tmp_path):
+        backend = LocalFileSystemBackend(tmp_path / "root")
+        with pytest.raises(ValueError):
+            backend.put("../escape", b"data")
+
+    @patch("dependency.storage.oss2.Bucket")
+    def test_oss_multipart(self, bucket_class):
+        bucket = bucket_class.return_value
+        bucket.init_multipart_upload.return_value.upload_id = "upload"
+        bucket.upload_part.side_effect = lambda key, upload_id, number, data: (
+            MagicMock(etag=f"etag-{number}")
+        )
+        backend = OSSBackend(
+            "id", "secret", "endpoint", "bucket", multipart_threshold=100, part_size=64
+        )
+        backend.put("small", b"small", content_type="image/jpeg")
+        bucket.put_object.assert_called_once_with(
+            "small", b"small", headers={"Content-Type": "image/jpeg"}
+        )
+
+        backend.put("large", b"x" * 150)
+        assert bucket.upload_part.call_count == 3
+        key, upload_id, parts = bucket.complete_multipart_upload.call_args.args
+        assert (key, upload_id) == ("large", "upload")
+        assert [(part.part_number, part.etag) for part in parts] == [
+            (1, "etag-1"),
+            (2, "etag-2"),
+            (3, "etag-3"),
+        ]
+
+
+def jpeg_bytes(width, height):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, "JPEG")
+    return output.getvalue()
+
+
+def test_render_avatar_variants():
+    variants = render_avatar_variants(jpeg_bytes(1000, 600), webp=True)
+    assert set(variants) == set(AVATAR_VARIANTS) | {
+        f"{name}_webp" for name in AVATAR_VARIANTS
+    }
+    for name, edge in AVATAR_VARIANTS.items():
+        data, content_type, extension = variants[name]
+        assert (content_type, extension) == ("image/jpeg", "jpg")
+        assert Image.open(io.BytesIO(data)).size == (edge, edge)
+        data, content_type, extension = variants[f"{name}_webp"]
+        assert (content_type, extension) == ("image/webp", "webp")
+        assert Image.open(io.BytesIO(data)).format == "WEBP"
+
+
+def test_avatar_ingestor_bounds_pending_work():
+    release = threading.Event()
+    ingestor = AvatarIngestor(max_workers=1, max_pending=1)
+    with patch(
+        "account.avatars.ingest_avatar", side_effect=lambda *args: release.wait()
+    ):
+        first = ingestor.submit("user", "url")
+        assert ingestor.submit("user", "other") is None
+        release.set()
+        assert first.result(timeout=5)
+        assert ingestor.submit("user", "other").result(timeout=5)
+    ingestor.shutdown()
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        clear_auth_caches()
+        self.user = UserFactory()
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        request = APIRequestFactory().get(
+            "/user/profile/", HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+        return self.authentication.authenticate(request)
+
+    def test_cached_requests_run_no_query(self, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            user, token = self.authenticate()
+        with django_assert_num_queries(0):
+            cached_user, cached_token = self.authenticate()
+        assert cached_user == user and cached_user is not user
+        assert cached_user.username == self.user.username
+        assert cached_token.key == token.key
+
+    def test_deleted_token_is_invalidated(self, django_capture_on_commit_callbacks):
+        self.authenticate()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.token.delete()
+        with pytest.raises(AuthenticationFailed, match="Invalid token"):
+            self.authenticate()
+
+    def test_deactivated_user_is_invalidated(self, django_capture_on_commit_callbacks):
+        self.authenticate()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with pytest.raises(AuthenticationFailed, match="User inactive or deleted"):
+            self.authenticate()
+
+    @pytest.fixture
+    def shared_tier(self, settings, shared_cache):
+        settings.AUTH_CACHE_ALIAS = "shared"
+        settings.AUTH_CACHE_SHARED_TTL = 60
+        return shared_cache
+
+    def test_shared_tier_is_off_by_default(self, settings, django_assert_num_queries):
+        # Not even when a TTL is set, as long as the cache is per process.
+        settings.AUTH_CACHE_SHARED_TTL = 60
+        self.authenticate()
+        clear_auth_caches()  # what another worker would start with
+        with django_assert_num_queries(1):
+            self.authenticate()
+
+    def test_shared_tier_serves_other_processes(
+        self, shared_tier, django_assert_num_queries
+    ):
+        self.authenticate()
+        clear_auth_caches()  # what another worker would start with
+        with django_assert_num_queries(0):
+            user, _ = self.authenticate()
+        assert user.pk == self.user.pk
+
+    def test_shared_tier_is_invalidated_for_other_processes(
+        self, shared_tier, django_capture_on_commit_callbacks
+    ):
+        self.authenticate()
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        clear_auth_caches()  # what another worker would start with
+        with pytest.raises(AuthenticationFailed, match="User inactive or deleted"):
+            self.authenticate()
+
+    def test_shared_tier_holds_no_password_hash(self, shared_tier):
+        self.user.set_password("password")
+        self.user.save()
+        user, _ = self.authenticate()
+        assert user.password == self.user.password
+        shared = shared_tier.get(
+            f"auth:v{CACHE_SCHEMA_VERSION}:user:{_user_cache_key(self.user.pk)}"
+        )
+        assert shared is not None and self.user.password not in shared
+
+        clear_auth_caches()  # what another worker would start with
+        user, _ = self.authenticate()
+        assert "password" in user.get_deferred_fields()
+
+    def test_default_authentication(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        response = client.get("/user/profile/", secure=True)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["username"] == self.user.username
+
+
+@pytest.mark.django_db
+class TestSignedTokens:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.AUTH_TOKEN_FORMAT = TOKEN_FORMAT_BOTH
+        cache.clear()
+        clear_auth_caches()
+        self.client = APIClient()
+        self.user = UserFactory()
+        self.user.set_password("password")
+        self.user.save()
+
+    def login(self):
         response = self.client.post(
-            "/user/wechat_profile/",
-            {"nickname": "nickname", "avatar_url": "avatar_url"},
+            "/user/login/",
+            {"username": self.user.username, "password": "password"},
             secure=True,
         )
         assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    def profile(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        return self.client.get("/user/profile/", secure=True)
+
+    def issued_ago(self, seconds):
+        with patch("django.core.signing.time.time", return_value=time.time() - seconds):
+            return sign_token(self.user)[0]
+
+    def test_login_issues_signed_token(self, django_assert_num_queries):
+        data = self.login()
+        assert is_signed_token(data["token"])
+        assert data["expires_at"] is not None
+        assert not Token.objects.filter(user=self.user).exists()
+
+        assert self.profile(data["token"]).status_code == status.HTTP_200_OK
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Token {data['token']}"
+        )
+        with django_assert_num_queries(0):
+            user, _ = SignedTokenAuthentication().authenticate(request)
+        assert user.pk == self.user.pk
+
+    def test_token_formats(self):
+        db_token = Token.objects.create(user=self.user).key
+        signed_token = self.login()["token"]
+        assert self.profile(db_token).status_code == status.HTTP_200_OK
+        with override_settings(AUTH_TOKEN_FORMAT=TOKEN_FORMAT_SIGNED):
+            assert self.profile(db_token).status_code == status.HTTP_401_UNAUTHORIZED
+            assert self.profile(signed_token).status_code == status.HTTP_200_OK
+        with override_settings(AUTH_TOKEN_FORMAT=TOKEN_FORMAT_DB):
+            assert (
+                self.profile(signed_token).status_code == status.HTTP_401_UNAUTHORIZED
+            )
+            assert self.login()["expires_at"] is None
+
+    def test_tampered_token(self):
+        token = self.login()["token"]
+        response = self.profile(token[:-2] + ("AA" if token[-2:] != "AA" else "BB"))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.data["detail"] == "Invalid token."
+
+    def test_expired_token_can_be_refreshed(self):
+        token = self.issued_ago(settings.AUTH_SIGNED_TOKEN_TTL + 60)
+        response = self.profile(token)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.data["detail"] == "Token expired."
+
+        self.client.credentials()
+        response = self.client.post(
+            "/user/refresh_token/", {"token": token}, secure=True
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert self.profile(response.data["token"]).status_code == status.HTTP_200_OK
+
+        token = self.issued_ago(settings.AUTH_SIGNED_TOKEN_REFRESH_TTL + 60)
+        self.client.credentials()
+        response = self.client.post(
+            "/user/refresh_token/", {"token": token}, secure=True
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_refreshing_does_not_extend_the_login(self):
+        logged_in_at = int(time.time()) - settings.AUTH_SIGNED_TOKEN_REFRESH_TTL + 60
+        token, _ = sign_token(self.user, logged_in_at)
+        response = self.client.post(
+            "/user/refresh_token/", {"token": token}, secure=True
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        with patch("account.tokens.time.time", return_value=time.time() + 120):
+            response = self.client.post(
+                "/user/refresh_token/", {"token": response.data["token"]}, secure=True
+            )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoke_tokens(self, django_capture_on_commit_callbacks):
+        token = self.login()["token"]
+        db_token = Token.objects.create(user=self.user).key
+        assert self.profile(token).status_code == status.HTTP_200_OK
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self.client.post("/user/revoke_tokens/", secure=True)
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert self.profile(token).status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.profile(db_token).status_code == status.HTTP_401_UNAUTHORIZED
+        self.client.credentials()
+        response = self.client.post(
+            "/user/refresh_token/", {"token": token}, secure=True
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestCachedBasicAuthentication:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        cache.clear()
+        clear_auth_caches()
+        self.client = APIClient()
+        self.user = UserFactory()
+        self.user.set_password("password")
+        self.user.save()
+
+    def profile(self, password):
+        credentials = base64.b64encode(
+            f"{self.user.username}:{password}".encode()
+        ).decode()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Basic {credentials}")
+        return self.client.get("/user/profile/", secure=True)
+
+    def test_password_is_hashed_once(self):
+        with patch(
+            "django.contrib.auth.base_user.check_password", wraps=check_password
+        ) as hasher:
+            for _ in range(3):
+                assert self.profile("password").status_code == status.HTTP_200_OK
+            assert self.profile("wrong").status_code == status.HTTP_401_UNAUTHORIZED
+        assert hasher.call_count == 2
+
+    def test_password_change_invalidates(self, django_capture_on_commit_callbacks):
+        assert self.profile("password").status_code == status.HTTP_200_OK
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.set_password("changed")
+            self.user.save()
+        assert self.profile("password").status_code == status.HTTP_401_UNAUTHORIZED
+        assert self.profile("changed").status_code == status.HTTP_200_OK
+
+    def test_token_challenge_comes_first(self):
+        response = self.client.get("/user/profile/", secure=True)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response["WWW-Authenticate"] == "Token"
+
+
+@pytest.mark.django_db
+class TestUserSave:
+    def test_update_fields_only_validates_changed_fields(
+        self, django_assert_num_queries
+    ):
+        user = UserFactory()
+        user.last_login = timezone.now()
+        with django_assert_num_queries(1):
+            user.save(update_fields=["last_login"])
+
+    def test_update_fields_still_validates_email(self):
+        other = UserFactory()
+        user = UserFactory()
+        user.email = other.email
+        with pytest.raises(ValidationError):
+            user.save(update_fields=["email"])
+
+    def test_touch_last_login(self, django_assert_num_queries):
+        user = UserFactory(last_login=None)
+        with django_assert_num_queries(1):
+            user.touch_last_login()
+        user.refresh_from_db()
+        assert user.last_login is not None
+
+    @patch("account.views.get_http_client")
+    def test_wechat_login_of_existing_user(self, mock_views_client):
+        user = UserFactory(last_login=None)
+        Social.objects.create(user=user, open_id="openid")
+        mock_views_client.return_value.get.return_value.json.return_value = {
+            "session_key": "session_key",
+            "openid": "openid",
+        }
+
+        response = APIClient().post(
+            "/user/wechat_mini_login/", {"code": "mocked_code"}, secure=True
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        user.refresh_from_db()
+        assert user.last_login is not None
+
+
+@pytest.mark.django_db
+@patch("account.views.get_http_client")
+def test_wechat_login_resolves_user_in_one_query(mock_views_client):
+    user = UserFactory()
+    Social.objects.create(user=user, open_id="openid")
+    mock_views_client.return_value.get.return_value.json.return_value = {
+        "session_key": "session_key",
+        "openid": "openid",
+    }
+
+    with CaptureQueriesContext(connection) as queries:
+        response = APIClient().post(
+            "/user/wechat_mini_login/", {"code": "mocked_code"}, secure=True
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    selects = [
+        query["sql"]
+        for query in queries.captured_queries
+        if query["sql"].startswith("SELECT")
+        and ('"account_social"' in query["sql"] or '"account_user"' in query["sql"])
+    ]
+    assert len(selects) == 1
+    assert "JOIN" in selects[0]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_social_dedupe_migration():
+    before = [("account", "0003_user_token_version")]
+    executor = MigrationExecutor(connection)
+    after = executor.loader.graph.leaf_nodes("account")
+    executor.migrate(before)
+    apps = executor.loader.project_state(before).apps
+    HistoricalUser = apps.get_model("account", "User")
+    HistoricalSocial = apps.get_model("account", "Social")
+    user = HistoricalUser.objects.create(id=uuid.uuid4(), username="dedupe")
+    kept = HistoricalSocial.objects.create(user=user, open_id="duplicate")
+    HistoricalSocial.objects.create(user=user, open_id="duplicate")
+    HistoricalSocial.objects.create(user=user, open_id="duplicate")
+    other = HistoricalSocial.objects.create(
+        user=user, open_id="duplicate", application_type="web"
+    )
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(after)
+
+    assert sorted(
+        Social.objects.filter(open_id="duplicate").values_list("id", flat=True)
+    ) == [kept.id, other.id]
@@ -0,0 +1,124 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from account.cache import cache_user, get_cached_user, invalidate_user
+from account.models import User
+
+# AUTH_TOKEN_FORMAT values:
+# "db" issues and accepts rest_framework.authtoken tokens only,
+# "signed" issues and accepts signed tokens only,
+# "both" issues signed tokens and accepts both, while clients migrate.
+TOKEN_FORMAT_DB = "db"
+TOKEN_FORMAT_SIGNED = "signed"
+TOKEN_FORMAT_BOTH = "both"
+
+SIGNED_TOKEN_SALT = "account.tokens.access"
+
+
+def _signer():
+    return signing.TimestampSigner(salt=SIGNED_TOKEN_SALT)
+
+
+def is_signed_token(key):
+    # Database tokens are 40 hex characters, signed ones contain separators.
+    return ":" in key
+
+
+def issues_signed_tokens():
+    return settings.AUTH_TOKEN_FORMAT != TOKEN_FORMAT_DB
+
+
+def accepts_token(key):
+    if is_signed_token(key):
+        return settings.AUTH_TOKEN_FORMAT != TOKEN_FORMAT_DB
+    return settings.AUTH_TOKEN_FORMAT != TOKEN_FORMAT_SIGNED
+
+
+def sign_token(user, logged_in_at=None):
+    """:return: (token, expires_at) of a signed access token for ``user``
+
+    The token is an HMAC (``SECRET_KEY``) over the user id, the issue time,
+    the user's ``token_version`` and the time of the login it descends from.
+
+    :param logged_in_at: Unix time of that login, defaults to now; refreshed
+        tokens carry it over so refreshes can not extend a login forever
+    """
+    if logged_in_at is None:
+        logged_in_at = int(time.time())
+    token = _signer().sign_object(
+        {"u": str(user.pk), "v": user.token_version, "o": logged_in_at}
+    )
+    return token, timezone.now() + timedelta(seconds=settings.AUTH_SIGNED_TOKEN_TTL)
+
+
+def issue_token(user):
+    """:return: {"token", "expires_at"} in the configured format;
+    ``expires_at`` is None for database tokens, which do not expire.
+    """
+    if issues_signed_tokens():
+        token, expires_at = sign_token(user)
+        return {"token": token, "expires_at": expires_at}
+    token, _ = Token.objects.get_or_create(user=user)
+    return {"token": token.key, "expires_at": None}
+
+
+def verify_token(token, max_age=None):
+    """Check a signed token and load its user, from the auth cache when possible.
+
+    :param max_age: seconds, defaults to ``AUTH_SIGNED_TOKEN_TTL``
+    :return: the user
+    :raise signing.BadSignature: when the token is malformed, tampered with,
+        expired (``signing.SignatureExpired``), revoked or its user is gone
+        or inactive
+    """
+    return _verify_token(token, max_age)[0]
+
+
+def _verify_token(token, max_age=None):
+    if max_age is None:
+        max_age = settings.AUTH_SIGNED_TOKEN_TTL
+    payload = _signer().unsign_object(token, max_age=max_age)
+    user_id, version = payload.get("u"), payload.get("v")
+    user = get_cached_user(user_id)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is None:
+            raise signing.BadSignature("Unknown user")
+        cache_user(user)
+    if user.token_version != version:
+        raise signing.BadSignature("Revoked token")
+    if not user.is_active:
+        raise signing.BadSignature("Inactive user")
+    return user, payload
+
+
+def refresh_token(token):
+    """Exchange a signed token for a new one. Tokens can be refreshed, expired
+    or not, until ``AUTH_SIGNED_TOKEN_REFRESH_TTL`` seconds after the login
+    they descend from, unless they were revoked.
+
+    :return: (user, {"token", "expires_at"})
+    :raise signing.BadSignature: see ``verify_token``
+    """
+    user, payload = _verify_token(token, max_age=settings.AUTH_SIGNED_TOKEN_REFRESH_TTL)
+    # Tokens issued before logins were recorded start their window now.
+    logged_in_at = payload.get("o", int(time.time()))
+    if time.time() - logged_in_at > settings.AUTH_SIGNED_TOKEN_REFRESH_TTL:
+        raise signing.SignatureExpired("Login too old to refresh")
+    token, expires_at = sign_token(user, logged_in_at)
+    return user, {"token": token, "expires_at": expires_at}
+
+
+def revoke_tokens(user):
+    """Invalidate every token of ``user``, signed or not."""
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(token_version=F("token_version") + 1)
+        Token.objects.filter(user=user).delete()
+        invalidate_user(user.pk)
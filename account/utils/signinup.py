@@ -1,5 +1,4 @@
-import requests
-import json
+from dependency.http_client import get_http_client
 from wristcheck_api.settings import env
 
 
@@ -52,9 +51,7 @@ def wristcheck_signinup(open_id, session_key):
         "oAuthTokens": {"openId": open_id, "source": "mp", "session_key": session_key},
     }
 
-    headers = {"Content-Type": "application/json"}
-
-    response = requests.post(url, data=json.dumps(payload), headers=headers)
+    response = get_http_client().post(url, json=payload)
 
     if 200 <= response.status_code < 300:
         return response.json()
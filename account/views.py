@@ -1,23 +1,21 @@
 import uuid
 
 import requests
-from django.db import transaction
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.contrib.auth import authenticate
-from django.utils import timezone
+from django.contrib.auth.models import Group, Permission
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from rest_framework import viewsets, status
-from rest_framework.authentication import (
-    SessionAuthentication,
-    TokenAuthentication,
-    BasicAuthentication,
-)
-from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from account.avatars import request_avatar_ingestion
 from account.models import Social, User
 from account.schemas import (
     list_schema_info,
@@ -26,41 +24,63 @@ from account.schemas import (
     wechat_mini_login_schema_info,
     profile_schema_info,
     wechat_profile_schema_info,
+    refresh_token_schema_info,
+    revoke_tokens_schema_info,
 )
 from account.serializers.serializers import (
     LoginRequestSerializer,
     WechatLoginRequestSerializer,
     LoginResponseSerializer,
+    RefreshTokenRequestSerializer,
     WechatProfilePostSerializer,
 )
-from account.serializers.model import UserSerializer
+from account.serializers.model import SocialSerializer, UserSerializer
+from account.tokens import (
+    is_signed_token,
+    issue_token,
+    issues_signed_tokens,
+    refresh_token,
+    revoke_tokens,
+)
 from account.utils.signinup import wristcheck_signinup
-from dependency.oss_storage import OSSManager
+from dependency.http_client import get_http_client
 from utils.pagination import CustomPagination
 from utils.permission import CustomGetPermissionMixin, IsOwnerOrAdminUser
-from wristcheck_api.settings import (
-    env,
-    OSS_ACCESS_KEY_ID,
-    OSS_ACCESS_KEY_SECRET,
-    OSS_ENDPOINT,
-    OSS_BUCKET,
-)
+from wristcheck_api.settings import env
+
+
+def serialized_columns(serializer_class):
+    """attnames of the concrete fields a ModelSerializer with ``Meta.exclude``
+    renders, for ``QuerySet.only()``.
+    """
+    excluded = set(serializer_class.Meta.exclude)
+    return [
+        field.attname
+        for field in serializer_class.Meta.model._meta.concrete_fields
+        if field.name not in excluded
+    ]
 
 
 class UserViewSet(CustomGetPermissionMixin, viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
-    authentication_classes = (
-        BasicAuthentication,
-        SessionAuthentication,
-        TokenAuthentication,
+    # One query per relation for a whole page instead of three per user, and
+    # only the columns UserSerializer renders.
+    queryset = User.objects.only(*serialized_columns(UserSerializer)).prefetch_related(
+        Prefetch(
+            "social_accounts",
+            queryset=Social.objects.only(*serialized_columns(SocialSerializer)),
+        ),
+        # Rendered as primary keys only.
+        Prefetch("groups", queryset=Group.objects.only("pk")),
+        Prefetch("user_permissions", queryset=Permission.objects.only("pk")),
     )
+    serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     permission_classes_map = {
         "list": [IsAdminUser],
         "retrieve": [IsOwnerOrAdminUser],
         "profile": [IsAuthenticated],
         "wechat_profile": [IsAuthenticated],
+        "revoke_tokens": [IsAuthenticated],
     }
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -89,8 +109,8 @@ class UserViewSet(CustomGetPermissionMixin, viewsets.ReadOnlyModelViewSet):
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({"token": token.key}, status=status.HTTP_200_OK)
+            response_serializer = LoginResponseSerializer(issue_token(user))
+            return Response(response_serializer.data, status=status.HTTP_200_OK)
         return Response(
             {"detail": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED
         )
@@ -103,18 +123,31 @@ class UserViewSet(CustomGetPermissionMixin, viewsets.ReadOnlyModelViewSet):
         serializer = WechatLoginRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         code = serializer.validated_data["code"]
-        wechat_data = requests.get(
-            env.str(
-                "WECHAT_MINI_GET_SESSION_KEY_URL",
-                "https://api.weixin.qq.com/sns/jscode2session",
-            ),
-            {
-                "appid": env.str("WECHAT_MINI_APPID", ""),
-                "secret": env.str("WECHAT_MINI_SECRET", ""),
-                "js_code": code,
-                "grant_type": "authorization_code",
-            },
-        ).json()
+        try:
+            wechat_data = (
+                get_http_client()
+                .get(
+                    env.str(
+                        "WECHAT_MINI_GET_SESSION_KEY_URL",
+                        "https://api.weixin.qq.com/sns/jscode2session",
+                    ),
+                    {
+                        "appid": env.str("WECHAT_MINI_APPID", ""),
+                        "secret": env.str("WECHAT_MINI_SECRET", ""),
+                        "js_code": code,
+                        "grant_type": "authorization_code",
+                    },
+                    # A js_code can only be used once: a retry after WeChat
+                    # consumed it would turn a slow success into "invalid code".
+                    idempotent=False,
+                )
+                .json()
+            )
+        except requests.RequestException:
+            return Response(
+                {"detail": "WeChat is unavailable"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
         open_id = wechat_data.get("openid")
         if not open_id:
             return Response(
@@ -122,34 +155,83 @@ class UserViewSet(CustomGetPermissionMixin, viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
         with transaction.atomic():
-            social = Social.objects.filter(open_id=open_id).first()
+            social = (
+                Social.objects.select_related("user")
+                .filter(application_type="mp", open_id=open_id)
+                .first()
+            )
             if not social:
-                sign_res = wristcheck_signinup(open_id, wechat_data.get("session_key"))
+                try:
+                    sign_res = wristcheck_signinup(
+                        open_id, wechat_data.get("session_key")
+                    )
+                except requests.RequestException:
+                    return Response(
+                        {"detail": "WristCheck API is unavailable"},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    )
                 wristcheck_user_id = sign_res.get("user", {}).get("id")
-                user = User.objects.create(
-                    id=wristcheck_user_id,
-                    username=str(uuid.uuid4()),
-                )
-                Social.objects.create(
-                    **{
-                        "user": user,
-                        "open_id": open_id,
-                    }
-                )
+                try:
+                    with transaction.atomic():
+                        user = User.objects.create(
+                            id=wristcheck_user_id,
+                            username=str(uuid.uuid4()),
+                        )
+                        Social.objects.create(
+                            **{
+                                "user": user,
+                                "open_id": open_id,
+                            }
+                        )
+                except (IntegrityError, ValidationError):
+                    # A concurrent first login of the same account got there first.
+                    user = (
+                        Social.objects.select_related("user")
+                        .get(application_type="mp", open_id=open_id)
+                        .user
+                    )
             else:
                 user = social.user
-                user.last_login = timezone.now()
-                user.save()
+                user.touch_last_login()
 
-            token, _ = Token.objects.get_or_create(user=user)
-            response_serializer = LoginResponseSerializer({"token": token.key})
+            response_serializer = LoginResponseSerializer(issue_token(user))
             return Response(response_serializer.data)
 
+    @extend_schema(**refresh_token_schema_info)
+    @action(
+        methods=["POST"], detail=False, authentication_classes=[], permission_classes=[]
+    )
+    def refresh_token(self, request, *args, **kwargs):
+        serializer = RefreshTokenRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token = serializer.validated_data["token"]
+        if not issues_signed_tokens() or not is_signed_token(token):
+            return Response(
+                {"detail": "Only signed tokens can be refreshed"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            _, issued = refresh_token(token)
+        except signing.BadSignature:
+            return Response(
+                {"detail": "Invalid or expired token"},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(LoginResponseSerializer(issued).data)
+
+    @extend_schema(**revoke_tokens_schema_info)
+    @action(methods=["POST"], detail=False, permission_classes=[IsAuthenticated])
+    def revoke_tokens(self, request, *args, **kwargs):
+        """Log out everywhere: every token of the user stops working."""
+        revoke_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @extend_schema(**profile_schema_info)
     @action(methods=["GET"], detail=False)
     def profile(self, request):
-        instance = User.objects.filter(id=request.user.id).first()
-        serializer = self.get_serializer(instance)
+        # The authenticated user is already loaded (or rebuilt from the auth
+        # cache), no need to fetch the row again.
+        serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
     @extend_schema(**wechat_profile_schema_info)
@@ -167,18 +249,12 @@ class UserViewSet(CustomGetPermissionMixin, viewsets.ReadOnlyModelViewSet):
         validated_data = serializer.validated_data
         avatar_url = validated_data.get("avatar_url")
         update_data = dict(nickname=validated_data.get("nickname", "微信匿名用户"))
-        if avatar_url:
-            manager = OSSManager(
-                access_key_id=OSS_ACCESS_KEY_ID,
-                access_key_secret=OSS_ACCESS_KEY_SECRET,
-                endpoint=OSS_ENDPOINT,
-                bucket_name=OSS_BUCKET,
-                subdirectory="wechat-avatar",
-            )
-            res = manager.stream_upload_avatar_from_url(request.user.id, url=avatar_url)
-            update_data.update(avatar_url=res["object_key"])
 
-        Social.objects.filter(user=request.user, application_type="mp").update(
-            **update_data
-        )
+        with transaction.atomic():
+            Social.objects.filter(user=request.user, application_type="mp").update(
+                **update_data
+            )
+            if avatar_url:
+                # Downloaded and stored in the background, see account.avatars.
+                request_avatar_ingestion(request.user, avatar_url)
         return Response(status=status.HTTP_200_OK)
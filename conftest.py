@@ -0,0 +1,15 @@
+import pytest
+from django.core.cache import caches
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    """A "shared" cache alias that every process sees, backed by files."""
+    settings.CACHES = {
+        **settings.CACHES,
+        "shared": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path / "cache"),
+        },
+    }
+    return caches["shared"]
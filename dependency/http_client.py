@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the upstream while its circuit is open."""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after ``failure_threshold`` consecutive
+    failures, for ``reset_timeout`` seconds. After that one trial call is let
+    through: its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class HttpClient:
+    """Outbound HTTP client shared by the calls to third-party APIs.
+
+    Keeps one pooled keep-alive ``requests.Session`` and one circuit breaker
+    per host, applies (connect, read) timeouts to every call and retries
+    connection errors, and read errors or 502/503/504 of idempotent methods,
+    with exponential backoff. Calls made with ``idempotent=False``, e.g. a GET
+    that consumes a one-time code, are only retried on connection errors,
+    when the request was never sent.
+    """
+
+    def __init__(
+        self,
+        connect_timeout=3.05,
+        read_timeout=5.0,
+        retries=2,
+        backoff_factor=0.2,
+        pool_maxsize=10,
+        failure_threshold=5,
+        reset_timeout=30.0,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_maxsize = pool_maxsize
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sessions = {}
+        self._breakers = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _host_state(self, host, idempotent=True):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share pooled sockets with a forked worker.
+                self._sessions, self._breakers = {}, {}
+                self._pid = os.getpid()
+            session = self._sessions.get((host, idempotent))
+            if session is None:
+                retry = Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff_factor,
+                    status_forcelist=(502, 503, 504),
+                    raise_on_status=False,
+                )
+                if not idempotent:
+                    retry = retry.new(read=0, status=0, other=0)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[(host, idempotent)] = session
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return session, breaker
+
+    def breaker(self, url):
+        return self._host_state(urlsplit(url).netloc)[1]
+
+    def request(self, method, url, idempotent=True, **kwargs):
+        session, breaker = self._host_state(urlsplit(url).netloc, idempotent)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {urlsplit(url).netloc}")
+        kwargs.setdefault("timeout", self.timeout)
+        succeeded = False
+        try:
+            response = session.request(method, url, **kwargs)
+            succeeded = response.status_code < 500
+        finally:
+            # Any other outcome, unexpected exceptions included, counts as a
+            # failure, so a half-open trial always ends.
+            if succeeded:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+        return response
+
+    def get(self, url, params=None, **kwargs):
+        return self.request("GET", url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions, self._breakers = {}, {}
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HttpClient(
+                    connect_timeout=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+                    read_timeout=settings.HTTP_CLIENT_READ_TIMEOUT,
+                    retries=settings.HTTP_CLIENT_RETRIES,
+                    backoff_factor=settings.HTTP_CLIENT_BACKOFF_FACTOR,
+                    pool_maxsize=settings.HTTP_CLIENT_POOL_SIZE,
+                    failure_threshold=settings.HTTP_CLIENT_BREAKER_FAILURES,
+                    reset_timeout=settings.HTTP_CLIENT_BREAKER_RESET_TIMEOUT,
+                )
+    return _http_client
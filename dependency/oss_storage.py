@@ -1,47 +1,64 @@
-from datetime import datetime
+import threading
 
-import oss2
-import requests
+from dependency.storage import CACHE_FOREVER, OSSBackend, get_storage_backend
 
 
 class OSSManager:
     def __init__(
-        self, access_key_id, access_key_secret, endpoint, bucket_name, subdirectory=None
+        self,
+        access_key_id=None,
+        access_key_secret=None,
+        endpoint=None,
+        bucket_name=None,
+        subdirectory=None,
+        backend=None,
     ):
-        self.auth = oss2.Auth(access_key_id, access_key_secret)
-        self.bucket = oss2.Bucket(self.auth, endpoint, bucket_name)
+        """
+        :param backend: A ``dependency.storage.StorageBackend``; defaults to
+            an OSS bucket built from the credentials.
+        """
+        self.backend = backend or OSSBackend(
+            access_key_id, access_key_secret, endpoint, bucket_name
+        )
         self.subdirectory = subdirectory
 
-    def stream_upload_avatar_from_url(self, filename, url):
+    def upload_object(self, object_key, content, content_type=None, immutable=False):
         """
-        Streams the upload of a user's avatar from a remote URL to the OSS bucket,
-        using a timestamp as a version identifier.
+        Uploads to the storage backend under the subdirectory.
 
-        :param filename: The ID of the user whose avatar is being uploaded.
-        :param url: The URL of the avatar image.
+        :param object_key: Key relative to the subdirectory.
+        :param content: The bytes to store, or an iterable of byte chunks to
+            stream; large content is uploaded in parts.
+        :param content_type: Content-Type served with the object.
+        :param immutable: The key changes whenever the content does, so
+            browsers and CDNs may cache the object forever.
+        :return: The full object key.
         """
-        image_suffix = "jpg"
-        version_identifier = str(datetime.now().timestamp()).replace(".", "")[-6:]
-        object_key = (
-            f"{self.subdirectory}/{filename}_{version_identifier}.{image_suffix}"
+        if self.subdirectory:
+            object_key = f"{self.subdirectory}/{object_key}"
+        self.backend.put(
+            object_key,
+            content,
+            content_type=content_type,
+            cache_control=CACHE_FOREVER if immutable else None,
         )
+        return object_key
 
-        # Define a generator that streams the content from the URL
-        def stream_generator():
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-
-            for chunk in response.iter_content(chunk_size=8192):
-                yield chunk
-
-        # Upload the image to OSS using the stream generator
-        self.bucket.put_object(object_key, stream_generator())
-        return dict(
-            url=self.bucket.sign_url("GET", object_key, 60),
-            bucket=self.bucket.bucket_name,
-            subdirectory=self.subdirectory,
-            filename=filename,
-            version_identifier=version_identifier,
-            image_suffix=image_suffix,
-            object_key=object_key,
-        )
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_oss_manager(subdirectory=None):
+    """Shared OSSManager per subdirectory, all on the process wide storage
+    backend (``STORAGE_BACKEND``) and its connection pool.
+    """
+    manager = _managers.get(subdirectory)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.get(subdirectory)
+            if manager is None:
+                manager = _managers[subdirectory] = OSSManager(
+                    subdirectory=subdirectory, backend=get_storage_backend()
+                )
+    return manager
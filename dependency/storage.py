@@ -0,0 +1,355 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+import threading
+from pathlib import Path
+
+import oss2
+from django.conf import settings
+
+STORAGE_OSS = "oss"
+STORAGE_LOCAL = "local"
+STORAGE_MEMORY = "memory"
+
+CACHE_FOREVER = "public, max-age=31536000, immutable"
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+def iter_parts(chunks, part_size):
+    """Regroup a stream of byte chunks into parts of exactly ``part_size``
+    bytes, except for the last one.
+    """
+    pending, size = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        size += len(chunk)
+        while size >= part_size:
+            data = b"".join(pending)
+            yield data[:part_size]
+            rest = data[part_size:]
+            pending, size = ([rest] if rest else []), len(rest)
+    if size:
+        yield b"".join(pending)
+
+
+def _prepend(first, second, rest):
+    yield first
+    yield second
+    yield from rest
+
+
+def _chunked(content, chunk_size):
+    view = memoryview(content)
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+class StorageBackend(ABC):
+    """Object storage interface used by ``OSSManager``.
+
+    ``put`` takes bytes or an iterable of byte chunks, so a download can be
+    streamed to storage. Content larger than ``multipart_threshold``, and
+    every stream longer than one part, is uploaded in parts of
+    ``part_size`` bytes, holding at most one part in memory.
+
+    Subclasses must implement ``_put``, the ``_*_multipart`` hooks,
+    ``iter_chunks``, ``exists`` and ``delete``; a backend missing one can not
+    be instantiated.
+    """
+
+    def __init__(self, multipart_threshold=10 * 1024 * 1024, part_size=5 * 1024 * 1024):
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+
+    @staticmethod
+    def _headers(content_type=None, cache_control=None):
+        headers = {}
+        if content_type:
+            headers["Content-Type"] = content_type
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        return headers
+
+    def put(self, key, content, content_type=None, cache_control=None):
+        """Store ``content`` (bytes or an iterable of bytes) under ``key``.
+
+        :return: number of bytes stored
+        """
+        headers = self._headers(content_type, cache_control)
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            if len(content) <= self.multipart_threshold:
+                self._put(key, bytes(content), headers)
+                return len(content)
+            content = _chunked(content, self.part_size)
+        return self.put_multipart(key, content, headers)
+
+    def put_multipart(self, key, chunks, headers=None):
+        headers = headers or {}
+        parts = iter_parts(chunks, self.part_size)
+        first = next(parts, b"")
+        second = next(parts, None)
+        if second is None:
+            # Fits in one part, a plain put is cheaper.
+            self._put(key, first, headers)
+            return len(first)
+        upload = self._start_multipart(key, headers)
+        size = 0
+        try:
+            for number, part in enumerate(_prepend(first, second, parts), start=1):
+                self._upload_part(upload, number, part)
+                size += len(part)
+            self._complete_multipart(upload)
+        except BaseException:
+            self._abort_multipart(upload)
+            raise
+        return size
+
+    def get(self, key):
+        return b"".join(self.iter_chunks(key))
+
+    @abstractmethod
+    def iter_chunks(self, key, chunk_size=64 * 1024):
+        """Stream an object. :raise ObjectNotFound:"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _put(self, key, content, headers):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _start_multipart(self, key, headers):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _upload_part(self, upload, number, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _complete_multipart(self, upload):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _abort_multipart(self, upload):
+        raise NotImplementedError
+
+
+class OSSBackend(StorageBackend):
+    """Aliyun OSS bucket. One ``oss2.Session`` (a pooled, keep-alive
+    ``requests`` session) is shared by every call of the backend.
+    """
+
+    def __init__(
+        self,
+        access_key_id,
+        access_key_secret,
+        endpoint,
+        bucket_name,
+        pool_size=10,
+        connect_timeout=None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.bucket = oss2.Bucket(
+            oss2.Auth(access_key_id, access_key_secret),
+            endpoint,
+            bucket_name,
+            session=oss2.Session(pool_size=pool_size),
+            connect_timeout=connect_timeout,
+        )
+
+    def _put(self, key, content, headers):
+        self.bucket.put_object(key, content, headers=headers)
+
+    def _start_multipart(self, key, headers):
+        upload_id = self.bucket.init_multipart_upload(key, headers=headers).upload_id
+        return {"key": key, "upload_id": upload_id, "parts": []}
+
+    def _upload_part(self, upload, number, data):
+        result = self.bucket.upload_part(
+            upload["key"], upload["upload_id"], number, data
+        )
+        upload["parts"].append(oss2.models.PartInfo(number, result.etag))
+
+    def _complete_multipart(self, upload):
+        self.bucket.complete_multipart_upload(
+            upload["key"], upload["upload_id"], upload["parts"]
+        )
+
+    def _abort_multipart(self, upload):
+        try:
+            self.bucket.abort_multipart_upload(upload["key"], upload["upload_id"])
+        except oss2.exceptions.OssError:
+            pass  # OSS lifecycle rules clean up what is left
+
+    def iter_chunks(self, key, chunk_size=64 * 1024):
+        try:
+            result = self.bucket.get_object(key)
+        except oss2.exceptions.NoSuchKey:
+            raise ObjectNotFound(key)
+        while True:
+            chunk = result.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def exists(self, key):
+        return self.bucket.object_exists(key)
+
+    def delete(self, key):
+        self.bucket.delete_object(key)
+
+
+class LocalFileSystemBackend(StorageBackend):
+    """Objects as files under ``root``, e.g. for development and benchmarks.
+    Writes go to a temporary file renamed into place, so readers never see
+    a partial object. Headers are not kept.
+    """
+
+    def __init__(self, root, **kwargs):
+        super().__init__(**kwargs)
+        self.root = Path(root)
+
+    def _path(self, key):
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def _put(self, key, content, headers):
+        upload = self._start_multipart(key, headers)
+        try:
+            upload["file"].write(content)
+            self._complete_multipart(upload)
+        except BaseException:
+            self._abort_multipart(upload)
+            raise
+
+    def _start_multipart(self, key, headers):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle = tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=".upload-", delete=False
+        )
+        return {"path": path, "file": handle}
+
+    def _upload_part(self, upload, number, data):
+        upload["file"].write(data)
+
+    def _complete_multipart(self, upload):
+        upload["file"].close()
+        os.replace(upload["file"].name, upload["path"])
+
+    def _abort_multipart(self, upload):
+        upload["file"].close()
+        try:
+            os.remove(upload["file"].name)
+        except FileNotFoundError:
+            pass
+
+    def iter_chunks(self, key, chunk_size=64 * 1024):
+        try:
+            handle = open(self._path(key), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        with handle:
+            while chunk := handle.read(chunk_size):
+                yield chunk
+
+    def exists(self, key):
+        return self._path(key).is_file()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class InMemoryBackend(StorageBackend):
+    """Objects in a dict, for tests and benchmarks."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}
+        self.headers = {}
+        self._lock = threading.Lock()
+
+    def _put(self, key, content, headers):
+        with self._lock:
+            self.objects[key] = content
+            self.headers[key] = headers
+
+    def _start_multipart(self, key, headers):
+        return {"key": key, "headers": headers, "parts": []}
+
+    def _upload_part(self, upload, number, data):
+        upload["parts"].append(data)
+
+    def _complete_multipart(self, upload):
+        self._put(upload["key"], b"".join(upload["parts"]), upload["headers"])
+
+    def _abort_multipart(self, upload):
+        upload["parts"].clear()
+
+    def iter_chunks(self, key, chunk_size=64 * 1024):
+        content = self.objects.get(key)
+        if content is None:
+            raise ObjectNotFound(key)
+        for chunk in _chunked(content, chunk_size):
+            yield bytes(chunk)
+
+    def exists(self, key):
+        return key in self.objects
+
+    def delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+            self.headers.pop(key, None)
+
+
+def build_storage_backend(name=None):
+    """Backend selected by ``STORAGE_BACKEND``, configured from settings."""
+    name = name or settings.STORAGE_BACKEND
+    kwargs = dict(
+        multipart_threshold=settings.STORAGE_MULTIPART_THRESHOLD,
+        part_size=settings.STORAGE_PART_SIZE,
+    )
+    if name == STORAGE_OSS:
+        return OSSBackend(
+            settings.OSS_ACCESS_KEY_ID,
+            settings.OSS_ACCESS_KEY_SECRET,
+            settings.OSS_ENDPOINT,
+            settings.OSS_BUCKET,
+            pool_size=settings.OSS_POOL_SIZE,
+            connect_timeout=settings.OSS_CONNECT_TIMEOUT,
+            **kwargs,
+        )
+    if name == STORAGE_LOCAL:
+        return LocalFileSystemBackend(settings.STORAGE_LOCAL_ROOT, **kwargs)
+    if name == STORAGE_MEMORY:
+        return InMemoryBackend(**kwargs)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_storage_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_storage_backend()
+    return _backend
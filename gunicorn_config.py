@@ -17,3 +17,10 @@ proc_name = "wristcheck_api"
 loglevel = env.str("GUNICORN_LOG_LEVEL", "debug")
 accesslog = env.str("GUNICORN_ACCESS_LOG", "/var/log/gunicorn_access.log")
 errorlog = env.str("GUNICORN_ERROR_LOG", "/var/log/gunicorn_error.log")
+
+
+def worker_exit(server, worker):
+    # Flush visits still held by the buffered ingestion mode before the worker exits.
+    from track.ingest import shutdown_visit_buffer
+
+    shutdown_visit_buffer()
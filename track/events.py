@@ -0,0 +1,240 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections, models
+from django.utils import timezone
+
+from track.models import WatchVisitEvent
+
+EVENT_TABLE = "track_watchvisitevent"
+PARTITION_DAY = "day"
+PARTITION_MONTH = "month"
+
+_partition_table_re = re.compile(rf"^{EVENT_TABLE}_p(\d{{8}}|\d{{6}})$")
+_partition_models = {}
+_known_partitions = set()
+_lock = threading.Lock()
+
+
+def period_start(moment, granularity=None):
+    """First day (UTC) of the partition period ``moment`` falls in."""
+    granularity = granularity or settings.TRACK_VISIT_EVENT_PARTITION
+    day = moment.astimezone(dt_timezone.utc).date()
+    if granularity == PARTITION_DAY:
+        return day
+    return day.replace(day=1)
+
+
+def period_end(start, granularity):
+    if granularity == PARTITION_DAY:
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_table(start, granularity):
+    suffix = f"{start:%Y%m%d}" if granularity == PARTITION_DAY else f"{start:%Y%m}"
+    return f"{EVENT_TABLE}_p{suffix}"
+
+
+def parse_partition_table(table):
+    """:return: (start, granularity) or None if ``table`` is not a partition"""
+    match = _partition_table_re.match(table)
+    if not match:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 8:
+        return datetime.strptime(suffix, "%Y%m%d").date(), PARTITION_DAY
+    return datetime.strptime(suffix, "%Y%m").date(), PARTITION_MONTH
+
+
+def _utc_midnight(day):
+    return datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+
+
+def partition_model(table):
+    """Unmanaged model bound to one partition table, created once per process."""
+    with _lock:
+        model = _partition_models.get(table)
+        if model is None:
+            meta = type(
+                "Meta", (), {"db_table": table, "managed": False, "app_label": "track"}
+            )
+            model = type(
+                f"WatchVisitEvent_{table.rsplit('_', 1)[-1]}",
+                (WatchVisitEvent,),
+                {
+                    "__module__": WatchVisitEvent.__module__,
+                    "id": models.BigAutoField(primary_key=True),
+                    "Meta": meta,
+                },
+            )
+            _partition_models[table] = model
+        return model
+
+
+def _create_partition(connection, start, granularity):
+    table = partition_table(start, granularity)
+    quote_name = connection.ops.quote_name
+    if connection.vendor == "postgresql":
+        # Native range partition of the parent table created by migration.
+        sql = (
+            f"CREATE TABLE IF NOT EXISTS {quote_name(table)} "
+            f"PARTITION OF {quote_name(EVENT_TABLE)} FOR VALUES FROM (%s) TO (%s)"
+        )
+        params = [
+            _utc_midnight(start),
+            _utc_midnight(period_end(start, granularity)),
+        ]
+    else:
+        # Only the statement is borrowed from the schema editor: entering it
+        # is not allowed inside a transaction on SQLite, and visits are
+        # written inside one. IF NOT EXISTS covers concurrent workers.
+        sql, params = connection.schema_editor().table_sql(partition_model(table))
+        sql = sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def ensure_partitions(starts, granularity=None, using="default"):
+    """Create the partitions for the given period starts if they are missing.
+
+    Known partitions are remembered per process, so this costs nothing on the
+    hot path once the current period exists.
+
+    MySQL commits implicitly on DDL, so call this before opening the
+    transaction that writes the events.
+    """
+    granularity = granularity or settings.TRACK_VISIT_EVENT_PARTITION
+    missing = [
+        start
+        for start in set(starts)
+        if (using, partition_table(start, granularity)) not in _known_partitions
+    ]
+    if not missing:
+        return
+    connection = connections[using]
+    existing = set(connection.introspection.table_names())
+    for start in missing:
+        table = partition_table(start, granularity)
+        if table not in existing:
+            _create_partition(connection, start, granularity)
+        _known_partitions.add((using, table))
+
+
+def forget_partitions():
+    """Drop the per-process cache of existing partitions."""
+    _known_partitions.clear()
+
+
+def retention_cutoff(retention_days=None):
+    """Moment before which visit events are not kept."""
+    if retention_days is None:
+        retention_days = settings.TRACK_VISIT_EVENT_RETENTION_DAYS
+    return timezone.now() - timedelta(days=retention_days)
+
+
+def retained_events(events):
+    """Leave out the events older than the retention, whose partitions are
+    dropped or about to be.
+
+    :param events: iterable of (user_id, watch_id, visited_at, count)
+    """
+    cutoff = retention_cutoff()
+    return [event for event in events if event[2] >= cutoff]
+
+
+def append_visit_events(events, granularity=None, using="default"):
+    """Bulk insert visit events into their partitions.
+
+    Call ``ensure_partitions`` for the events' periods first. No savepoint is
+    opened, so an insert into a partition dropped by another process since it
+    was remembered fails the caller's transaction; see
+    ``forget_missing_partitions``.
+
+    :param events: iterable of (user_id, watch_id, visited_at, count)
+    :return: number of events written
+    """
+    granularity = granularity or settings.TRACK_VISIT_EVENT_PARTITION
+    by_partition = defaultdict(list)
+    for user_id, watch_id, visited_at, count in events:
+        start = period_start(visited_at, granularity)
+        by_partition[start].append(
+            dict(user_id=user_id, watch_id=watch_id, visited_at=visited_at, count=count)
+        )
+    written = 0
+    for start, rows in by_partition.items():
+        model = partition_model(partition_table(start, granularity))
+        model.objects.using(using).bulk_create(
+            [model(**row) for row in rows], batch_size=1000
+        )
+        written += len(rows)
+    return written
+
+
+def forget_missing_partitions(using="default"):
+    """Forget the remembered partitions that no longer exist, e.g. pruned by
+    another process, so ``ensure_partitions`` creates them again.
+
+    :return: True if any partition was forgotten
+    """
+    existing = set(connections[using].introspection.table_names())
+    missing = {
+        (alias, table)
+        for alias, table in _known_partitions
+        if alias == using and table not in existing
+    }
+    _known_partitions.difference_update(missing)
+    return bool(missing)
+
+
+def list_partitions(using="default"):
+    """:return: sorted [(table, start, end)] of the existing partitions"""
+    partitions = []
+    for table in connections[using].introspection.table_names():
+        parsed = parse_partition_table(table)
+        if parsed:
+            start, granularity = parsed
+            partitions.append((table, start, period_end(start, granularity)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def event_querysets(start, end, using="default"):
+    """Querysets over the events visited in [start, end), one per partition."""
+    start_day = start.astimezone(dt_timezone.utc).date()
+    end_day = end.astimezone(dt_timezone.utc).date()
+    return [
+        partition_model(table)
+        .objects.using(using)
+        .filter(visited_at__gte=start, visited_at__lt=end)
+        for table, partition_start, partition_end in list_partitions(using)
+        if partition_start <= end_day and partition_end > start_day
+    ]
+
+
+def drop_partitions_before(cutoff, using="default", dry_run=False):
+    """Drop every partition whose whole period ends on or before ``cutoff``.
+
+    Dropping a table is constant time, unlike deleting its rows.
+
+    :param cutoff: date
+    :return: names of the dropped tables
+    """
+    if isinstance(cutoff, datetime):
+        cutoff = cutoff.date()
+    connection = connections[using]
+    dropped = []
+    for table, start, end in list_partitions(using):
+        if end > cutoff:
+            continue
+        if not dry_run:
+            # On PostgreSQL dropping a partition also detaches it from the parent.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DROP TABLE IF EXISTS {connection.ops.quote_name(table)}"
+                )
+            _known_partitions.discard((using, table))
+        dropped.append(table)
+    return dropped
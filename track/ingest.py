@@ -0,0 +1,338 @@
+import atexit
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import (
+    OperationalError,
+    ProgrammingError,
+    close_old_connections,
+    transaction,
+)
+from django.utils import timezone
+
+from track.events import (
+    append_visit_events,
+    ensure_partitions,
+    forget_missing_partitions,
+    period_start,
+    retained_events,
+)
+from track.models import WatchVisitRecord
+from track.rollups import apply_daily_visits
+from track.trending import get_trending_engine
+from utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+INGEST_MODE_WRITE_THROUGH = "write_through"
+INGEST_MODE_BUFFERED = "buffered"
+
+
+@dataclass
+class PendingVisit:
+    count: int
+    visited_at: object
+
+
+def merge_visits(events):
+    """Group visits per (user_id, watch_id), as WatchVisitRecord stores them.
+
+    :param events: iterable of (user_id, watch_id, visited_at, count)
+    :return: {(user_id, watch_id): PendingVisit}
+    """
+    visits = {}
+    for user_id, watch_id, visited_at, count in events:
+        pending = visits.get((user_id, watch_id))
+        if pending is None:
+            visits[(user_id, watch_id)] = PendingVisit(count, visited_at)
+        else:
+            pending.count += count
+            pending.visited_at = max(pending.visited_at, visited_at)
+    return visits
+
+
+def visit_rows(visits):
+    """Rows for ``upsert`` from grouped visits.
+
+    :param visits: {(user_id, watch_id): PendingVisit}
+    """
+    now = timezone.now()
+    return [
+        dict(
+            user_id=user_id,
+            watch_id=watch_id,
+            count=pending.count,
+            created_at=now,
+            updated_at=now,
+            visited_at=pending.visited_at,
+        )
+        for (user_id, watch_id), pending in visits.items()
+    ]
+
+
+def _write_visits(write, starts):
+    """Run ``write`` in a transaction once the event partitions of ``starts``
+    exist.
+
+    A partition dropped by another process since this one remembered it makes
+    the whole transaction fail, as the event insert runs without a savepoint.
+    The partition is then created again and ``write`` retried once.
+
+    :return: the result of ``write``
+    """
+    ensure_partitions(starts)
+    try:
+        with transaction.atomic():
+            return write()
+    except (OperationalError, ProgrammingError):
+        if not forget_missing_partitions():
+            raise
+    # MySQL commits implicitly on this DDL, hence outside the transaction.
+    ensure_partitions(starts)
+    with transaction.atomic():
+        return write()
+
+
+def apply_visits(events):
+    """Apply visits to WatchVisitRecord in one statement, to the daily rollups
+    and to the visit event log.
+
+    Only the records are merged per (user_id, watch_id); the rollups and the
+    event log keep every visit on its own day.
+
+    :param events: list of (user_id, watch_id, visited_at, count)
+    :return: number of WatchVisitRecord rows written
+    """
+    if not events:
+        return 0
+    visits = merge_visits(events)
+    logged = retained_events(events)
+
+    def write():
+        upsert(
+            WatchVisitRecord,
+            visit_rows(visits),
+            unique_fields=["user_id", "watch_id"],
+            update_fields=["updated_at"],
+            increment_fields=["count"],
+            max_fields=["visited_at"],
+        )
+        apply_daily_visits(events)
+        append_visit_events(logged)
+
+    _write_visits(write, {period_start(event[2]) for event in logged})
+    return len(visits)
+
+
+class VisitBuffer:
+    """Collects visit increments in process and flushes them in bulk.
+
+    Increments are grouped per (user_id, watch_id, day), so each flush still
+    books visits on the day they happened. A flush is triggered when
+    the buffer holds ``max_size`` distinct keys or every ``flush_interval``
+    seconds, whichever comes first. With ``flush_interval=None`` no background
+    thread is started and callers are expected to call ``flush`` themselves.
+    """
+
+    def __init__(self, max_size=500, flush_interval=5.0):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.flushes = 0
+        self.rows_written = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id, watch_id, visited_at=None, count=1):
+        visited_at = visited_at or timezone.now()
+        key = (user_id, watch_id, timezone.localdate(visited_at))
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = PendingVisit(count, visited_at)
+            else:
+                pending.count += count
+                pending.visited_at = max(pending.visited_at, visited_at)
+            size = len(self._pending)
+
+        if self.flush_interval is None:
+            if size >= self.max_size:
+                self.flush()
+            return
+        self._ensure_worker()
+        if size >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                rows = apply_visits(
+                    [
+                        (user_id, watch_id, pending.visited_at, pending.count)
+                        for (user_id, watch_id, _), pending in batch.items()
+                    ]
+                )
+            except Exception:
+                logger.exception("Failed to flush %d buffered visits", len(batch))
+                self._requeue(batch)
+                return 0
+            self.flushes += 1
+            self.rows_written += rows
+            return rows
+
+    def close(self, timeout=10.0):
+        """Stop the background thread and flush what is left, waiting at most
+        ``timeout`` seconds so a stuck database can not block worker shutdown.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        if not self._pending:
+            return
+        flusher = threading.Thread(target=self._flush_in_thread, daemon=True)
+        flusher.start()
+        flusher.join(timeout)
+        if flusher.is_alive():
+            logger.error(
+                "Gave up flushing %d buffered visits after %ss",
+                len(self._pending),
+                timeout,
+            )
+
+    def _requeue(self, batch):
+        with self._lock:
+            for key, pending in batch.items():
+                current = self._pending.get(key)
+                if current is None:
+                    self._pending[key] = pending
+                else:
+                    current.count += pending.count
+                    current.visited_at = max(current.visited_at, pending.visited_at)
+
+    def _ensure_worker(self):
+        # gunicorn forks workers after the app is preloaded, so the thread is
+        # started lazily in the process that actually receives visits.
+        if self._pid == os.getpid() or self._stopped.is_set():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="visit-buffer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            self._flush_in_thread()
+
+    def _flush_in_thread(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+_visit_buffer = None
+_visit_buffer_lock = threading.Lock()
+
+
+def get_visit_buffer():
+    global _visit_buffer
+    if _visit_buffer is None:
+        with _visit_buffer_lock:
+            if _visit_buffer is None:
+                _visit_buffer = VisitBuffer(
+                    max_size=settings.TRACK_VISIT_BUFFER_SIZE,
+                    flush_interval=settings.TRACK_VISIT_FLUSH_INTERVAL,
+                )
+                atexit.register(shutdown_visit_buffer)
+    return _visit_buffer
+
+
+def shutdown_visit_buffer():
+    if _visit_buffer is not None:
+        _visit_buffer.close(timeout=settings.TRACK_VISIT_SHUTDOWN_FLUSH_TIMEOUT)
+
+
+def record_visit(user, watch_id):
+    """Record one visit of ``user`` to ``watch_id``.
+
+    In write-through mode the record is saved before returning. In buffered
+    mode the visit is queued and an unsaved record is returned.
+
+    :return: (WatchVisitRecord, persisted)
+    """
+    now = timezone.now()
+    get_trending_engine().record(watch_id, at=now)
+    if settings.TRACK_VISIT_INGEST_MODE == INGEST_MODE_BUFFERED:
+        get_visit_buffer().add(user.id, watch_id, visited_at=now)
+        record = WatchVisitRecord(
+            user=user, watch_id=watch_id, updated_at=now, visited_at=now
+        )
+        return record, False
+
+    events = [(user.id, watch_id, now, 1)]
+
+    def write():
+        [visit_record] = upsert(
+            WatchVisitRecord,
+            visit_rows(merge_visits(events)),
+            unique_fields=["user_id", "watch_id"],
+            update_fields=["updated_at"],
+            increment_fields=["count"],
+            max_fields=["visited_at"],
+            returning=True,
+        )
+        apply_daily_visits(events)
+        append_visit_events(events)
+        return visit_record
+
+    return _write_visits(write, [period_start(now)]), True
+
+
+def record_visits(user, entries):
+    """Record several visits of ``user`` at once, e.g. a client's offline queue.
+
+    Entries for the same watch are merged into one record, then applied with
+    one bulk upsert (write-through) or queued (buffered).
+
+    :param entries: iterable of {"watch_id", "visited_at", "count"}
+    :return: True if the visits were persisted, False if they were queued
+    """
+    buffered = settings.TRACK_VISIT_INGEST_MODE == INGEST_MODE_BUFFERED
+    trending = get_trending_engine()
+    events = []
+    for entry in entries:
+        trending.record(entry["watch_id"], entry["count"], entry["visited_at"])
+        if buffered:
+            get_visit_buffer().add(
+                user.id, entry["watch_id"], entry["visited_at"], entry["count"]
+            )
+            continue
+        events.append((user.id, entry["watch_id"], entry["visited_at"], entry["count"]))
+    if buffered:
+        return False
+    apply_visits(events)
+    return True
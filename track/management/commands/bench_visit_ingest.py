@@ -0,0 +1,80 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.test import override_settings
+
+from account.models import User
+from track import ingest
+from track.models import WatchVisitRecord
+from utils.benchmark import benchmark_database, format_ms, percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare write-through and buffered visit ingestion on a throwaway "
+        "database: rows written and per-call latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visits", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--watches", type=int, default=200)
+        parser.add_argument("--buffer-size", type=int, default=500)
+        parser.add_argument("--flush-interval", type=float, default=1.0)
+        parser.add_argument("--seed", type=int, default=2068)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            users = [
+                User(id=uuid.uuid4(), username=f"bench-{i}")
+                for i in range(options["users"])
+            ]
+            User.objects.bulk_create(users)
+
+            rng = random.Random(options["seed"])
+            # Page views are skewed: a few popular watches get most visits.
+            weights = [1 / (rank + 1) for rank in range(options["watches"])]
+            visits = [
+                (rng.choice(users), f"watch-{watch}")
+                for watch in rng.choices(
+                    range(options["watches"]), weights=weights, k=options["visits"]
+                )
+            ]
+
+            for mode in (ingest.INGEST_MODE_WRITE_THROUGH, ingest.INGEST_MODE_BUFFERED):
+                WatchVisitRecord.objects.all().delete()
+                self.run_mode(mode, visits, options)
+
+    def run_mode(self, mode, visits, options):
+        buffer = ingest.VisitBuffer(
+            max_size=options["buffer_size"],
+            flush_interval=options["flush_interval"],
+        )
+        ingest._visit_buffer = buffer
+        latencies = []
+        started = time.perf_counter()
+        with override_settings(TRACK_VISIT_INGEST_MODE=mode):
+            for user, watch_id in visits:
+                t0 = time.perf_counter()
+                ingest.record_visit(user, watch_id)
+                latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        buffer.close()
+        ingest._visit_buffer = None
+
+        if mode == ingest.INGEST_MODE_BUFFERED:
+            rows_written = buffer.rows_written
+        else:
+            rows_written = len(visits)
+        stored = WatchVisitRecord.objects.aggregate(count=Sum("count"))
+        self.stdout.write(
+            f"{mode:>13}: visits={len(visits)} rows_written={rows_written} "
+            f"flushes={buffer.flushes} "
+            f"p50={format_ms(percentile(latencies, 50))} "
+            f"p99={format_ms(percentile(latencies, 99))} "
+            f"throughput={len(visits) / elapsed:.0f}/s "
+            f"stored_visits={stored['count'] or 0}"
+        )
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from track.events import drop_partitions_before, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Retention job for the visit event log: drop the partitions whose whole "
+        "period is older than the retention. Aggregates stay in the daily rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.TRACK_VISIT_EVENT_RETENTION_DAYS,
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the partitions that would be dropped.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options["retention_days"])
+        dropped = drop_partitions_before(cutoff, dry_run=options["dry_run"])
+        verb = "Would drop" if options["dry_run"] else "Dropped"
+        for table in dropped:
+            self.stdout.write(f"{verb} {table}")
+        self.stdout.write(f"{verb} {len(dropped)} partition(s).")
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from track.rollups import backfill_daily_users, rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Catch-up job for the daily watch visit rollups: recompute the rollups "
+        "of the last N days from the per-user daily rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=2,
+            help="Number of days to recompute, counting back from today.",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First seed the per-user daily rows from existing visit records "
+            "and recompute every day that received rows.",
+        )
+
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        days = {today - timedelta(days=offset) for offset in range(options["days"])}
+        if options["backfill"]:
+            days |= backfill_daily_users(batch_size=options["batch_size"])
+        written = rebuild_daily_rollups(sorted(days))
+        self.stdout.write(f"Recomputed {len(days)} day(s), {written} rollup row(s).")
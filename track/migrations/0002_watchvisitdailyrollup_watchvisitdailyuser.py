@@ -0,0 +1,65 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WatchVisitDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("watch_id", models.CharField(max_length=255)),
+                ("visits", models.IntegerField(default=0)),
+                ("unique_users", models.IntegerField(default=0)),
+            ],
+            options={
+                "ordering": ["-day"],
+                "unique_together": {("day", "watch_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="WatchVisitDailyUser",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("watch_id", models.CharField(max_length=255)),
+                ("visits", models.IntegerField(default=0)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("day", "watch_id", "user")},
+            },
+        ),
+    ]
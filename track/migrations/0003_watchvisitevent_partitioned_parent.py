@@ -0,0 +1,35 @@
+from django.db import migrations
+
+CREATE_PARENT = """
+CREATE TABLE IF NOT EXISTS track_watchvisitevent (
+    id bigserial NOT NULL,
+    user_id uuid NOT NULL,
+    watch_id varchar(255) NOT NULL,
+    count integer NOT NULL,
+    visited_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, visited_at)
+) PARTITION BY RANGE (visited_at)
+"""
+
+
+def create_partitioned_parent(apps, schema_editor):
+    # Only PostgreSQL has native partitioning; other backends keep one
+    # standalone table per period (see track.events).
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_PARENT)
+
+
+def drop_partitioned_parent(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS track_watchvisitevent CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0002_watchvisitdailyrollup_watchvisitdailyuser"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partitioned_parent, drop_partitioned_parent),
+    ]
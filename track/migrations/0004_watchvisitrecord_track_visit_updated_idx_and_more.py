@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0003_watchvisitevent_partitioned_parent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="watchvisitrecord",
+            index=models.Index(
+                fields=["updated_at", "id"], name="track_visit_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="watchvisitrecord",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="track_visit_user_updated_idx"
+            ),
+        ),
+    ]
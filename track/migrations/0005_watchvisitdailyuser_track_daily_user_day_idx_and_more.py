@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0004_watchvisitrecord_track_visit_updated_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="watchvisitdailyuser",
+            index=models.Index(fields=["user", "day"], name="track_daily_user_day_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="watchvisitrecord",
+            index=models.Index(
+                fields=["watch_id", "updated_at"], name="track_visit_watch_updated_idx"
+            ),
+        ),
+    ]
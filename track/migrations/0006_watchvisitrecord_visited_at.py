@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:48
+
+from django.db import migrations, models
+
+
+def backfill_visited_at(apps, schema_editor):
+    # updated_at held the latest visit until now.
+    WatchVisitRecord = apps.get_model("track", "WatchVisitRecord")
+    WatchVisitRecord.objects.using(schema_editor.connection.alias).filter(
+        visited_at__isnull=True
+    ).update(visited_at=models.F("updated_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0005_watchvisitdailyuser_track_daily_user_day_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="watchvisitrecord",
+            name="visited_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_visited_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def count_every_visit(apps, schema_editor):
+    # Records used to start at 0 for their first visit; they now count it.
+    WatchVisitRecord = apps.get_model("track", "WatchVisitRecord")
+    WatchVisitRecord.objects.using(schema_editor.connection.alias).update(
+        count=models.F("count") + 1
+    )
+
+
+def uncount_first_visit(apps, schema_editor):
+    WatchVisitRecord = apps.get_model("track", "WatchVisitRecord")
+    WatchVisitRecord.objects.using(schema_editor.connection.alias).update(
+        count=models.F("count") - 1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0006_watchvisitrecord_visited_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(count_every_visit, uncount_first_visit),
+    ]
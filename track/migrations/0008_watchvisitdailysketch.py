@@ -0,0 +1,70 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+from track.rollups import visitor_register
+
+
+def seed_sketches(apps, schema_editor):
+    # One day at a time, so memory is bounded by the watches of a day.
+    WatchVisitDailyUser = apps.get_model("track", "WatchVisitDailyUser")
+    WatchVisitDailySketch = apps.get_model("track", "WatchVisitDailySketch")
+    using = schema_editor.connection.alias
+
+    def flush(sketches):
+        WatchVisitDailySketch.objects.using(using).bulk_create(
+            [
+                WatchVisitDailySketch(
+                    day=day, watch_id=watch_id, register=register, rank=rank
+                )
+                for (day, watch_id, register), rank in sketches.items()
+            ],
+            batch_size=1000,
+        )
+
+    sketches, current_day = {}, None
+    for day, watch_id, user_id in (
+        WatchVisitDailyUser.objects.using(using)
+        .order_by("day")
+        .values_list("day", "watch_id", "user_id")
+        .iterator()
+    ):
+        if day != current_day:
+            flush(sketches)
+            sketches, current_day = {}, day
+        register, rank = visitor_register(user_id)
+        key = (day, watch_id, register)
+        sketches[key] = max(sketches.get(key, 0), rank)
+    flush(sketches)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("track", "0007_watchvisitrecord_count_visits"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WatchVisitDailySketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("watch_id", models.CharField(max_length=255)),
+                ("register", models.PositiveSmallIntegerField()),
+                ("rank", models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("watch_id", "day", "register")},
+            },
+        ),
+        migrations.RunPython(seed_sketches, migrations.RunPython.noop),
+    ]
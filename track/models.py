@@ -9,7 +9,81 @@ class WatchVisitRecord(TimestampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     watch_id = models.CharField(max_length=255, null=False, blank=False)
     count = models.IntegerField(default=0)
+    # Latest visit, which can be older than updated_at for visits queued
+    # offline; updated_at is the write time so delta sync sees every change.
+    visited_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ("user", "watch_id")
         ordering = ["-updated_at"]
+        indexes = [
+            # Keyset pagination over (updated_at, id), globally and per user.
+            models.Index(fields=["updated_at", "id"], name="track_visit_updated_idx"),
+            models.Index(
+                fields=["user", "updated_at", "id"], name="track_visit_user_updated_idx"
+            ),
+            # Admin list filtered by watch_id.
+            models.Index(
+                fields=["watch_id", "updated_at"], name="track_visit_watch_updated_idx"
+            ),
+        ]
+
+
+class WatchVisitDailyUser(models.Model):
+    """Visits of one user to one watch on one day."""
+
+    day = models.DateField()
+    watch_id = models.CharField(max_length=255, null=False, blank=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    visits = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("day", "watch_id", "user")
+        indexes = [
+            # Per-user analytics: user_id = ? AND day >= ?
+            models.Index(fields=["user", "day"], name="track_daily_user_day_idx"),
+        ]
+
+
+class WatchVisitDailyRollup(models.Model):
+    """Visits and distinct visitors of one watch on one day."""
+
+    day = models.DateField()
+    watch_id = models.CharField(max_length=255, null=False, blank=False)
+    visits = models.IntegerField(default=0)
+    unique_users = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("day", "watch_id")
+        ordering = ["-day"]
+
+
+class WatchVisitDailySketch(models.Model):
+    """One register of the HyperLogLog sketch of the distinct visitors of one
+    watch on one day. Days merge by keeping the greatest rank per register,
+    so a period is estimated from a bounded number of rows per day.
+    """
+
+    day = models.DateField()
+    watch_id = models.CharField(max_length=255, null=False, blank=False)
+    register = models.PositiveSmallIntegerField()
+    rank = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        # Analytics reads watch_id IN (...) AND day >= ?
+        unique_together = ("watch_id", "day", "register")
+
+
+class WatchVisitEvent(models.Model):
+    """Append-only log of visits.
+
+    Rows live in one table per day or month, see ``track.events``.
+    """
+
+    user_id = models.UUIDField()
+    watch_id = models.CharField(max_length=255, null=False, blank=False)
+    count = models.IntegerField(default=1)
+    visited_at = models.DateTimeField()
+
+    class Meta:
+        abstract = True
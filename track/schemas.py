@@ -5,10 +5,15 @@ from track.serializers.model import WatchVisitRecordSerializer
 from track.serializers.serializers import (
     WatchVisitRecordAddRequestSerializer,
     WatchVisitRecordAddValidateErrorSerializer,
+    WatchVisitRecordBatchAddRequestSerializer,
+    WatchVisitRecordBatchAddResultSerializer,
+    WatchVisitTrendingSerializer,
 )
 from utils.schemas import (
     response_schema,
     parameter_page_size,
+    parameter_cursor,
+    parameter_since,
     parameter_ordering,
     parameter_search,
 )
@@ -22,6 +27,7 @@ list_schema_info = dict(
     description="**PERMISSION**: Allows access only to admin users.",
     parameters=[
         parameter_page_size(),
+        parameter_cursor(),
         parameter_ordering(["updated_at"], default="-updated_at"),
         parameter_search(["watch_id", "user_id"]),
     ],
@@ -57,19 +63,45 @@ destroy_schema_info = dict(
 add_schema_info = dict(
     tags=tags,
     summary="track_watch_visit_add",
-    description="**PERMISSION**: Allows access only to authenticated users.",
+    description="""
+**PERMISSION**: Allows access only to authenticated users.
+
+Returns 201 when the visit is written through, or 202 with an unsaved record
+when `TRACK_VISIT_INGEST_MODE=buffered` and the visit is queued for a bulk flush.""",
     request=WatchVisitRecordAddRequestSerializer,
     responses={
         201: response_schema(201, WatchVisitRecordSerializer, many=False),
+        202: response_schema(202, WatchVisitRecordSerializer, many=False),
         400: response_schema(400, WatchVisitRecordAddValidateErrorSerializer),
         401: response_schema(401, ErrorResponseSerializer),
     },
 )
 
+batch_add_schema_info = dict(
+    tags=tags,
+    summary="track_watch_visit_batch_add",
+    description="""
+**PERMISSION**: Allows access only to authenticated users.
+
+Flush a client's offline visit queue in one request. Each entry is validated on
+its own; the result list has one item per entry, in request order, with
+`accepted` false and the validation `errors` for entries that were rejected.
+
+Returns 202 instead of 200 when `TRACK_VISIT_INGEST_MODE=buffered`.""",
+    request=WatchVisitRecordBatchAddRequestSerializer,
+    responses={
+        200: response_schema(200, WatchVisitRecordBatchAddResultSerializer),
+        202: response_schema(202, WatchVisitRecordBatchAddResultSerializer),
+        400: response_schema(400, WatchVisitRecordBatchAddRequestSerializer),
+        401: response_schema(401, ErrorResponseSerializer),
+    },
+)
+
 my_own_schema_info = dict(
     tags=tags,
     summary="track_watch_visit_my_own",
     description="**PERMISSION**: Allows access only to authenticated users.",
+    parameters=[parameter_page_size(), parameter_cursor(), parameter_since()],
     responses={
         200: response_schema(200, WatchVisitRecordSerializer, many=True),
         401: response_schema(401, ErrorResponseSerializer),
@@ -84,6 +116,12 @@ analytics_schema_info = dict(
 
 Obtain the distribution of the number of times a user visits watch over a period of time
 
+Answered from the daily rollups, so periods are the last N whole days, today
+included: `count` is the number of visits and `unique_users` the number of
+distinct visitors over the whole period. Without `user_id`, `unique_users` is
+estimated from daily HyperLogLog sketches (about 9% standard error), so its
+cost does not grow with traffic.
+
 eg: GET /watch-visit/analytics/?user_id=1&period=month&page=1&page_size=2""",
     parameters=[
         OpenApiParameter(
@@ -92,6 +130,12 @@ eg: GET /watch-visit/analytics/?user_id=1&period=month&page=1&page_size=2""",
             description="Which field to filter by.",
             required=False,
         ),
+        OpenApiParameter(
+            name="watch_id",
+            type=OpenApiTypes.STR,
+            description="Which field to filter by.",
+            required=False,
+        ),
         OpenApiParameter(
             name="period",
             type=OpenApiTypes.STR,
@@ -107,3 +151,38 @@ eg: GET /watch-visit/analytics/?user_id=1&period=month&page=1&page_size=2""",
         403: response_schema(403, ErrorResponseSerializer),
     },
 )
+
+trending_schema_info = dict(
+    tags=tags,
+    summary="track_watch_visit_trending",
+    description="""
+**PERMISSION**: Allows any access.
+
+Most visited watches over a sliding window, heaviest first.
+
+Counts are approximate: they are kept in memory with fixed-size sketches fed
+by the visit endpoints, so the response time does not depend on the number of
+visit records. Responses are cached for `TRACK_TRENDING_CACHE_TTL` seconds.
+
+eg: GET /watch-visit/trending/?window=hour&limit=10""",
+    parameters=[
+        OpenApiParameter(
+            name="window",
+            type=OpenApiTypes.STR,
+            description="Sliding window to rank visits over.",
+            required=False,
+            enum=["hour", "day", "week"],
+            default="day",
+        ),
+        OpenApiParameter(
+            name="limit",
+            type=OpenApiTypes.INT,
+            description="Number of watches to return, at most 50.",
+            required=False,
+            default=10,
+        ),
+    ],
+    responses={
+        200: response_schema(200, WatchVisitTrendingSerializer, many=True),
+    },
+)
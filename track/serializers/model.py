@@ -1,24 +1,27 @@
-from django.contrib.auth.models import User
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from track.models import WatchVisitRecord
+from utils.serializers import BatchListSerializer, BatchMethodField
 from wishlist.models import Wishlist
 
 
 class WatchVisitRecordSerializer(serializers.ModelSerializer):
-    in_wishlist = serializers.SerializerMethodField(method_name="get_in_wishlist")
+    in_wishlist = BatchMethodField(default=False)
 
     class Meta:
         model = WatchVisitRecord
         fields = "__all__"
+        list_serializer_class = BatchListSerializer
 
     @extend_schema_field(OpenApiTypes.BOOL)
-    def get_in_wishlist(self, obj):
+    def batch_in_wishlist(self, instances):
         user = self.context["request"].user
-        return (
-            Wishlist.objects.filter(user=user, watch_id=obj.watch_id)
-            .filter(deleted_at__isnull=True)
-            .exists()
+        wished = set(
+            Wishlist.objects.filter(
+                user=user,
+                watch_id__in={instance.watch_id for instance in instances},
+            ).values_list("watch_id", flat=True)
         )
+        return {instance.pk: instance.watch_id in wished for instance in instances}
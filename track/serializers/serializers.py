@@ -1,5 +1,11 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
+from wristcheck_api.constants import DEFAULT_MAX_BATCH_SIZE
+
 
 class WatchVisitRecordAddRequestSerializer(serializers.Serializer):
     watch_id = serializers.CharField(required=True)
@@ -7,3 +13,48 @@ class WatchVisitRecordAddRequestSerializer(serializers.Serializer):
 
 class WatchVisitRecordAddValidateErrorSerializer(serializers.Serializer):
     watch_id = serializers.ListSerializer(child=serializers.CharField(), required=False)
+
+
+class WatchVisitRecordBatchItemSerializer(serializers.Serializer):
+    watch_id = serializers.CharField(required=True, max_length=255)
+    visited_at = serializers.DateTimeField(required=False)
+    count = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+
+    def validate_visited_at(self, value):
+        # Visits past the event retention would only create partitions that
+        # are dropped at the next prune.
+        retention_days = settings.TRACK_VISIT_EVENT_RETENTION_DAYS
+        if value < timezone.now() - timedelta(days=retention_days):
+            raise serializers.ValidationError(
+                f"Visits older than {retention_days} days are not accepted."
+            )
+        return value
+
+    def validate(self, attrs):
+        now = timezone.now()
+        # Clients queue visits offline; clamp clock skew so a visit can not
+        # land in the future.
+        attrs["visited_at"] = min(attrs.get("visited_at") or now, now)
+        attrs.setdefault("count", 1)
+        return attrs
+
+
+class WatchVisitRecordBatchAddRequestSerializer(serializers.Serializer):
+    visits = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=DEFAULT_MAX_BATCH_SIZE,
+        help_text="List of {watch_id, visited_at, count}. "
+        "visited_at defaults to now, count defaults to 1.",
+    )
+
+
+class WatchVisitRecordBatchAddResultSerializer(serializers.Serializer):
+    watch_id = serializers.CharField(allow_null=True)
+    accepted = serializers.BooleanField()
+    errors = serializers.DictField(required=False)
+
+
+class WatchVisitTrendingSerializer(serializers.Serializer):
+    watch_id = serializers.CharField()
+    visits = serializers.IntegerField(help_text="Approximate number of visits.")
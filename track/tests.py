@@ -1,13 +1,46 @@
 # tests/test_views.py
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 import factory
 
 from account.tests import UserFactory
-from track.models import WatchVisitRecord
+from track.events import event_querysets, forget_partitions, list_partitions
+from track.ingest import VisitBuffer, record_visit, record_visits
+from track.models import (
+    WatchVisitDailyRollup,
+    WatchVisitDailySketch,
+    WatchVisitDailyUser,
+    WatchVisitRecord,
+)
+from track.rollups import apply_daily_visits, estimate_distinct, visitor_register
+from utils.management.commands.explain_querysets import seq_scans
+from wishlist.models import Wishlist
+from track.trending import SlidingWindowTopK, TrendingEngine
+
+
+@pytest.fixture(autouse=True)
+def fresh_event_partitions():
+    # Partition tables created inside a test vanish with its rolled back
+    # transaction, so the per-process cache of existing partitions must too.
+    forget_partitions()
+    yield
+    forget_partitions()
 
 
 class WatchVisitRecordFactory(factory.django.DjangoModelFactory):
@@ -18,6 +51,7 @@ class WatchVisitRecordFactory(factory.django.DjangoModelFactory):
         "random_int", min=1, max=1000
     )  # Example range, adjust as needed
     watch_id = factory.Sequence(lambda n: f"watch-{n}")
+    visited_at = factory.LazyFunction(timezone.now)
 
 
 @pytest.mark.django_db
@@ -27,13 +61,19 @@ class TestWatchVisitRecordViewSet:
     @pytest.fixture(autouse=True)
     def setup(self, db):
         self.client = APIClient()
-        self.admin_user = UserFactory(is_staff=True, is_superuser=True)
+        # Fixed ids that fall in different registers of the visitor sketches,
+        # so distinct visitor estimates are exact.
+        self.admin_user = UserFactory(
+            id=uuid.UUID(int=1), is_staff=True, is_superuser=True
+        )
         self.admin_user.set_password("password")
         self.admin_user.save()
         self.admin_user_watch = WatchVisitRecordFactory(
             user_id=self.admin_user.id, watch_id="watch_id_1"
         )
-        self.normal_user = UserFactory(is_staff=False, is_superuser=False)
+        self.normal_user = UserFactory(
+            id=uuid.UUID(int=2), is_staff=False, is_superuser=False
+        )
         self.normal_user.set_password("password")
         self.normal_user.save()
         self.normal_user_watch = WatchVisitRecordFactory(
@@ -69,11 +109,183 @@ class TestWatchVisitRecordViewSet:
         )
         assert response.status_code == status.HTTP_201_CREATED
 
+    def test_batch_add_endpoint_successful(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        visited_at = timezone.now() - timedelta(days=10)
+        data = {
+            "visits": [
+                {"watch_id": "watch_id_1", "visited_at": visited_at.isoformat()},
+                {"watch_id": "watch_id_2", "count": 2},
+                {"watch_id": "watch_id_2"},
+                {"watch_id": "watch_id_3", "count": 0},
+                {"watch_id": "watch_id_4", "visited_at": "1900-01-01T00:00:00Z"},
+            ]
+        }
+        response = self.client.post(
+            reverse("watchvisitrecord-batch-add"), data, format="json", secure=True
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["accepted"] for item in response.data] == [
+            True,
+            True,
+            True,
+            False,
+            False,
+        ]
+        assert "count" in response.data[3]["errors"]
+        assert "visited_at" in response.data[4]["errors"]
+        assert all(
+            start > visited_at.date() - timedelta(days=31)
+            for _, start, _ in list_partitions()
+        )
+        counts = dict(
+            WatchVisitRecord.objects.filter(user=self.normal_user).values_list(
+                "watch_id", "count"
+            )
+        )
+        assert counts == {"watch_id_1": 1, "watch_id_2": 3}
+        # An older offline visit is written now and does not move the latest
+        # visit backwards.
+        self.normal_user_watch.refresh_from_db()
+        assert self.normal_user_watch.updated_at > visited_at
+        assert self.normal_user_watch.visited_at > visited_at
+
+    def test_batch_add_books_each_visit_on_its_day(self):
+        now = timezone.now()
+        entries = [
+            dict(watch_id="watch_a", visited_at=now - timedelta(days=days), count=1)
+            for days in (3, 2, 0)
+        ]
+        assert record_visits(self.normal_user, entries)
+
+        record = WatchVisitRecord.objects.get(user=self.normal_user, watch_id="watch_a")
+        assert record.count == 3
+        assert sorted(
+            WatchVisitDailyRollup.objects.filter(watch_id="watch_a").values_list(
+                "day", "visits"
+            )
+        ) == [(timezone.localdate(entry["visited_at"]), 1) for entry in entries]
+
+    def test_batch_add_endpoint_unauthenticated(self):
+        response = self.client.post(
+            reverse("watchvisitrecord-batch-add"),
+            {"visits": [{"watch_id": "123"}]},
+            format="json",
+            secure=True,
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
     def test_my_own_endpoint_successful(self):
         self.client.login(username=self.normal_user.username, password="password")
         response = self.client.get(reverse("watchvisitrecord-my-own"), secure=True)
         assert response.status_code == status.HTTP_200_OK
 
+    def test_my_own_in_wishlist_query_count_does_not_grow_with_page(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        Wishlist.objects.create(user=self.normal_user, watch_id="watch_id_1")
+
+        def my_own():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse("watchvisitrecord-my-own"), {"page_size": 50}, secure=True
+                )
+            assert response.status_code == status.HTTP_200_OK
+            return response, len(queries)
+
+        _, single_page_queries = my_own()
+        WatchVisitRecordFactory.create_batch(20, user_id=self.normal_user.id)
+        response, queries = my_own()
+        assert queries == single_page_queries
+        in_wishlist = {
+            record["watch_id"]: record["in_wishlist"]
+            for record in response.data["results"]
+        }
+        assert in_wishlist.pop("watch_id_1") is True
+        assert not any(in_wishlist.values())
+
+    def test_my_own_keyset_pagination_walks_every_record_once(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        WatchVisitRecordFactory.create_batch(24, user_id=self.normal_user.id)
+        # Ties on updated_at are broken by id.
+        WatchVisitRecord.objects.filter(user=self.normal_user, id__lte=10).update(
+            updated_at=timezone.now()
+        )
+
+        seen = []
+        url = reverse("watchvisitrecord-my-own") + "?cursor=&page_size=10"
+        while url:
+            response = self.client.get(url, secure=True)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.data["count"] is None
+            seen += [record["id"] for record in response.data["results"]]
+            url = response.data["next"]
+
+        expected = list(
+            WatchVisitRecord.objects.filter(user=self.normal_user)
+            .order_by("-updated_at", "-id")
+            .values_list("id", flat=True)
+        )
+        assert seen == expected
+        assert len(seen) == 25
+
+    def test_my_own_delta_sync(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        WatchVisitRecord.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        url = reverse("watchvisitrecord-my-own")
+
+        full = self.client.get(url, {"since": ""}, secure=True).data
+        assert [row["id"] for row in full["results"]] == [self.normal_user_watch.id]
+
+        with patch("utils.mixins.DEFAULT_SYNC_SETTLE_SECONDS", 0):
+            WatchVisitRecord.objects.filter(id=self.normal_user_watch.id).update(
+                count=5, updated_at=timezone.now()
+            )
+            delta = self.client.get(url, {"since": full["sync_token"]}, secure=True)
+            assert [row["count"] for row in delta.data["results"]] == [5]
+            assert delta.data["deleted"] == []
+            again = self.client.get(
+                url, {"since": delta.data["sync_token"]}, secure=True
+            )
+            assert again.data["results"] == []
+
+    def test_my_own_delta_sync_sees_backdated_visits(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        url = reverse("watchvisitrecord-my-own")
+        with patch("utils.mixins.DEFAULT_SYNC_SETTLE_SECONDS", 0):
+            token = self.client.get(url, {"since": ""}, secure=True).data["sync_token"]
+            visited_at = timezone.now() - timedelta(days=3)
+            record_visits(
+                self.normal_user,
+                [
+                    dict(watch_id=watch_id, visited_at=visited_at, count=1)
+                    for watch_id in ("watch_a", "watch_b")
+                ],
+            )
+            delta = self.client.get(url, {"since": token}, secure=True).data
+        assert sorted(row["watch_id"] for row in delta["results"]) == [
+            "watch_a",
+            "watch_b",
+        ]
+        assert delta["results"][0]["visited_at"] is not None
+
+    def test_my_own_invalid_cursor(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        response = self.client.get(
+            reverse("watchvisitrecord-my-own"), {"cursor": "nope"}, secure=True
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_retrieve_in_wishlist(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        Wishlist.objects.create(user=self.normal_user, watch_id="watch_id_1")
+        response = self.client.get(
+            reverse(
+                "watchvisitrecord-detail", kwargs={"pk": self.normal_user_watch.id}
+            ),
+            secure=True,
+        )
+        assert response.data["in_wishlist"] is True
+
     def test_analytics_endpoint_successful(self):
         self.client.login(username=self.admin_user.username, password="password")
         response = self.client.get(
@@ -81,6 +293,110 @@ class TestWatchVisitRecordViewSet:
         )
         assert response.status_code == status.HTTP_200_OK
 
+    def test_analytics_sums_daily_rollups(self):
+        for user, watch_id in [
+            (self.normal_user, "watch_a"),
+            (self.normal_user, "watch_a"),
+            (self.admin_user, "watch_a"),
+            (self.admin_user, "watch_b"),
+        ]:
+            record_visit(user, watch_id)
+
+        self.client.login(username=self.admin_user.username, password="password")
+        response = self.client.get(
+            reverse("watchvisitrecord-analytics"), {"period": "day"}, secure=True
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [
+            {"watch_id": "watch_a", "count": 3, "unique_users": 2},
+            {"watch_id": "watch_b", "count": 1, "unique_users": 1},
+        ]
+
+        response = self.client.get(
+            reverse("watchvisitrecord-analytics"),
+            {"period": "day", "user_id": self.normal_user.id},
+            secure=True,
+        )
+        assert response.data["results"] == [
+            {"watch_id": "watch_a", "count": 2, "unique_users": 1}
+        ]
+
+    def test_analytics_counts_distinct_users_over_the_period(self):
+        now = timezone.now()
+        for user, days_ago in [
+            (self.normal_user, 0),
+            (self.normal_user, 1),
+            (self.normal_user, 2),
+            (self.admin_user, 1),
+        ]:
+            apply_daily_visits(
+                [(user.id, "watch_a", now - timedelta(days=days_ago), 1)]
+            )
+        self.client.login(username=self.admin_user.username, password="password")
+
+        def analytics(**params):
+            response = self.client.get(
+                reverse("watchvisitrecord-analytics"), params, secure=True
+            )
+            return response.data["results"]
+
+        assert analytics(period="week") == [
+            {"watch_id": "watch_a", "count": 4, "unique_users": 2}
+        ]
+        assert analytics(period="week", user_id=self.normal_user.id) == [
+            {"watch_id": "watch_a", "count": 3, "unique_users": 1}
+        ]
+        # "day" is today only.
+        assert analytics(period="day") == [
+            {"watch_id": "watch_a", "count": 1, "unique_users": 1}
+        ]
+
+    def test_rollup_catch_up_job_rebuilds_rollups(self):
+        record_visit(self.normal_user, "watch_a")
+        record_visit(self.admin_user, "watch_a")
+        expected = list(WatchVisitDailyRollup.objects.values("watch_id", "visits"))
+        WatchVisitDailyRollup.objects.update(visits=0, unique_users=0)
+        sketch = list(WatchVisitDailySketch.objects.values("register", "rank"))
+        WatchVisitDailySketch.objects.all().delete()
+
+        call_command("rollup_watch_visits", "--days", "1", stdout=StringIO())
+        rollup = WatchVisitDailyRollup.objects.get(watch_id="watch_a")
+        assert (rollup.visits, rollup.unique_users) == (2, 2)
+        assert len(sketch) == 2
+        assert sorted(
+            WatchVisitDailySketch.objects.values("register", "rank"),
+            key=lambda row: row["register"],
+        ) == sorted(sketch, key=lambda row: row["register"])
+        assert list(WatchVisitDailyRollup.objects.values("watch_id", "visits")) == (
+            expected
+        )
+
+    def test_batch_add_appends_visit_events(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        visited_at = (timezone.now() - timedelta(days=80)).replace(microsecond=0)
+        data = {
+            "visits": [
+                {"watch_id": "watch_a", "visited_at": visited_at.isoformat()},
+                {"watch_id": "watch_a", "count": 2},
+            ]
+        }
+        self.client.post(
+            reverse("watchvisitrecord-batch-add"), data, format="json", secure=True
+        )
+        querysets = event_querysets(visited_at - timedelta(days=1), timezone.now())
+        events = sorted(
+            (event.visited_at, event.count)
+            for queryset in querysets
+            for event in queryset.filter(user_id=self.normal_user.id)
+        )
+        assert len(querysets) == 2
+        assert [count for _, count in events] == [1, 2]
+        assert events[0][0] == visited_at
+
+        call_command("prune_visit_events", "--retention-days", "30", stdout=StringIO())
+        querysets = event_querysets(visited_at - timedelta(days=1), timezone.now())
+        assert [queryset.count() for queryset in querysets] == [1]
+
     def test_list_endpoint_forbidden(self):
         self.client.login(username=self.normal_user.username, password="password")
         response = self.client.get(self.list_url, secure=True)
@@ -143,3 +459,227 @@ class TestWatchVisitRecordViewSet:
             reverse("watchvisitrecord-analytics"), {"period": "month"}, secure=True
         )
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestVisitBuffer:
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.client = APIClient()
+        self.user = UserFactory(is_staff=False, is_superuser=False)
+        self.user.set_password("password")
+        self.user.save()
+
+    def test_flush_groups_visits_per_user_and_watch(self):
+        buffer = VisitBuffer(max_size=100, flush_interval=None)
+        for _ in range(3):
+            buffer.add(self.user.id, "watch_a")
+        buffer.add(self.user.id, "watch_b")
+        assert len(buffer) == 2
+        assert not WatchVisitRecord.objects.exists()
+
+        assert buffer.flush() == 2
+        counts = dict(
+            WatchVisitRecord.objects.filter(user=self.user).values_list(
+                "watch_id", "count"
+            )
+        )
+        assert counts == {"watch_a": 3, "watch_b": 1}
+
+        buffer.add(self.user.id, "watch_a")
+        buffer.flush()
+        assert WatchVisitRecord.objects.get(watch_id="watch_a").count == 4
+
+        buffer.add(self.user.id, "watch_a", timezone.now() - timedelta(days=1))
+        buffer.add(self.user.id, "watch_a")
+        assert len(buffer) == 2
+        assert buffer.flush() == 1
+        assert WatchVisitRecord.objects.get(watch_id="watch_a").count == 6
+        assert WatchVisitDailyRollup.objects.filter(watch_id="watch_a").count() == 2
+
+    def test_flush_on_size_trigger(self):
+        buffer = VisitBuffer(max_size=2, flush_interval=None)
+        buffer.add(self.user.id, "watch_a")
+        assert not WatchVisitRecord.objects.exists()
+        buffer.add(self.user.id, "watch_b")
+        assert len(buffer) == 0
+        assert WatchVisitRecord.objects.filter(user=self.user).count() == 2
+
+    @override_settings(TRACK_VISIT_INGEST_MODE="buffered")
+    def test_add_endpoint_buffered(self):
+        buffer = VisitBuffer(max_size=100, flush_interval=None)
+        self.client.login(username=self.user.username, password="password")
+        with patch("track.ingest.get_visit_buffer", return_value=buffer):
+            response = self.client.post(
+                reverse("watchvisitrecord-add"),
+                {"watch_id": "123"},
+                format="json",
+                secure=True,
+            )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["watch_id"] == "123"
+        assert not WatchVisitRecord.objects.exists()
+
+        buffer.flush()
+        assert WatchVisitRecord.objects.filter(user=self.user, watch_id="123").exists()
+
+
+@pytest.mark.django_db
+def test_visit_events_survive_partitions_pruned_by_another_process():
+    user = UserFactory()
+    record_visit(user, "watch_a")
+    [(table, _, _)] = list_partitions()
+    # Another worker prunes the partition this process still remembers.
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {connection.ops.quote_name(table)}")
+
+    record_visit(user, "watch_a")
+    now = timezone.now()
+    [queryset] = event_querysets(now - timedelta(days=1), now + timedelta(days=1))
+    assert queryset.count() == 1
+    # The retried transaction counts the visit once.
+    assert WatchVisitRecord.objects.get(user=user, watch_id="watch_a").count == 2
+    assert WatchVisitDailyRollup.objects.get(watch_id="watch_a").visits == 2
+
+    buffer = VisitBuffer(max_size=100, flush_interval=None)
+    buffer.add(user.id, "watch_b", visited_at=now - timedelta(days=3650))
+    buffer.flush()
+    assert [partition[0] for partition in list_partitions()] == [table]
+
+
+@pytest.mark.django_db
+def test_write_through_visit_runs_one_statement_per_table(
+    django_assert_num_queries,
+):
+    user = UserFactory()
+    record_visit(user, "watch_a")  # creates the partition
+    # Savepoint, record, daily user, rollup, event, release.
+    with django_assert_num_queries(6):
+        record_visit(user, "watch_a")
+    # A new visitor of the day also updates the visitor sketch.
+    with django_assert_num_queries(7):
+        record_visit(user, "watch_b")
+    assert WatchVisitDailyUser.objects.get(user=user, watch_id="watch_a").visits == 2
+    assert list(
+        WatchVisitDailyRollup.objects.order_by("watch_id").values_list(
+            "watch_id", "visits", "unique_users"
+        )
+    ) == [("watch_a", 2, 1), ("watch_b", 1, 1)]
+
+
+def test_visitor_sketches_merge_over_days():
+    user_ids = [uuid.UUID(int=i) for i in range(2000)]
+    days = [user_ids[:1500], user_ids[500:]]
+    merged = {}
+    for visitors in days:
+        for user_id in visitors:
+            register, rank = visitor_register(user_id)
+            merged[register] = max(merged.get(register, 0), rank)
+    assert abs(estimate_distinct(merged) - 2000) < 2000 * 0.15
+    assert estimate_distinct({}) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_record_visit_concurrent_increments_are_not_lost():
+    user = UserFactory()
+    threads, visits_per_thread = 8, 25
+
+    def hammer():
+        try:
+            for _ in range(visits_per_thread):
+                record_visit(user, "watch_id_1")
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(hammer) for _ in range(threads)]:
+            future.result()
+
+    record = WatchVisitRecord.objects.get(user=user, watch_id="watch_id_1")
+    assert record.count == threads * visits_per_thread
+
+
+def test_sliding_window_top_k_bounded_and_expiring():
+    window = SlidingWindowTopK(bucket_seconds=60, buckets=3, width=256, capacity=5)
+    start = 6000.0
+    for index in range(200):
+        window.add(f"watch-{index}", 1, start)
+    window.add("hot", 50, start)
+    window.add("warm", 20, start + 60)
+
+    top = window.top(2, now=start + 60)
+    assert [key for key, _ in top] == ["hot", "warm"]
+    # Count-min estimates never undercount.
+    assert top[0][1] >= 50 and top[1][1] >= 20
+    assert all(len(bucket.candidates) <= 5 for bucket in window._buckets)
+
+    # Once the first bucket leaves the window its visits no longer count.
+    assert [key for key, _ in window.top(2, now=start + 180)] == ["warm"]
+
+
+@pytest.mark.django_db
+def test_trending_endpoint_is_public_and_fed_by_visits():
+    cache.clear()
+    user = UserFactory()
+    engine = TrendingEngine(width=256, capacity=10)
+    with patch("track.ingest.get_trending_engine", return_value=engine), patch(
+        "track.views.get_trending_engine", return_value=engine
+    ):
+        for watch_id, visits in [("a", 3), ("b", 5), ("c", 1)]:
+            for _ in range(visits):
+                record_visit(user, watch_id)
+
+        response = APIClient().get(
+            reverse("watchvisitrecord-trending"),
+            {"window": "hour", "limit": 2},
+            secure=True,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [
+            {"watch_id": "b", "visits": 5},
+            {"watch_id": "a", "visits": 3},
+        ]
+
+        # Served from the cache until it expires.
+        for _ in range(4):
+            record_visit(user, "c")
+        response = APIClient().get(
+            reverse("watchvisitrecord-trending"),
+            {"window": "hour", "limit": 2},
+            secure=True,
+        )
+        assert response.data[0]["watch_id"] == "b"
+    cache.clear()
+
+
+@pytest.mark.django_db
+def test_explain_querysets_flags_only_unindexed_scans():
+    user = UserFactory()
+    WatchVisitRecordFactory.create_batch(3, user_id=user.id)
+    out = StringIO()
+    call_command("explain_querysets", "--username", user.username, stdout=out)
+    assert "0 with sequential scans" in out.getvalue()
+
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} SELECT * FROM track_watchvisitrecord WHERE count = 1")
+        assert seq_scans(cursor, cursor.fetchall()) == ["track_watchvisitrecord"]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_count_migration_counts_the_first_visit():
+    before = [("track", "0006_watchvisitrecord_visited_at")]
+    executor = MigrationExecutor(connection)
+    after = executor.loader.graph.leaf_nodes("track")
+    executor.migrate(before)
+    apps = executor.loader.project_state(before).apps
+    user = UserFactory()
+    # Visited twice under the old semantics: created at 0, incremented once.
+    apps.get_model("track", "WatchVisitRecord").objects.create(
+        user_id=user.pk, watch_id="watch_a", count=1
+    )
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(after)
+
+    assert WatchVisitRecord.objects.get(watch_id="watch_a").count == 2
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from array import array
+
+from django.conf import settings
+
+TRENDING_WINDOWS = {
+    # window: (bucket seconds, number of buckets)
+    "hour": (5 * 60, 12),
+    "day": (60 * 60, 24),
+    "week": (24 * 60 * 60, 7),
+}
+
+
+class CountMinSketch:
+    """Fixed-size frequency estimator; estimates never undercount."""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [array("q", bytes(8 * width)) for _ in range(depth)]
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        indexes = self._indexes(key)
+        for row, index in zip(self.rows, indexes):
+            row[index] += count
+        return min(row[index] for row, index in zip(self.rows, indexes))
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def clear(self):
+        for row in self.rows:
+            for index in range(self.width):
+                row[index] = 0
+
+
+class _Bucket:
+    def __init__(self, width, depth):
+        self.period = None
+        self.sketch = CountMinSketch(width, depth)
+        # Heavy-hitter candidates of this bucket: key -> estimated count.
+        self.candidates = {}
+
+    def reset(self, period):
+        self.period = period
+        self.sketch.clear()
+        self.candidates = {}
+
+
+class SlidingWindowTopK:
+    """Approximate top-K over a sliding window with fixed memory.
+
+    The window is a ring of ``buckets`` time buckets. Each bucket holds a
+    count-min sketch and at most ``capacity`` heavy-hitter candidates, so
+    memory does not depend on the number of distinct keys or visits.
+    """
+
+    def __init__(self, bucket_seconds, buckets, width=2048, depth=4, capacity=100):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self._buckets = [_Bucket(width, depth) for _ in range(buckets)]
+        self._lock = threading.Lock()
+
+    def add(self, key, count=1, at=None):
+        period = int((at or time.time()) // self.bucket_seconds)
+        bucket = self._buckets[period % len(self._buckets)]
+        with self._lock:
+            if bucket.period != period:
+                if bucket.period is not None and bucket.period > period:
+                    return  # older than the window
+                bucket.reset(period)
+            estimate = bucket.sketch.add(key, count)
+            candidates = bucket.candidates
+            if key in candidates or len(candidates) < self.capacity:
+                candidates[key] = estimate
+                return
+            weakest = min(candidates, key=candidates.get)
+            if estimate > candidates[weakest]:
+                del candidates[weakest]
+                candidates[key] = estimate
+
+    def top(self, k, now=None):
+        """:return: [(key, estimated count)] of the k heaviest keys, heaviest first"""
+        oldest = int((now or time.time()) // self.bucket_seconds) - len(self._buckets)
+        with self._lock:
+            live = [
+                bucket
+                for bucket in self._buckets
+                if bucket.period is not None and bucket.period > oldest
+            ]
+            keys = set()
+            for bucket in live:
+                keys.update(bucket.candidates)
+            scores = {
+                key: sum(bucket.sketch.estimate(key) for bucket in live) for key in keys
+            }
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+class TrendingEngine:
+    """Trending watches for every window in ``TRENDING_WINDOWS``.
+
+    Counts are kept per process. Requests are spread over the gunicorn workers
+    by the load balancer, so each worker sees a uniform sample of the traffic
+    and ranks the same watches on top; only the absolute counts are scaled
+    down by the number of workers.
+    """
+
+    def __init__(self, width=2048, depth=4, capacity=100):
+        self.windows = {
+            name: SlidingWindowTopK(bucket_seconds, buckets, width, depth, capacity)
+            for name, (bucket_seconds, buckets) in TRENDING_WINDOWS.items()
+        }
+
+    def record(self, watch_id, count=1, at=None):
+        timestamp = at.timestamp() if at is not None else time.time()
+        for window in self.windows.values():
+            window.add(watch_id, count, timestamp)
+
+    def top(self, window, k=10):
+        return self.windows[window].top(k)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_trending_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = TrendingEngine(
+                    width=settings.TRACK_TRENDING_SKETCH_WIDTH,
+                    depth=settings.TRACK_TRENDING_SKETCH_DEPTH,
+                    capacity=settings.TRACK_TRENDING_CANDIDATES,
+                )
+    return _engine
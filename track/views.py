@@ -1,6 +1,9 @@
 # views.py
-from django.db.models import Count
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Sum
 from django.utils import timezone
+from collections import defaultdict
 from datetime import timedelta
 
 from django_filters.rest_framework import DjangoFilterBackend
@@ -8,29 +11,45 @@ from drf_spectacular.utils import extend_schema
 from rest_framework import mixins, status
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from utils.mixins import CustomCreateModelMixin
-from utils.pagination import CustomPagination
+from utils.mixins import CustomCreateModelMixin, DeltaSyncMixin
+from utils.pagination import KeysetPagination
 from utils.permission import CustomGetPermissionMixin, IsOwnerOrAdminUser
-from .models import WatchVisitRecord
+from .ingest import record_visit, record_visits
+from .models import (
+    WatchVisitDailyRollup,
+    WatchVisitDailySketch,
+    WatchVisitDailyUser,
+    WatchVisitRecord,
+)
+from .rollups import estimate_distinct
 from .schemas import (
     list_schema_info,
     retrieve_schema_info,
     destroy_schema_info,
     add_schema_info,
+    batch_add_schema_info,
     my_own_schema_info,
     analytics_schema_info,
+    trending_schema_info,
 )
 from .serializers.model import WatchVisitRecordSerializer
-from .serializers.serializers import WatchVisitRecordAddRequestSerializer
+from .serializers.serializers import (
+    WatchVisitRecordAddRequestSerializer,
+    WatchVisitRecordBatchAddRequestSerializer,
+    WatchVisitRecordBatchItemSerializer,
+    WatchVisitTrendingSerializer,
+)
+from .trending import TRENDING_WINDOWS, get_trending_engine
 
 
 class WatchVisitRecordViewSet(
     CustomGetPermissionMixin,
     CustomCreateModelMixin,
+    DeltaSyncMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     mixins.ListModelMixin,
@@ -44,10 +63,12 @@ class WatchVisitRecordViewSet(
         "retrieve": [IsOwnerOrAdminUser],
         "destroy": [IsAdminUser],
         "add": [IsAuthenticated],
+        "batch_add": [IsAuthenticated],
         "analytics": [IsAdminUser],
         "my_own": [IsAuthenticated],
+        "trending": [AllowAny],
     }
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ["user_id", "watch_id"]
     search_fields = ["user_id", "watch_id"]
@@ -72,46 +93,133 @@ class WatchVisitRecordViewSet(
         serializer = WatchVisitRecordAddRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        visit_record, created = WatchVisitRecord.objects.get_or_create(
-            user=request.user, watch_id=request.data["watch_id"]
+        visit_record, persisted = record_visit(
+            request.user, serializer.validated_data["watch_id"]
         )
-        if not created:
-            visit_record.updated_at = timezone.now()
-            visit_record.count += 1
-            visit_record.save()
 
         serializer = self.get_serializer(visit_record)
         headers = self.get_success_headers(serializer.data)
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+            serializer.data,
+            status=status.HTTP_201_CREATED if persisted else status.HTTP_202_ACCEPTED,
+            headers=headers,
+        )
+
+    @extend_schema(**batch_add_schema_info)
+    @action(detail=False, methods=["post"], url_path="batch_add")
+    def batch_add(self, request, *args, **kwargs):
+        """Record a client's queued visits in one request.
+        Invalid entries are reported per item and do not block the valid ones.
+        """
+        serializer = WatchVisitRecordBatchAddRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        accepted = []
+        results = []
+        for item in serializer.validated_data["visits"]:
+            item_serializer = WatchVisitRecordBatchItemSerializer(data=item)
+            if item_serializer.is_valid():
+                accepted.append(item_serializer.validated_data)
+                results.append({"watch_id": item["watch_id"], "accepted": True})
+            else:
+                results.append(
+                    {
+                        "watch_id": item.get("watch_id"),
+                        "accepted": False,
+                        "errors": item_serializer.errors,
+                    }
+                )
+
+        persisted = record_visits(request.user, accepted)
+        return Response(
+            results,
+            status=status.HTTP_200_OK if persisted else status.HTTP_202_ACCEPTED,
         )
 
     @extend_schema(**my_own_schema_info)
     @action(detail=False, methods=["get"], url_path="my_own")
     def my_own(self, request, *args, **kwargs):
         self.queryset = self.get_queryset().filter(user=request.user)
+        if self.is_sync_request(request):
+            return self.sync_response(request, self.queryset)
         return self.list(request)
 
     @extend_schema(**analytics_schema_info)
-    @action(detail=False, methods=["get"], url_path="analytics")
+    # user_id and watch_id are applied by hand to the rollup tables, which
+    # the viewset's search and ordering fields do not exist on.
+    @action(detail=False, methods=["get"], url_path="analytics", filter_backends=[])
     def analytics(self, request, *args, **kwargs):
         period = request.query_params.get("period", "month")
-        now = timezone.now()
-        start_time_map = dict(
-            day=now - timedelta(days=1),
-            week=now - timedelta(days=7),
-            month=now - timedelta(days=30),
-            quarter=now - timedelta(days=90),
-            year=now - timedelta(days=365),
+        today = timezone.localdate()
+        period_days = dict(day=1, week=7, month=30, quarter=90, year=365)
+        # The last N calendar days, today included.
+        start_day = today - timedelta(
+            days=period_days.get(period, period_days["month"]) - 1
         )
-        self.queryset = self.get_queryset().filter(
-            created_at__gte=start_time_map.get(period, start_time_map["month"])
-        )
-        self.queryset = self.filter_queryset(self.get_queryset())
+
+        user_id = request.query_params.get("user_id")
+        if user_id:
+            # Per-user questions are answered from the per-user daily rows,
+            # which are small once filtered by user.
+            queryset = WatchVisitDailyUser.objects.filter(user_id=user_id)
+        else:
+            queryset = WatchVisitDailyRollup.objects.all()
+        queryset = queryset.filter(day__gte=start_day)
+        watch_id = request.query_params.get("watch_id")
+        if watch_id:
+            queryset = queryset.filter(watch_id=watch_id)
+
         product_visits = (
-            self.queryset.values("watch_id")
-            .annotate(count=Count("id"))
-            .order_by("-count")
+            queryset.values("watch_id")
+            .annotate(count=Sum("visits"))
+            .order_by("-count", "watch_id")
         )
         page = self.paginate_queryset(product_visits)
+
+        if user_id:
+            # The one user is the only visitor of every watch on the page.
+            for row in page:
+                row["unique_users"] = 1
+            return self.get_paginated_response(page)
+
+        # Daily distinct visitors can not be summed into distinct visitors of
+        # the period. Their daily sketches merge instead, reading at most
+        # SKETCH_REGISTERS rows per day and watch of this page.
+        ranks = defaultdict(dict)
+        for watch_id, register, rank in (
+            WatchVisitDailySketch.objects.filter(
+                day__gte=start_day, watch_id__in=[row["watch_id"] for row in page]
+            )
+            .values("watch_id", "register")
+            .annotate(rank=Max("rank"))
+            .order_by()
+            .values_list("watch_id", "register", "rank")
+        ):
+            ranks[watch_id][register] = rank
+        for row in page:
+            row["unique_users"] = estimate_distinct(ranks[row["watch_id"]])
         return self.get_paginated_response(page)
+
+    @extend_schema(**trending_schema_info)
+    @action(detail=False, methods=["get"], url_path="trending")
+    def trending(self, request, *args, **kwargs):
+        window = request.query_params.get("window", "day")
+        if window not in TRENDING_WINDOWS:
+            window = "day"
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        cache_key = f"track:trending:{window}:{limit}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = WatchVisitTrendingSerializer(
+                [
+                    dict(watch_id=watch_id, visits=visits)
+                    for watch_id, visits in get_trending_engine().top(window, limit)
+                ],
+                many=True,
+            ).data
+            cache.set(cache_key, data, settings.TRACK_TRENDING_CACHE_TTL)
+        return Response(data)
@@ -0,0 +1,46 @@
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (0 < pct <= 100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(math.ceil(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[rank]
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.3f}ms"
+
+
+@contextmanager
+def benchmark_database():
+    """Create a throwaway test database for the duration of a benchmark.
+
+    SQLite test databases default to a shared in-memory database, which
+    serialises writers from background threads, so a temporary file is used
+    instead.
+    """
+    settings_dict = connection.settings_dict
+    old_test_name = settings_dict["TEST"].get("NAME")
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        tmp_dir = tempfile.mkdtemp(prefix="wristcheck-bench-")
+        settings_dict["TEST"]["NAME"] = os.path.join(tmp_dir, "bench.sqlite3")
+    old_name = settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        settings_dict["TEST"]["NAME"] = old_test_name
+        if tmp_dir:
+            for name in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, name))
+            os.rmdir(tmp_dir)
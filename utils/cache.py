@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_shared_cache(alias="default"):
+    """Whether the ``alias`` cache is seen by every worker process, so a
+    delete in one process reaches the others. Local-memory and dummy caches
+    are not.
+    """
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl``
+    seconds. Holds at most ``max_size`` entries.
+    """
+
+    def __init__(self, max_size=10000, ttl=5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TieredCache:
+    """In-process ``LRUCache`` in front of a shared Django cache.
+
+    Reads try the local tier, then the shared tier, and refill the local
+    tier. ``delete`` clears both tiers of this process only, so other
+    processes may serve their local copy for up to ``local_ttl`` seconds.
+    A ``shared_ttl`` of 0 disables the shared tier.
+    """
+
+    def __init__(self, prefix, max_size, local_ttl, shared_ttl, alias="default"):
+        self.prefix = prefix
+        self.shared_ttl = shared_ttl
+        self.alias = alias
+        self.local = LRUCache(max_size, local_ttl)
+
+    def _shared_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None or not self.shared_ttl:
+            return value
+        value = caches[self.alias].get(self._shared_key(key))
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared_ttl:
+            caches[self.alias].set(self._shared_key(key), value, self.shared_ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared_ttl:
+            caches[self.alias].delete(self._shared_key(key))
+
+    def clear(self):
+        """Clear the local tier."""
+        self.local.clear()
@@ -0,0 +1,166 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from account.models import User
+from account.views import UserViewSet
+from track.views import WatchVisitRecordViewSet
+from wishlist.views import WishlistViewSet
+
+# (viewset, action, url name, query params) of every list-like GET endpoint.
+ENDPOINTS = [
+    (UserViewSet, "list", "user-list", {}),
+    (WishlistViewSet, "list", "wishlist-list", {}),
+    (WishlistViewSet, "my_own", "wishlist-my-own", {}),
+    (
+        WishlistViewSet,
+        "favorite_status",
+        "wishlist-favorite-status",
+        {"watch_ids": ["1", "2"]},
+    ),
+    (WatchVisitRecordViewSet, "list", "watchvisitrecord-list", {}),
+    (WatchVisitRecordViewSet, "list", "watchvisitrecord-list", {"watch_id": "1"}),
+    (WatchVisitRecordViewSet, "my_own", "watchvisitrecord-my-own", {}),
+    (WatchVisitRecordViewSet, "my_own", "watchvisitrecord-my-own", {"cursor": ""}),
+    (WatchVisitRecordViewSet, "analytics", "watchvisitrecord-analytics", {}),
+    (
+        WatchVisitRecordViewSet,
+        "analytics",
+        "watchvisitrecord-analytics",
+        {"user_id": "{user_id}"},
+    ),
+]
+
+_pg_seq_scan_re = re.compile(r"Seq Scan on (\S+)")
+
+
+def seq_scans(cursor, rows):
+    """:return: tables read with a full scan according to an EXPLAIN result"""
+    tables = set(connection.introspection.table_names())
+    # Scans of subqueries and temporary results are not flagged.
+    return [table for table in _scanned(cursor, rows) if table in tables]
+
+
+def _scanned(cursor, rows):
+    if connection.vendor == "postgresql":
+        return [
+            match.group(1)
+            for (line,) in rows
+            for match in [_pg_seq_scan_re.search(line)]
+            if match
+        ]
+    if connection.vendor == "mysql":
+        columns = [column[0] for column in cursor.description]
+        return [
+            row[columns.index("table")]
+            for row in rows
+            if row[columns.index("type")] == "ALL"
+        ]
+    # SQLite: "SCAN <table>" without "USING ... INDEX" reads the whole table.
+    return [
+        detail.split()[1]
+        for *_, detail in rows
+        if detail.startswith("SCAN ")
+        and "USING" not in detail
+        and "CONSTANT ROW" not in detail
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the list and action endpoints of the account, wishlist and track "
+        "viewsets, EXPLAIN every SELECT they issue and flag sequential scans. "
+        "Run it against representative data: pages of empty tables are not "
+        "queried at all, and planners prefer full scans of tiny tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="Run the endpoints as this user instead of an unsaved superuser.",
+        )
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help="PostgreSQL: disable sequential scans while planning, so that "
+            "on small tables a remaining seq scan means no usable index exists.",
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error if any sequential scan was found.",
+        )
+
+    def handle(self, *args, **options):
+        if options["username"]:
+            user = User.objects.get(username=options["username"])
+        else:
+            user = User(
+                id=uuid.uuid4(), username="explain", is_staff=True, is_superuser=True
+            )
+
+        flagged = 0
+        explained = 0
+        # Only GET endpoints are run; roll back anyway so nothing sticks.
+        with transaction.atomic():
+            if options["no_seqscan"] and connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for viewset, action, url_name, params in ENDPOINTS:
+                params = {
+                    key: (
+                        value.format(user_id=user.id)
+                        if isinstance(value, str)
+                        else value
+                    )
+                    for key, value in params.items()
+                }
+                queries = self.run_endpoint(user, viewset, action, url_name, params)
+                self.stdout.write(f"{viewset.__name__}.{action} {params or ''}")
+                for sql in queries:
+                    explained += 1
+                    tables = self.explain(sql, options["verbosity"])
+                    if tables:
+                        flagged += 1
+                        self.stdout.write(
+                            self.style.WARNING(f"  SEQ SCAN on {', '.join(tables)}: ")
+                            + sql[:200]
+                        )
+            transaction.set_rollback(True)
+
+        summary = f"{explained} queries explained, {flagged} with sequential scans."
+        if flagged and options["fail"]:
+            raise CommandError(summary)
+        self.stdout.write(summary)
+
+    def run_endpoint(self, user, viewset, action, url_name, params):
+        request = APIRequestFactory().get(reverse(url_name), params)
+        force_authenticate(request, user=user)
+        view = viewset.as_view({"get": action})
+        with CaptureQueriesContext(connection) as captured:
+            response = view(request)
+            response.render()
+        if response.status_code >= 400:
+            self.stderr.write(f"  {url_name} returned {response.status_code}")
+        return [
+            query["sql"]
+            for query in captured.captured_queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+
+    def explain(self, sql, verbosity):
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}")
+            rows = cursor.fetchall()
+            tables = seq_scans(cursor, rows)
+        if verbosity > 1:
+            self.stdout.write("  " + sql)
+            for row in rows:
+                self.stdout.write("    " + " ".join(str(value) for value in row))
+        return tables
@@ -1,5 +1,17 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from utils.pagination import KeysetPagination
+from wristcheck_api.constants import (
+    DEFAULT_SYNC_QUERY_PARAM,
+    DEFAULT_SYNC_SETTLE_SECONDS,
+)
+
 
 class CustomCreateModelMixin:
     """
@@ -14,3 +26,72 @@ class CustomCreateModelMixin:
             return {"Location": str(data[api_settings.URL_FIELD_NAME])}
         except (TypeError, KeyError):
             return {}
+
+
+class DeltaSyncMixin:
+    """
+    Delta sync of a client's copy of a list, e.g. ``my_own``.
+
+    ``?since=`` (empty) starts a full sync, ``?since=<sync_token>`` returns
+    only the rows added or changed after the token, ordered by
+    (updated_at, id). Rows soft-deleted through ``sync_tombstone_field`` are
+    reported by id in ``deleted``. When ``has_more`` is true the client calls
+    again right away with the new ``sync_token``.
+
+    Rows changed within the last ``DEFAULT_SYNC_SETTLE_SECONDS`` are left for
+    the next sync, and hard deletes are not reported. Tokens older than
+    ``get_sync_max_age()``, e.g. the tombstone retention, are refused with
+    410 so the client starts over with a full sync.
+    """
+
+    sync_query_param = DEFAULT_SYNC_QUERY_PARAM
+    sync_tombstone_field = None
+
+    def is_sync_request(self, request):
+        return self.sync_query_param in request.query_params
+
+    def get_sync_max_age(self):
+        """:return: timedelta after which a sync token expires, or None"""
+        return None
+
+    def sync_response(self, request, queryset):
+        since = request.query_params[self.sync_query_param]
+        settled = timezone.now() - timedelta(seconds=DEFAULT_SYNC_SETTLE_SECONDS)
+        queryset = queryset.filter(updated_at__lte=settled).order_by("updated_at", "id")
+        if since:
+            value, pk = KeysetPagination.decode_cursor(since)
+            max_age = self.get_sync_max_age()
+            if max_age is not None and value < timezone.now() - max_age:
+                return Response(
+                    {"detail": "The sync token has expired, start a full sync."},
+                    status=status.HTTP_410_GONE,
+                )
+            queryset = queryset.filter(
+                Q(updated_at__gt=value) | Q(updated_at=value, id__gt=pk)
+            )
+
+        page_size = self.paginator.get_page_size(request)
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if has_more or (rows and rows[-1].updated_at >= settled):
+            token = KeysetPagination.encode_cursor(rows[-1].updated_at, rows[-1].pk)
+        else:
+            # Everything up to the settle point was returned; moving the token
+            # there keeps its age the age of the last sync.
+            token = KeysetPagination.encode_cursor(settled, 0)
+
+        # Tombstones are scanned on a full sync too, so that the token moves
+        # past them, but there is nothing to delete on the client yet.
+        tombstone = self.sync_tombstone_field
+        dead = [row for row in rows if tombstone and getattr(row, tombstone)]
+        live = [row for row in rows if not (tombstone and getattr(row, tombstone))]
+        deleted = [row.pk for row in dead] if since else []
+        return Response(
+            {
+                "results": self.get_serializer(live, many=True).data,
+                "deleted": deleted,
+                "sync_token": token,
+                "has_more": has_more,
+            }
+        )
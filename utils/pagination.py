@@ -1,9 +1,19 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from wristcheck_api.constants import (
     DEFAULT_PAGE_SIZE,
     DEFAULT_MAX_PAGE_SIZE,
     DEFAULT_PAGE_SIZE_QUERY_PARAM,
+    DEFAULT_CURSOR_QUERY_PARAM,
 )
 
 
@@ -11,3 +21,107 @@ class CustomPagination(PageNumberPagination):
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = DEFAULT_PAGE_SIZE_QUERY_PARAM
     max_page_size = DEFAULT_MAX_PAGE_SIZE
+
+
+class KeysetPagination(CustomPagination):
+    """Page number pagination with an opt-in keyset (cursor) mode.
+
+    Clients that send ``?cursor=`` (empty for the first page) are paginated
+    on (``keyset_field``, id) instead of OFFSET: no COUNT(*) is run, ``count``
+    is null and ``next`` carries the cursor of the following page, so deep
+    pages cost as much as the first one. The response shape is unchanged and
+    clients that never send a cursor keep the page number behaviour.
+
+    Keyset mode only applies when the queryset is ordered by ``keyset_field``
+    or ``-keyset_field``; any other ordering falls back to page numbers.
+    """
+
+    cursor_query_param = DEFAULT_CURSOR_QUERY_PARAM
+    keyset_field = "updated_at"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = False
+        descending = self._keyset_descending(queryset)
+        if self.cursor_query_param not in request.query_params or descending is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        sign = "-" if descending else ""
+        queryset = queryset.order_by(f"{sign}{self.keyset_field}", f"{sign}id")
+
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.keyset_field}__{lookup}": value})
+                | Q(**{self.keyset_field: value, f"id__{lookup}": pk})
+            )
+
+        results = list(queryset[: page_size + 1])
+        self.has_next = len(results) > page_size
+        results = results[:page_size]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("count", None),
+                    ("next", self.get_next_link()),
+                    ("previous", None),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        cursor = self.encode_cursor(getattr(self.last, self.keyset_field), self.last.pk)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return None
+
+    def _keyset_descending(self, queryset):
+        """:return: True/False for -field/field ordering, None if unsupported"""
+        query = getattr(queryset, "query", None)
+        if query is None:
+            return None
+        ordering = list(query.order_by or queryset.model._meta.ordering)
+        if not ordering or ordering[0] not in (
+            self.keyset_field,
+            f"-{self.keyset_field}",
+        ):
+            return None
+        return ordering[0].startswith("-")
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        raw = json.dumps([value.isoformat(), pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if value is None:
+            raise NotFound("Invalid cursor")
+        return value, pk
@@ -3,7 +3,12 @@ from drf_spectacular.utils import OpenApiResponse, OpenApiParameter
 from rest_framework import status
 
 from utils.serializers import ErrorResponseSerializer
-from wristcheck_api.constants import DEFAULT_MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE
+from wristcheck_api.constants import (
+    DEFAULT_CURSOR_QUERY_PARAM,
+    DEFAULT_MAX_PAGE_SIZE,
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SYNC_QUERY_PARAM,
+)
 
 status_code_schema_map = {
     status.HTTP_200_OK: lambda serializer_class, many=True, *args, **kwargs: OpenApiResponse(
@@ -13,6 +18,10 @@ status_code_schema_map = {
         response=serializer_class(many=many),
         description="HTTP Created Successful Response",
     ),
+    status.HTTP_202_ACCEPTED: lambda serializer_class, many=True, *args, **kwargs: OpenApiResponse(
+        response=serializer_class(many=many),
+        description="HTTP Accepted Successful Response",
+    ),
     status.HTTP_204_NO_CONTENT: lambda serializer_class, many=True, *args, **kwargs: OpenApiResponse(
         response=None, description="HTTP No Content Successful Response"
     ),
@@ -31,6 +40,10 @@ status_code_schema_map = {
         response=ErrorResponseSerializer,
         description=kwargs.get("description", "Internal Server Error. "),
     ),
+    status.HTTP_503_SERVICE_UNAVAILABLE: lambda *args, **kwargs: OpenApiResponse(
+        response=ErrorResponseSerializer,
+        description=kwargs.get("description", "Service Unavailable. "),
+    ),
 }
 
 
@@ -63,6 +76,28 @@ def parameter_page_size(maximum=DEFAULT_MAX_PAGE_SIZE, default=DEFAULT_PAGE_SIZE
     )
 
 
+def parameter_cursor():
+    return OpenApiParameter(
+        name=DEFAULT_CURSOR_QUERY_PARAM,
+        type=OpenApiTypes.STR,
+        description="Opt in to keyset pagination: send it empty for the first page, "
+        "then follow `next`. In this mode `count` is null and `page` is ignored.",
+        required=False,
+    )
+
+
+def parameter_since():
+    return OpenApiParameter(
+        name=DEFAULT_SYNC_QUERY_PARAM,
+        type=OpenApiTypes.STR,
+        description="Delta sync: send it empty for a full sync, then the returned "
+        "`sync_token`. The response becomes "
+        "`{results, deleted, sync_token, has_more}` with only the rows changed "
+        "since the token and the ids of the deleted ones.",
+        required=False,
+    )
+
+
 def parameter_search(search_fields):
     description = "Filter results by" + "|".join(search_fields)
     return OpenApiParameter(
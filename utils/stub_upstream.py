@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real upstreams
+
+    def _respond(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        stub.hit(self.client_address)
+        time.sleep(stub.delay)
+        if isinstance(stub.payload, bytes):
+            body, content_type = stub.payload, stub.content_type
+        else:
+            body, content_type = json.dumps(stub.payload).encode(), "application/json"
+        try:
+            self.send_response(stub.status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # the client gave up waiting
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+class StubUpstream:
+    """Local HTTP server standing in for WeChat or the WristCheck API in tests
+    and benchmarks. Every request waits ``delay`` seconds, then gets
+    ``status`` with ``payload`` as JSON, or as is with ``content_type`` when
+    it is bytes. ``delay`` and ``status`` may be changed while it runs.
+
+    Usage::
+
+        with StubUpstream(delay=0.05) as upstream:
+            requests.get(upstream.url)
+    """
+
+    def __init__(self, delay=0.0, status=200, payload=None, content_type=None):
+        self.delay = delay
+        self.status = status
+        self.payload = payload if payload is not None else {}
+        self.content_type = content_type
+        self.requests = 0
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def hit(self, client_address):
+        with self._lock:
+            self.requests += 1
+            self.connections.add(client_address)
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = set()
+
+    def start(self):
+        self._server = _StubServer(("127.0.0.1", 0), _StubHandler)
+        self._server.stub = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="stub-upstream", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
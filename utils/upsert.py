@@ -0,0 +1,232 @@
+from functools import reduce
+from operator import or_
+
+from django.db import connections, router
+from django.db.models import Q
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def _conflict_clause(connection, table, unique_columns, assignments):
+    """Build the backend specific "on conflict" clause.
+
+    :param assignments: [(column, kind)] where kind is "update" (take the new
+        value), "increment" (add the new value to the stored one) or "max"
+        (keep the greater of both, or the new value if the stored one is NULL)
+    """
+    if connection.vendor == "mysql":
+        sets = []
+        for column, kind in assignments:
+            column = _quote(connection, column)
+            if kind == "increment":
+                sets.append(f"{column} = {column} + VALUES({column})")
+            elif kind == "max":
+                sets.append(
+                    f"{column} = GREATEST(COALESCE({column}, VALUES({column})), "
+                    f"VALUES({column}))"
+                )
+            else:
+                sets.append(f"{column} = VALUES({column})")
+        return "ON DUPLICATE KEY UPDATE " + ", ".join(sets)
+
+    # PostgreSQL and SQLite (>= 3.24) share the same syntax.
+    greatest = "MAX" if connection.vendor == "sqlite" else "GREATEST"
+    sets = []
+    for column, kind in assignments:
+        quoted = _quote(connection, column)
+        if kind == "increment":
+            sets.append(f"{quoted} = {table}.{quoted} + EXCLUDED.{quoted}")
+        elif kind == "max":
+            sets.append(
+                f"{quoted} = {greatest}(COALESCE({table}.{quoted}, EXCLUDED.{quoted}), "
+                f"EXCLUDED.{quoted})"
+            )
+        else:
+            sets.append(f"{quoted} = EXCLUDED.{quoted}")
+    target = ", ".join(_quote(connection, column) for column in unique_columns)
+    return f"ON CONFLICT ({target}) DO UPDATE SET " + ", ".join(sets)
+
+
+def _convert_values(connection, model, fields, rows):
+    converters = []
+    for field in fields:
+        col = field.get_col(model._meta.db_table)
+        field_converters = connection.ops.get_db_converters(
+            col
+        ) + field.get_db_converters(connection)
+        converters.append((col, field_converters))
+    for row in rows:
+        values = []
+        for value, (col, field_converters) in zip(row, converters):
+            for converter in field_converters:
+                value = converter(value, col, connection)
+            values.append(value)
+        yield values
+
+
+def _convert_rows(connection, model, fields, rows):
+    attnames = [field.attname for field in fields]
+    return [
+        model.from_db(connection.alias, attnames, values)
+        for values in _convert_values(connection, model, fields, rows)
+    ]
+
+
+def upsert(
+    model,
+    rows,
+    unique_fields,
+    update_fields=(),
+    increment_fields=(),
+    max_fields=(),
+    returning=False,
+    using=None,
+):
+    """Insert ``rows`` or update the rows they collide with, in one statement.
+
+    Runs ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite and PostgreSQL and
+    ``INSERT ... ON DUPLICATE KEY UPDATE`` on MySQL, so concurrent callers can
+    not lose each other's increments.
+
+    :param model: model class
+    :param rows: list of {field_name: value}, all with the same keys and no
+        two rows with the same unique key
+    :param unique_fields: field names of the unique constraint to collide on
+    :param update_fields: fields overwritten with the new value on conflict
+    :param increment_fields: fields incremented by the new value on conflict
+    :param max_fields: fields set to the greater of the stored and new value
+    :param returning: return the resulting model instances (in ``rows``
+        order) instead of the affected row count. Backends without
+        ``RETURNING`` support pay one extra SELECT.
+    :param using: database alias, defaults to the router's write database
+    """
+    if not rows:
+        return [] if returning else 0
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    opts = model._meta
+    table = _quote(connection, opts.db_table)
+
+    field_names = list(rows[0])
+    fields = [opts.get_field(name) for name in field_names]
+    columns = ", ".join(_quote(connection, field.column) for field in fields)
+    placeholder = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    params = []
+    for row in rows:
+        params.extend(
+            field.get_db_prep_save(row[name], connection)
+            for name, field in zip(field_names, fields)
+        )
+
+    assignments = [(opts.get_field(name).column, "update") for name in update_fields]
+    assignments += [
+        (opts.get_field(name).column, "increment") for name in increment_fields
+    ]
+    assignments += [(opts.get_field(name).column, "max") for name in max_fields]
+    unique_columns = [opts.get_field(name).column for name in unique_fields]
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES "
+        + ", ".join([placeholder] * len(rows))
+        + " "
+        + _conflict_clause(connection, table, unique_columns, assignments)
+    )
+
+    can_return = connection.features.can_return_rows_from_bulk_insert
+    result_fields = list(opts.concrete_fields)
+    if returning and can_return:
+        sql += " RETURNING " + ", ".join(
+            _quote(connection, field.column) for field in result_fields
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if not returning:
+            return cursor.rowcount
+        if can_return:
+            instances = _convert_rows(
+                connection, model, result_fields, cursor.fetchall()
+            )
+        else:
+            instances = None
+
+    if instances is None:
+        lookup = reduce(
+            or_, (Q(**{name: row[name] for name in unique_fields}) for row in rows)
+        )
+        instances = list(model._base_manager.using(using).filter(lookup))
+
+    unique = [opts.get_field(name) for name in unique_fields]
+
+    def key(values):
+        return tuple(field.to_python(value) for field, value in zip(unique, values))
+
+    by_key = {
+        key(getattr(instance, field.attname) for field in unique): instance
+        for instance in instances
+    }
+    return [by_key[key(row[name] for name in unique_fields)] for row in rows]
+
+
+def insert_ignore(model, rows, unique_fields, using=None):
+    """Insert ``rows``, skipping the ones that collide on ``unique_fields``.
+
+    :return: unique keys (tuples of ``unique_fields`` values) of the rows that
+        were actually inserted. Backends without ``RETURNING`` pay one SELECT
+        before the insert, so concurrent inserts may be misreported there.
+    """
+    if not rows:
+        return set()
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    opts = model._meta
+    unique = [opts.get_field(name) for name in unique_fields]
+
+    def key(values):
+        return tuple(field.to_python(value) for field, value in zip(unique, values))
+
+    can_return = connection.features.can_return_rows_from_bulk_insert
+    existing = set()
+    if not can_return:
+        lookup = reduce(
+            or_, (Q(**{name: row[name] for name in unique_fields}) for row in rows)
+        )
+        existing = {
+            key(values)
+            for values in model._base_manager.using(using)
+            .filter(lookup)
+            .values_list(*[field.attname for field in unique])
+        }
+
+    table = _quote(connection, opts.db_table)
+    field_names = list(rows[0])
+    fields = [opts.get_field(name) for name in field_names]
+    columns = ", ".join(_quote(connection, field.column) for field in fields)
+    placeholder = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    params = []
+    for row in rows:
+        params.extend(
+            field.get_db_prep_save(row[name], connection)
+            for name, field in zip(field_names, fields)
+        )
+    values = ", ".join([placeholder] * len(rows))
+    if connection.vendor == "mysql":
+        sql = f"INSERT IGNORE INTO {table} ({columns}) VALUES {values}"
+    else:
+        sql = f"INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT DO NOTHING"
+    if can_return:
+        sql += " RETURNING " + ", ".join(
+            _quote(connection, field.column) for field in unique
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if can_return:
+            return {
+                key(converted)
+                for converted in _convert_values(
+                    connection, model, unique, cursor.fetchall()
+                )
+            }
+    return {key(row[name] for name in unique_fields) for row in rows} - existing
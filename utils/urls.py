@@ -0,0 +1,12 @@
+from django.conf import settings
+
+
+def static_url(object_key):
+    """Public URL of an object in the static bucket.
+
+    Only joins strings: no environment lookup or URL signing, so it is cheap
+    enough to call for every serialized row.
+    """
+    if not object_key:
+        return None
+    return f"{settings.STATIC_DOMAIN}/{object_key}"
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.admin import ModelAdmin
 
 from account.admin import get_all_fields
-from wishlist.models import Wishlist
+from wishlist.models import Wishlist, WishlistArchive
 
 
 @admin.register(Wishlist)
@@ -11,3 +11,20 @@ class WishlistAdmin(ModelAdmin):
     list_display_links = list_display
     list_filter = []
     search_fields = ["user_id", "watch_id"]
+
+    def get_queryset(self, request):
+        # Same as ModelAdmin.get_queryset, with the cancelled items that the
+        # default manager hides.
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+@admin.register(WishlistArchive)
+class WishlistArchiveAdmin(ModelAdmin):
+    list_display = get_all_fields(WishlistArchive)
+    list_display_links = list_display
+    list_filter = []
+    search_fields = ["user_id", "watch_id"]
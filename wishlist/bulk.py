@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.utils import timezone
+
+from utils.upsert import upsert
+from wishlist.cache import invalidate_favorites
+from wishlist.models import Wishlist
+
+ADDED = "added"
+RESTORED = "restored"
+UNCHANGED = "unchanged"
+CANCELLED = "cancelled"
+NOT_FOUND = "not_found"
+
+
+def _lock_states(user_id, watch_ids):
+    """:return: {watch_id: deleted_at} of the user's existing rows, locked"""
+    return dict(
+        Wishlist.objects.with_deleted()
+        .select_for_update()
+        .filter(user_id=user_id, watch_id__in=watch_ids)
+        .order_by()
+        .values_list("watch_id", "deleted_at")
+    )
+
+
+def bulk_add(user_id, watch_ids):
+    """Add watches to a wishlist: insert the new ones and undelete the
+    cancelled ones with one upsert, in one transaction.
+
+    :return: [(watch_id, ADDED | RESTORED | UNCHANGED)] in request order,
+        without duplicates
+    """
+    watch_ids = list(dict.fromkeys(watch_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        states = _lock_states(user_id, watch_ids)
+        changed = [
+            watch_id
+            for watch_id in watch_ids
+            if watch_id not in states or states[watch_id] is not None
+        ]
+        upsert(
+            Wishlist,
+            [
+                dict(
+                    user_id=user_id,
+                    watch_id=watch_id,
+                    deleted_at=None,
+                    created_at=now,
+                    updated_at=now,
+                )
+                for watch_id in changed
+            ],
+            unique_fields=["user_id", "watch_id"],
+            update_fields=["deleted_at", "updated_at"],
+        )
+        if changed:
+            invalidate_favorites(user_id)
+    return [
+        (
+            watch_id,
+            (
+                ADDED
+                if watch_id not in states
+                else RESTORED if states[watch_id] is not None else UNCHANGED
+            ),
+        )
+        for watch_id in watch_ids
+    ]
+
+
+def bulk_cancel(user_id, watch_ids):
+    """Soft-delete watches from a wishlist with one UPDATE.
+
+    :return: [(watch_id, CANCELLED | UNCHANGED | NOT_FOUND)] in request
+        order, without duplicates; UNCHANGED items were already cancelled
+    """
+    watch_ids = list(dict.fromkeys(watch_ids))
+    now = timezone.now()
+    with transaction.atomic():
+        states = _lock_states(user_id, watch_ids)
+        live = [watch_id for watch_id in watch_ids if states.get(watch_id, now) is None]
+        if live:
+            Wishlist.objects.filter(user_id=user_id, watch_id__in=live).update(
+                deleted_at=now, updated_at=now
+            )
+            invalidate_favorites(user_id)
+    return [
+        (
+            watch_id,
+            (
+                NOT_FOUND
+                if watch_id not in states
+                else CANCELLED if states[watch_id] is None else UNCHANGED
+            ),
+        )
+        for watch_id in watch_ids
+    ]
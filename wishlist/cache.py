@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from utils.cache import is_shared_cache
+from wishlist.models import Wishlist
+from wristcheck_api.constants import DEFAULT_IN_CHUNK_SIZE
+
+FAVORITES_CACHE_KEY = "wishlist:favorites:{user_id}:{generation}"
+FAVORITES_GENERATION_KEY = "wishlist:favorites:{user_id}:generation"
+
+
+def favorites_cache_enabled():
+    """The favorites cache is used only with a TTL and a cache shared by all
+    workers. Invalidations are not seen by other workers otherwise, which
+    would serve stale favorites until the TTL.
+    """
+    return bool(settings.WISHLIST_FAVORITES_CACHE_TTL) and is_shared_cache(
+        settings.WISHLIST_FAVORITES_CACHE_ALIAS
+    )
+
+
+def _cache():
+    return caches[settings.WISHLIST_FAVORITES_CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    return FAVORITES_GENERATION_KEY.format(user_id=user_id)
+
+
+def _generation(user_id):
+    """Current generation of the user's favorites, bumped on every change.
+
+    A missing (e.g. evicted) generation restarts from the clock, so it does
+    not fall back on a generation whose set may still be cached.
+    """
+    cache = _cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _cache_key(user_id, generation):
+    return FAVORITES_CACHE_KEY.format(user_id=user_id, generation=generation)
+
+
+def get_favorite_set(user_id):
+    """Watch ids of the user's live wishlist, from the cache when possible.
+
+    :return: frozenset, or None when caching is disabled (see
+        ``favorites_cache_enabled``) or the wishlist is larger than
+        ``WISHLIST_FAVORITES_CACHE_MAX_SIZE``
+    """
+    if not favorites_cache_enabled():
+        return None
+    cache = _cache()
+    # Read before the database, so a set built from rows that changed
+    # meanwhile is stored under a generation nobody reads anymore.
+    key = _cache_key(user_id, _generation(user_id))
+    favorites = cache.get(key)
+    if favorites is False:
+        return None
+    if favorites is not None:
+        return favorites
+
+    max_size = settings.WISHLIST_FAVORITES_CACHE_MAX_SIZE
+    watch_ids = list(
+        Wishlist.objects.filter(user_id=user_id)
+        .order_by()
+        .values_list("watch_id", flat=True)[: max_size + 1]
+    )
+    if len(watch_ids) > max_size:
+        # Remember that this wishlist is too large, so the next calls go
+        # straight to the IN lookup.
+        cache.set(key, False, settings.WISHLIST_FAVORITES_CACHE_TTL)
+        return None
+    favorites = frozenset(watch_ids)
+    cache.set(key, favorites, settings.WISHLIST_FAVORITES_CACHE_TTL)
+    return favorites
+
+
+def favorite_watch_ids(user_id, watch_ids, chunk_size=DEFAULT_IN_CHUNK_SIZE):
+    """:return: the subset of ``watch_ids`` in the user's live wishlist
+
+    Without a cached set the ids are deduplicated and looked up in IN
+    chunks of at most ``chunk_size``, one query after the other.
+    """
+    favorites = get_favorite_set(user_id)
+    if favorites is not None:
+        return favorites.intersection(watch_ids)
+    watch_ids = list(dict.fromkeys(watch_ids))
+    queryset = (
+        Wishlist.objects.filter(user_id=user_id)
+        .order_by()
+        .values_list("watch_id", flat=True)
+    )
+    found = set()
+    for start in range(0, len(watch_ids), chunk_size):
+        found.update(
+            queryset.filter(watch_id__in=watch_ids[start : start + chunk_size])
+        )
+    return found
+
+
+def _bump_generation(user_id):
+    try:
+        _cache().incr(_generation_key(user_id))
+    except ValueError:
+        pass  # no generation yet, the next read starts a new one
+
+
+def invalidate_favorites(user_id):
+    """Move the user's favorites to a new generation once the current
+    transaction commits, which orphans the cached set.
+    """
+    if favorites_cache_enabled():
+        transaction.on_commit(lambda: _bump_generation(user_id))
@@ -0,0 +1,83 @@
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from account.models import User
+from utils.benchmark import benchmark_database, format_ms, percentile
+from utils.cache import is_shared_cache
+from wishlist.cache import favorite_watch_ids
+from wishlist.models import Wishlist
+from wristcheck_api.constants import DEFAULT_IN_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Time favorite_status lookups of 10 to 5,000 ids on a throwaway "
+        "database: one IN query, chunked IN queries and the cached set. The "
+        "cached set needs WISHLIST_FAVORITES_CACHE_ALIAS to be a shared cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000]
+        )
+        parser.add_argument("--wishlist", type=int, default=2000)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_IN_CHUNK_SIZE)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=2068)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = User.objects.create(id=uuid.uuid4(), username="bench")
+            now = timezone.now()
+            Wishlist.objects.bulk_create(
+                [
+                    Wishlist(user=user, watch_id=f"watch-{i}", updated_at=now)
+                    for i in range(options["wishlist"])
+                ],
+                batch_size=1000,
+            )
+            rng = random.Random(options["seed"])
+            strategies = [
+                ("single IN", dict(chunk_size=10**9), 0),
+                ("chunked IN", dict(chunk_size=options["chunk_size"]), 0),
+            ]
+            if is_shared_cache(settings.WISHLIST_FAVORITES_CACHE_ALIAS):
+                strategies.append(("cached set", {}, 300))
+            else:
+                self.stdout.write(
+                    "Skipping the cached set: WISHLIST_FAVORITES_CACHE_ALIAS "
+                    "is not a shared cache."
+                )
+            for size in options["sizes"]:
+                # About half of the requested ids are favorites.
+                watch_ids = [
+                    f"watch-{rng.randrange(options['wishlist'] * 2)}"
+                    for _ in range(size)
+                ]
+                for name, kwargs, ttl in strategies:
+                    self.run_strategy(user, watch_ids, name, kwargs, ttl, options)
+
+    def run_strategy(self, user, watch_ids, name, kwargs, ttl, options):
+        caches[settings.WISHLIST_FAVORITES_CACHE_ALIAS].clear()
+        latencies = []
+        with override_settings(
+            WISHLIST_FAVORITES_CACHE_TTL=ttl,
+            WISHLIST_FAVORITES_CACHE_MAX_SIZE=options["wishlist"],
+        ):
+            favorite_watch_ids(user.id, watch_ids, **kwargs)  # warm up
+            for _ in range(options["repeat"]):
+                t0 = time.perf_counter()
+                found = favorite_watch_ids(user.id, watch_ids, **kwargs)
+                latencies.append(time.perf_counter() - t0)
+        self.stdout.write(
+            f"ids={len(watch_ids):>5} {name:>10}: favorites={len(found)} "
+            f"p50={format_ms(percentile(latencies, 50))} "
+            f"p99={format_ms(percentile(latencies, 99))}"
+        )
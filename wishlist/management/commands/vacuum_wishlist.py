@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wishlist.vacuum import VACUUM_ARCHIVE, VACUUM_PURGE, vacuum_wishlist
+
+
+class Command(BaseCommand):
+    help = (
+        "Vacuum job for cancelled wishlist items: purge, or archive to "
+        "WishlistArchive, the tombstones older than the retention, in small "
+        "throttled batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.WISHLIST_TOMBSTONE_RETENTION_DAYS,
+            help="At least WISHLIST_TOMBSTONE_RETENTION_DAYS, the oldest delta "
+            "sync token accepted, so no client misses a cancellation.",
+        )
+        parser.add_argument(
+            "--mode", choices=[VACUUM_PURGE, VACUUM_ARCHIVE], default=VACUUM_PURGE
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches.",
+        )
+
+    def handle(self, *args, **options):
+        min_days = settings.WISHLIST_TOMBSTONE_RETENTION_DAYS
+        if options["retention_days"] < min_days:
+            raise CommandError(
+                f"--retention-days must be at least {min_days} "
+                "(WISHLIST_TOMBSTONE_RETENTION_DAYS): delta sync clients may "
+                "not have seen younger tombstones yet."
+            )
+        cutoff = timezone.now() - timedelta(days=options["retention_days"])
+
+        def progress(stats):
+            self.stdout.write(
+                f"batch {stats.batches}: {stats.rows} row(s), "
+                f"{stats.rows_per_second:.0f} rows/s"
+            )
+
+        stats = vacuum_wishlist(
+            cutoff,
+            mode=options["mode"],
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            progress=progress,
+        )
+        self.stdout.write(
+            f"Vacuumed {stats.rows} tombstone(s) ({options['mode']}) in "
+            f"{stats.elapsed:.1f}s, {stats.rows_per_second:.0f} rows/s."
+        )
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wishlist", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wishlist",
+            index=models.Index(
+                fields=["updated_at", "id"], name="wishlist_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wishlist",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="wishlist_user_updated_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wishlist", "0002_wishlist_wishlist_updated_idx_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wishlist",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=["user", "updated_at", "id"],
+                name="wishlist_live_user_updated_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="wishlist",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=["updated_at", "id"],
+                name="wishlist_live_updated_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wishlist", "0003_wishlist_wishlist_live_user_updated_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WishlistArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("wishlist_id", models.BigIntegerField()),
+                ("user_id", models.UUIDField()),
+                ("watch_id", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("deleted_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
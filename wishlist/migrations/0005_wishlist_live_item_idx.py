@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("wishlist", "0004_wishlistarchive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="wishlist",
+            index=models.Index(
+                condition=models.Q(("deleted_at__isnull", True)),
+                fields=["user", "watch_id"],
+                name="wishlist_live_item_idx",
+            ),
+        ),
+    ]
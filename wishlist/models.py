@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 
 from account.models import User
 from wristcheck_api.models import TimestampedModel, SoftDeletedModel
@@ -11,3 +12,42 @@ class Wishlist(TimestampedModel, SoftDeletedModel):
     class Meta:
         unique_together = ("user", "watch_id")
         ordering = ["-updated_at"]
+        indexes = [
+            # Keyset pagination over (updated_at, id), globally and per user.
+            models.Index(fields=["updated_at", "id"], name="wishlist_updated_idx"),
+            models.Index(
+                fields=["user", "updated_at", "id"], name="wishlist_user_updated_idx"
+            ),
+            # Live rows only, which the default manager returns. Not
+            # created on backends without partial indexes (MySQL), where the
+            # indexes above serve instead.
+            models.Index(
+                fields=["user", "updated_at", "id"],
+                condition=Q(deleted_at__isnull=True),
+                name="wishlist_live_user_updated_idx",
+            ),
+            models.Index(
+                fields=["updated_at", "id"],
+                condition=Q(deleted_at__isnull=True),
+                name="wishlist_live_updated_idx",
+            ),
+            # Point lookups of live items (favorite_status, in_wishlist).
+            # Uniqueness stays with unique_together.
+            models.Index(
+                fields=["user", "watch_id"],
+                condition=Q(deleted_at__isnull=True),
+                name="wishlist_live_item_idx",
+            ),
+        ]
+
+
+class WishlistArchive(models.Model):
+    """Cancelled wishlist items moved out of ``Wishlist`` by the vacuum job."""
+
+    wishlist_id = models.BigIntegerField()
+    user_id = models.UUIDField()
+    watch_id = models.CharField(max_length=255, null=False, blank=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
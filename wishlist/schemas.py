@@ -4,6 +4,8 @@ from drf_spectacular.utils import OpenApiParameter
 from utils.schemas import (
     response_schema,
     parameter_page_size,
+    parameter_cursor,
+    parameter_since,
     parameter_ordering,
     parameter_search,
 )
@@ -12,13 +14,18 @@ from wishlist.serializers.models import WishlistSerializer
 from wishlist.serializers.serializers import (
     WishlistAddRequestSerializer,
     FavoriteStatusRequestSerializer,
+    FavoriteStatusBatchRequestSerializer,
     FavoriteStatusResponseSerializer,
     WishlistAddValidateErrorSerializer,
     WishlistCancelRequestSerializer,
+    WishlistBulkRequestSerializer,
+    WishlistBulkResultSerializer,
 )
 from wristcheck_api.constants import (
     DEFAULT_PAGE_SIZE,
     DEFAULT_MAX_PAGE_SIZE,
+    DEFAULT_MAX_FAVORITE_STATUS_IDS,
+    DEFAULT_MAX_BATCH_SIZE,
     USUAL_ORDERING_FIELDS,
     USUAL_ORDERING,
 )
@@ -31,6 +38,7 @@ list_schema_info = dict(
     description="**PERMISSION**: Allows access only to admin users.",
     parameters=[
         parameter_page_size(),
+        parameter_cursor(),
         parameter_ordering(USUAL_ORDERING_FIELDS, default=f"-{USUAL_ORDERING}"),
         parameter_search(["watch_id", "username"]),
     ],
@@ -87,10 +95,43 @@ cancel_schema_info = dict(
     },
 )
 
+bulk_add_schema_info = dict(
+    tags=tags,
+    summary="wishlist_bulk_add",
+    description=f"""**PERMISSION**: Allows access only to authenticated users.
+
+Add up to {DEFAULT_MAX_BATCH_SIZE} watches at once, e.g. when importing a wishlist.
+Returns one item per distinct watch_id, in request order, with `result` one of
+`added`, `restored` (it had been cancelled) or `unchanged`.""",
+    request=WishlistBulkRequestSerializer,
+    responses={
+        200: response_schema(200, WishlistBulkResultSerializer, many=True),
+        400: response_schema(400, WishlistBulkRequestSerializer),
+        401: response_schema(401, ErrorResponseSerializer),
+    },
+)
+
+bulk_cancel_schema_info = dict(
+    tags=tags,
+    summary="wishlist_bulk_cancel",
+    description=f"""**PERMISSION**: Allows access only to authenticated users.
+
+Cancel up to {DEFAULT_MAX_BATCH_SIZE} watches at once, e.g. to clear a wishlist.
+Returns one item per distinct watch_id, in request order, with `result` one of
+`cancelled`, `unchanged` (it was already cancelled) or `not_found`.""",
+    request=WishlistBulkRequestSerializer,
+    responses={
+        200: response_schema(200, WishlistBulkResultSerializer, many=True),
+        400: response_schema(400, WishlistBulkRequestSerializer),
+        401: response_schema(401, ErrorResponseSerializer),
+    },
+)
+
 my_own_schema_info = dict(
     tags=tags,
     summary="wishlist_my_own",
     description="**PERMISSION**: Allows access only to authenticated users.",
+    parameters=[parameter_page_size(), parameter_cursor(), parameter_since()],
     responses={
         200: response_schema(200, WishlistSerializer, many=True),
         401: response_schema(401, ErrorResponseSerializer),
@@ -118,3 +159,19 @@ favorite_status_schema_info = dict(
         401: response_schema(401, ErrorResponseSerializer),
     },
 )
+
+favorite_status_batch_schema_info = dict(
+    tags=tags,
+    summary="favorite_status_batch",
+    description=f"""Same as `GET favorite_status` with the ids in the body, for pages with
+    too many ids for a URL. Accepts up to {DEFAULT_MAX_FAVORITE_STATUS_IDS} ids; duplicates are
+    dropped and the results keep the order of first appearance.<br>
+    **PERMISSION**: Allows access only to authenticated users.
+    """,
+    request=FavoriteStatusBatchRequestSerializer,
+    responses={
+        200: FavoriteStatusResponseSerializer(many=True),
+        400: response_schema(400, FavoriteStatusBatchRequestSerializer),
+        401: response_schema(401, ErrorResponseSerializer),
+    },
+)
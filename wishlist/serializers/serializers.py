@@ -1,5 +1,11 @@
 from rest_framework import serializers
 
+from wishlist.bulk import ADDED, CANCELLED, NOT_FOUND, RESTORED, UNCHANGED
+from wristcheck_api.constants import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_FAVORITE_STATUS_IDS,
+)
+
 
 class WishlistAddRequestSerializer(serializers.Serializer):
     watch_id = serializers.CharField(required=True)
@@ -13,10 +19,33 @@ class WishlistAddValidateErrorSerializer(serializers.Serializer):
     watch_id = serializers.ListSerializer(child=serializers.CharField(), required=False)
 
 
+class WishlistBulkRequestSerializer(serializers.Serializer):
+    watch_ids = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=DEFAULT_MAX_BATCH_SIZE,
+    )
+
+
+class WishlistBulkResultSerializer(serializers.Serializer):
+    watch_id = serializers.CharField()
+    result = serializers.ChoiceField(
+        choices=[ADDED, RESTORED, CANCELLED, UNCHANGED, NOT_FOUND]
+    )
+
+
 class FavoriteStatusRequestSerializer(serializers.Serializer):
     watch_ids = serializers.ListField(child=serializers.CharField(), required=True)
 
 
+class FavoriteStatusBatchRequestSerializer(serializers.Serializer):
+    watch_ids = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=DEFAULT_MAX_FAVORITE_STATUS_IDS,
+    )
+
+
 class FavoriteStatusResponseSerializer(serializers.Serializer):
     watch_id = serializers.CharField()
     favorite = serializers.BooleanField()
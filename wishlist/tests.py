@@ -1,12 +1,32 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.contrib import admin
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
 import factory
 
 from account.tests import UserFactory
-from wishlist.models import Wishlist
+from wishlist.cache import (
+    _generation_key,
+    favorite_watch_ids,
+    favorites_cache_enabled,
+    get_favorite_set,
+    invalidate_favorites,
+)
+from wishlist.admin import WishlistAdmin
+from wishlist.models import Wishlist, WishlistArchive
+from wishlist.vacuum import VACUUM_ARCHIVE, vacuum_wishlist
 
 
 class WishlistFactory(factory.django.DjangoModelFactory):
@@ -70,6 +90,25 @@ class TestWatchVisitRecordViewSet:
         )
         assert response.status_code == status.HTTP_201_CREATED
 
+    def test_add_endpoint_undeletes_cancelled_item(self):
+        self.client.login(username=self.normal_user.username, password="password")
+        self.client.post(
+            reverse("wishlist-cancel"),
+            {"watch_id": "watch_id_1"},
+            secure=True,
+            format="json",
+        )
+        response = self.client.post(
+            reverse("wishlist-add"),
+            {"watch_id": "watch_id_1"},
+            secure=True,
+            format="json",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] == self.normal_user_watch.id
+        assert response.data["deleted_at"] is None
+        assert Wishlist.objects.filter(user=self.normal_user).count() == 1
+
     def test_my_own_endpoint_successful(self):
         self.client.login(username=self.normal_user.username, password="password")
         response = self.client.get(reverse("wishlist-my-own"), secure=True)
@@ -116,3 +155,309 @@ class TestWatchVisitRecordViewSet:
     def test_my_own_endpoint_unauthenticated(self):
         response = self.client.get(reverse("wishlist-my-own"), secure=True)
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestFavoriteStatus:
+    @pytest.fixture(autouse=True)
+    def setup(self, db, django_capture_on_commit_callbacks, settings, shared_cache):
+        cache.clear()
+        settings.WISHLIST_FAVORITES_CACHE_ALIAS = "shared"
+        self.cache = shared_cache
+        self.capture_on_commit = django_capture_on_commit_callbacks
+        self.client = APIClient()
+        self.user = UserFactory(is_staff=False, is_superuser=False)
+        self.client.force_authenticate(self.user)
+        self.item = WishlistFactory(user_id=self.user.id, watch_id="watch_1")
+        WishlistFactory(user_id=self.user.id, watch_id="watch_2")
+        yield
+        cache.clear()
+
+    def favorite_status(self, *watch_ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("wishlist-favorite-status"),
+                {"watch_ids": list(watch_ids)},
+                secure=True,
+            )
+        assert response.status_code == status.HTTP_200_OK
+        return {item["watch_id"]: item["favorite"] for item in response.data}, len(
+            queries
+        )
+
+    def test_answered_from_cache_in_request_order(self):
+        response = self.client.get(
+            reverse("wishlist-favorite-status"),
+            {"watch_ids": ["watch_3", "watch_1", "watch_2"]},
+            secure=True,
+        )
+        assert [item["watch_id"] for item in response.data] == [
+            "watch_3",
+            "watch_1",
+            "watch_2",
+        ]
+        assert [item["favorite"] for item in response.data] == [False, True, True]
+
+        favorites, queries = self.favorite_status("watch_1", "watch_3")
+        assert favorites == {"watch_1": True, "watch_3": False}
+        assert queries == 0
+
+    def test_add_cancel_and_destroy_invalidate(self):
+        self.favorite_status("watch_1")
+
+        with self.capture_on_commit(execute=True):
+            self.client.post(
+                reverse("wishlist-add"),
+                {"watch_id": "watch_3"},
+                format="json",
+                secure=True,
+            )
+        assert self.favorite_status("watch_3")[0] == {"watch_3": True}
+
+        with self.capture_on_commit(execute=True):
+            self.client.post(
+                reverse("wishlist-cancel"),
+                {"watch_id": "watch_3"},
+                format="json",
+                secure=True,
+            )
+        assert self.favorite_status("watch_3")[0] == {"watch_3": False}
+
+        with self.capture_on_commit(execute=True):
+            self.client.delete(
+                reverse("wishlist-detail", kwargs={"pk": self.item.id}), secure=True
+            )
+        assert self.favorite_status("watch_1")[0] == {"watch_1": False}
+
+    def test_change_during_a_cache_fill_is_not_overwritten(self):
+        set_cache = self.cache.set
+
+        def cancel_then_set(key, value, *args, **kwargs):
+            # Another request cancels watch_1 between this read and the set
+            # of the favorites (not of the generation).
+            if isinstance(value, frozenset):
+                with self.capture_on_commit(execute=True):
+                    Wishlist.objects.filter(id=self.item.id).update(
+                        deleted_at=timezone.now()
+                    )
+                    invalidate_favorites(self.user.id)
+            set_cache(key, value, *args, **kwargs)
+
+        with patch.object(self.cache, "set", side_effect=cancel_then_set):
+            assert get_favorite_set(self.user.id) == {"watch_1", "watch_2"}
+        assert get_favorite_set(self.user.id) == {"watch_2"}
+
+    @override_settings(WISHLIST_FAVORITES_CACHE_MAX_SIZE=1)
+    def test_large_wishlist_is_not_cached(self):
+        assert self.favorite_status("watch_1", "watch_9")[0] == {
+            "watch_1": True,
+            "watch_9": False,
+        }
+        assert self.favorite_status("watch_1")[1] == 1
+
+    def test_post_dedupes_and_keeps_request_order(self):
+        response = self.client.post(
+            reverse("wishlist-favorite-status"),
+            {"watch_ids": ["watch_9", "watch_2", "watch_9", "watch_1"]},
+            format="json",
+            secure=True,
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [
+            {"watch_id": "watch_9", "favorite": False},
+            {"watch_id": "watch_2", "favorite": True},
+            {"watch_id": "watch_1", "favorite": True},
+        ]
+
+    @override_settings(WISHLIST_FAVORITES_CACHE_ALIAS="default")
+    def test_not_cached_in_a_per_process_cache(self):
+        # Invalidations would not reach other workers, so every call queries.
+        assert not favorites_cache_enabled()
+        assert self.favorite_status("watch_1")[1] == 1
+        assert self.favorite_status("watch_1")[1] == 1
+        Wishlist.objects.filter(id=self.item.id).update(deleted_at=timezone.now())
+        assert self.favorite_status("watch_1")[0] == {"watch_1": False}
+        assert cache.get(_generation_key(self.user.id)) is None
+
+    @override_settings(WISHLIST_FAVORITES_CACHE_TTL=0)
+    def test_uncached_lookup_runs_in_chunks(self):
+        watch_ids = [f"watch_{i}" for i in range(25)] + ["watch_1"]
+        with CaptureQueriesContext(connection) as queries:
+            found = favorite_watch_ids(self.user.id, watch_ids, chunk_size=10)
+        assert found == {"watch_1", "watch_2"}
+        assert len(queries) == 3
+
+
+@pytest.mark.django_db
+def test_my_own_delta_sync_returns_changes_and_tombstones():
+    user = UserFactory()
+    client = APIClient()
+    client.force_authenticate(user)
+    hour_ago = timezone.now() - timedelta(hours=1)
+    kept = WishlistFactory(user_id=user.id, watch_id="kept")
+    cancelled = WishlistFactory(user_id=user.id, watch_id="cancelled")
+    WishlistFactory(user_id=user.id, watch_id="old", deleted_at=hour_ago)
+    WishlistFactory(user_id=UserFactory().id, watch_id="someone else")
+    Wishlist.all_objects.update(updated_at=hour_ago)
+
+    def sync(since, **params):
+        response = client.get(
+            reverse("wishlist-my-own"), {"since": since, **params}, secure=True
+        )
+        assert response.status_code == status.HTTP_200_OK
+        return response.data
+
+    full = sync("")
+    assert [row["watch_id"] for row in full["results"]] == ["kept", "cancelled"]
+    assert full["deleted"] == [] and full["has_more"] is False
+    assert sync(full["sync_token"])["results"] == []
+
+    with patch("utils.mixins.DEFAULT_SYNC_SETTLE_SECONDS", 0):
+        now = timezone.now()
+        Wishlist.objects.filter(id=cancelled.id).update(deleted_at=now, updated_at=now)
+        WishlistFactory(user_id=user.id, watch_id="new")
+        # Rows changed within the settle window wait for the next sync.
+        WishlistFactory(user_id=user.id, watch_id="unsettled")
+        Wishlist.objects.filter(watch_id="unsettled").update(
+            updated_at=timezone.now() + timedelta(minutes=1)
+        )
+        delta = sync(full["sync_token"])
+    assert [row["watch_id"] for row in delta["results"]] == ["new"]
+    assert delta["deleted"] == [cancelled.id]
+
+    first = sync("", page_size=1)
+    assert first["has_more"] is True
+    assert [row["id"] for row in first["results"]] == [kept.id]
+
+    # Tokens expire with the tombstone retention.
+    with override_settings(WISHLIST_TOMBSTONE_RETENTION_DAYS=0):
+        response = client.get(
+            reverse("wishlist-my-own"), {"since": first["sync_token"]}, secure=True
+        )
+    assert response.status_code == status.HTTP_410_GONE
+
+
+@pytest.mark.django_db
+def test_bulk_add_and_cancel(django_capture_on_commit_callbacks):
+    cache.clear()
+    user = UserFactory()
+    client = APIClient()
+    client.force_authenticate(user)
+    WishlistFactory(user_id=user.id, watch_id="live")
+    WishlistFactory(user_id=user.id, watch_id="cancelled", deleted_at=timezone.now())
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(
+            reverse("wishlist-bulk-add"),
+            {"watch_ids": ["new", "live", "cancelled", "new"]},
+            format="json",
+            secure=True,
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == [
+        {"watch_id": "new", "result": "added"},
+        {"watch_id": "live", "result": "unchanged"},
+        {"watch_id": "cancelled", "result": "restored"},
+    ]
+    assert len(queries) <= 4  # savepoint, select, upsert, release
+    assert set(
+        Wishlist.objects.filter(user=user, deleted_at__isnull=True).values_list(
+            "watch_id", flat=True
+        )
+    ) == {"new", "live", "cancelled"}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(
+            reverse("wishlist-bulk-cancel"),
+            {"watch_ids": ["live", "missing", "new"]},
+            format="json",
+            secure=True,
+        )
+    assert [item["result"] for item in response.data] == [
+        "cancelled",
+        "not_found",
+        "cancelled",
+    ]
+    assert set(
+        Wishlist.objects.filter(user=user, deleted_at__isnull=True).values_list(
+            "watch_id", flat=True
+        )
+    ) == {"cancelled"}
+    assert favorite_watch_ids(user.id, ["live", "cancelled"]) == {"cancelled"}
+    cache.clear()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mode", ["purge", VACUUM_ARCHIVE])
+def test_vacuum_wishlist_removes_only_old_tombstones(mode):
+    user = UserFactory()
+    now = timezone.now()
+    old = [
+        WishlistFactory(user_id=user.id, deleted_at=now - timedelta(days=40))
+        for _ in range(5)
+    ]
+    recent = WishlistFactory(user_id=user.id, deleted_at=now - timedelta(days=1))
+    live = WishlistFactory(user_id=user.id)
+
+    batches = []
+    stats = vacuum_wishlist(
+        now - timedelta(days=30),
+        mode=mode,
+        batch_size=2,
+        sleep=0,
+        progress=lambda stats: batches.append(stats.rows),
+    )
+    assert stats.rows == 5
+    assert batches == [2, 4, 5]
+    assert set(Wishlist.all_objects.values_list("id", flat=True)) == {
+        recent.id,
+        live.id,
+    }
+    archived = set(WishlistArchive.objects.values_list("wishlist_id", flat=True))
+    assert archived == ({item.id for item in old} if mode == VACUUM_ARCHIVE else set())
+
+
+@pytest.mark.django_db
+def test_vacuum_wishlist_command():
+    WishlistFactory(
+        user_id=UserFactory().id, deleted_at=timezone.now() - timedelta(days=90)
+    )
+    out = StringIO()
+    call_command("vacuum_wishlist", "--sleep", "0", stdout=out)
+    assert "Vacuumed 1 tombstone(s) (purge)" in out.getvalue()
+    assert not Wishlist.all_objects.exists()
+
+
+@pytest.mark.django_db
+def test_vacuum_wishlist_command_keeps_tombstones_sync_may_need(settings):
+    settings.WISHLIST_TOMBSTONE_RETENTION_DAYS = 30
+    WishlistFactory(
+        user_id=UserFactory().id, deleted_at=timezone.now() - timedelta(days=10)
+    )
+    with pytest.raises(CommandError, match="at least 30"):
+        call_command("vacuum_wishlist", "--retention-days", "7", stdout=StringIO())
+    assert Wishlist.all_objects.exists()
+
+
+@pytest.mark.django_db
+def test_default_manager_returns_live_rows():
+    user = UserFactory()
+    live = WishlistFactory(user_id=user.id)
+    dead = WishlistFactory(user_id=user.id, deleted_at=timezone.now())
+
+    assert list(Wishlist.objects.filter(user=user)) == [live]
+    assert list(Wishlist.objects.dead()) == [dead]
+    assert set(Wishlist.objects.with_deleted()) == {live, dead}
+    assert list(Wishlist.all_objects.alive()) == [live]
+    # Related managers follow the default manager.
+    assert list(user.wishlist_set.all()) == [live]
+
+    # The admin lists tombstones too, in the admin's ordering.
+    admin_user = UserFactory(is_staff=True, is_superuser=True)
+    request = RequestFactory().get("/admin/wishlist/wishlist/")
+    request.user = admin_user
+    model_admin = WishlistAdmin(Wishlist, admin.site)
+    with patch.object(WishlistAdmin, "ordering", ["id"]):
+        assert list(model_admin.get_queryset(request)) == [live, dead]
+    with patch.object(WishlistAdmin, "ordering", ["-id"]):
+        assert list(model_admin.get_queryset(request)) == [dead, live]
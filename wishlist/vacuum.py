@@ -0,0 +1,97 @@
+import logging
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from wishlist.models import Wishlist, WishlistArchive
+
+logger = logging.getLogger(__name__)
+
+VACUUM_PURGE = "purge"
+VACUUM_ARCHIVE = "archive"
+
+_archived_fields = [
+    "id",
+    "user_id",
+    "watch_id",
+    "created_at",
+    "updated_at",
+    "deleted_at",
+]
+
+
+@dataclass
+class VacuumStats:
+    batches: int = 0
+    rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def vacuum_wishlist(
+    cutoff, mode=VACUUM_PURGE, batch_size=500, sleep=0.1, progress=None
+):
+    """Purge or archive wishlist tombstones cancelled before ``cutoff``.
+
+    Rows are walked by primary key in batches of ``batch_size``; each batch
+    is locked, archived if asked and deleted in its own short transaction,
+    and the job sleeps ``sleep`` seconds between batches so it never holds
+    locks for long nor saturates the database.
+
+    :param progress: called with the running VacuumStats after each batch
+    :return: VacuumStats
+    """
+    stats = VacuumStats()
+    started = time.perf_counter()
+    last_pk = 0
+    while True:
+        pks = list(
+            Wishlist.objects.dead()
+            .filter(pk__gt=last_pk, deleted_at__lt=cutoff)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        last_pk = pks[-1]
+        with transaction.atomic():
+            # Re-check under lock: an item may have been added back since.
+            rows = list(
+                Wishlist.objects.dead()
+                .select_for_update()
+                .filter(pk__in=pks, deleted_at__lt=cutoff)
+                .values(*_archived_fields)
+            )
+            if mode == VACUUM_ARCHIVE:
+                WishlistArchive.objects.bulk_create(
+                    [
+                        WishlistArchive(
+                            wishlist_id=row["id"],
+                            **{name: row[name] for name in _archived_fields[1:]},
+                        )
+                        for row in rows
+                    ]
+                )
+            deleted, _ = Wishlist.all_objects.filter(
+                pk__in=[row["id"] for row in rows]
+            ).delete()
+        stats.batches += 1
+        stats.rows += deleted
+        stats.elapsed = time.perf_counter() - started
+        if progress:
+            progress(stats)
+        if len(pks) < batch_size:
+            break
+        time.sleep(sleep)
+    stats.elapsed = time.perf_counter() - started
+    logger.info(
+        "Vacuumed %d wishlist tombstones (%s) in %.1fs",
+        stats.rows,
+        mode,
+        stats.elapsed,
+    )
+    return stats
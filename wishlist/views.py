@@ -1,22 +1,22 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
 
 from django.core.exceptions import ObjectDoesNotExist
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
 from rest_framework import mixins, status
-from rest_framework.authentication import (
-    SessionAuthentication,
-    TokenAuthentication,
-    BasicAuthentication,
-)
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from utils.mixins import CustomCreateModelMixin
-from utils.pagination import CustomPagination
+from utils.mixins import CustomCreateModelMixin, DeltaSyncMixin
+from utils.pagination import KeysetPagination
+from utils.upsert import upsert
+from wishlist.bulk import bulk_add, bulk_cancel
+from wishlist.cache import favorite_watch_ids, invalidate_favorites
 from wishlist.models import Wishlist
 from wishlist.schemas import (
     list_schema_info,
@@ -24,15 +24,19 @@ from wishlist.schemas import (
     destroy_schema_info,
     add_schema_info,
     favorite_status_schema_info,
+    favorite_status_batch_schema_info,
     my_own_schema_info,
     cancel_schema_info,
+    bulk_add_schema_info,
+    bulk_cancel_schema_info,
 )
 from wishlist.serializers.models import WishlistSerializer
 from wishlist.serializers.serializers import (
     WishlistAddRequestSerializer,
     FavoriteStatusRequestSerializer,
-    FavoriteStatusResponseSerializer,
+    FavoriteStatusBatchRequestSerializer,
     WishlistCancelRequestSerializer,
+    WishlistBulkRequestSerializer,
 )
 from wristcheck_api.constants import USUAL_ORDERING_FIELDS, USUAL_ORDERING
 from utils.permission import CustomGetPermissionMixin, IsOwnerOrAdminUser
@@ -41,6 +45,7 @@ from utils.permission import CustomGetPermissionMixin, IsOwnerOrAdminUser
 class WishlistViewSet(
     CustomGetPermissionMixin,
     CustomCreateModelMixin,
+    DeltaSyncMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     mixins.ListModelMixin,
@@ -48,11 +53,6 @@ class WishlistViewSet(
 ):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
-    authentication_classes = (
-        BasicAuthentication,
-        SessionAuthentication,
-        TokenAuthentication,
-    )
     permission_classes = [IsAuthenticated]
     permission_classes_map = {
         "list": [IsAdminUser],
@@ -60,41 +60,66 @@ class WishlistViewSet(
         "destroy": [IsOwnerOrAdminUser],
         "add": [IsAuthenticated],
         "cancel": [IsAuthenticated],
+        "bulk_add": [IsAuthenticated],
+        "bulk_cancel": [IsAuthenticated],
         "my_own": [IsAuthenticated],
         "favorite_status": [IsAuthenticated],
     }
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ["watch_id", "user_id"]
     search_fields = ["watch_id", "user__name"]
     ordering_fields = USUAL_ORDERING_FIELDS
     ordering = USUAL_ORDERING
+    sync_tombstone_field = "deleted_at"
+
+    def get_queryset(self):
+        if self.action == "destroy":
+            # Admins and owners may also remove cancelled items for good.
+            return Wishlist.objects.with_deleted()
+        return super().get_queryset()
 
     @extend_schema(**list_schema_info)
     def list(self, request, *args, **kwargs):
-        self.queryset = self.get_queryset().filter(deleted_at__isnull=True)
         return super().list(request, *args, **kwargs)
 
     @extend_schema(**retrieve_schema_info)
     def retrieve(self, request, *args, **kwargs):
-        self.queryset = self.get_queryset().filter(deleted_at__isnull=True)
         return super().retrieve(request, *args, **kwargs)
 
     @extend_schema(**destroy_schema_info)
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
 
+    def get_sync_max_age(self):
+        return timedelta(days=settings.WISHLIST_TOMBSTONE_RETENTION_DAYS)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_favorites(instance.user_id)
+
     @extend_schema(**add_schema_info)
     @action(methods=["POST"], detail=False)
     def add(self, request, *args, **kwargs):
         serializer = WishlistAddRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        wishlist_item, created = Wishlist.objects.get_or_create(
-            user=request.user, watch_id=request.data["watch_id"]
+        now = datetime.now(timezone.utc)
+        [wishlist_item] = upsert(
+            Wishlist,
+            [
+                dict(
+                    user_id=request.user.id,
+                    watch_id=serializer.validated_data["watch_id"],
+                    deleted_at=None,
+                    created_at=now,
+                    updated_at=now,
+                )
+            ],
+            unique_fields=["user_id", "watch_id"],
+            update_fields=["deleted_at", "updated_at"],
+            returning=True,
         )
-        if not created:
-            wishlist_item.deleted_at = None
-            wishlist_item.save()
+        invalidate_favorites(request.user.id)
 
         serializer = self.get_serializer(wishlist_item)
         headers = self.get_success_headers(serializer.data)
@@ -109,12 +134,13 @@ class WishlistViewSet(
         serializer.is_valid(raise_exception=True)
 
         try:
-            wishlist_item = Wishlist.objects.get(
+            wishlist_item = Wishlist.objects.with_deleted().get(
                 user=request.user,
                 watch_id=serializer.validated_data.get("watch_id"),
             )
             wishlist_item.deleted_at = datetime.now(timezone.utc)
             wishlist_item.save()
+            invalidate_favorites(request.user.id)
         except ObjectDoesNotExist:
             return Response(
                 {"detail": "the wishlist item is not found"},
@@ -125,20 +151,43 @@ class WishlistViewSet(
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_200_OK, headers=headers)
 
+    @extend_schema(**bulk_add_schema_info)
+    @action(methods=["POST"], detail=False)
+    def bulk_add(self, request, *args, **kwargs):
+        serializer = WishlistBulkRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_add(request.user.id, serializer.validated_data["watch_ids"])
+        return Response(
+            [{"watch_id": watch_id, "result": result} for watch_id, result in results],
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(**bulk_cancel_schema_info)
+    @action(methods=["POST"], detail=False)
+    def bulk_cancel(self, request, *args, **kwargs):
+        serializer = WishlistBulkRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = bulk_cancel(request.user.id, serializer.validated_data["watch_ids"])
+        return Response(
+            [{"watch_id": watch_id, "result": result} for watch_id, result in results],
+            status=status.HTTP_200_OK,
+        )
+
     @extend_schema(**my_own_schema_info)
     @action(methods=["GET"], detail=False)
     def my_own(self, request):
-        self.queryset = (
-            self.get_queryset()
-            .filter(user=request.user)
-            .filter(deleted_at__isnull=True)
-        )
+        if self.is_sync_request(request):
+            return self.sync_response(
+                request, Wishlist.objects.with_deleted().filter(user=request.user)
+            )
+        self.queryset = self.get_queryset().filter(user=request.user)
         return self.list(request)
 
-    @extend_schema(**favorite_status_schema_info)
+    @extend_schema(methods=["GET"], **favorite_status_schema_info)
+    @extend_schema(methods=["POST"], **favorite_status_batch_schema_info)
     @action(
         detail=False,
-        methods=["get"],
+        methods=["get", "post"],
         url_path="favorite_status",
         pagination_class=None,
         filter_backends=[DjangoFilterBackend],
@@ -148,30 +197,22 @@ class WishlistViewSet(
     def favorite_status(self, request):
         """Usage scenario: Browse the recent page to display the favorite status of the watch
         example: GET /wishlist/favorite_status/?watch_ids=1&watch_ids=2
+        or, for long pages: POST /wishlist/favorite_status/ {"watch_ids": ["1", "2"]}
         """
-        serializer = FavoriteStatusRequestSerializer(data=request.query_params)
-        serializer.is_valid(raise_exception=True)
-        watch_ids = serializer.validated_data["watch_ids"]
-
-        self.queryset = (
-            self.get_queryset()
-            .filter(user=request.user)
-            .filter(watch_id__in=watch_ids)
-            .filter(deleted_at__isnull=True)
-        )
-        wishlist_serializer = self.get_serializer(self.queryset, many=True)
-        wishlists = wishlist_serializer.data
-        wishlist_ids = [wishlist["watch_id"] for wishlist in wishlists]
-
-        formated_data = []
-        for watch_id in watch_ids:
-            favorite = False
-            if watch_id in wishlist_ids:
-                favorite = True
-            formated_data.append({"watch_id": watch_id, "favorite": favorite})
-
-        response_serializer = FavoriteStatusResponseSerializer(
-            data=formated_data, many=True
+        if request.method == "POST":
+            serializer = FavoriteStatusBatchRequestSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            watch_ids = list(dict.fromkeys(serializer.validated_data["watch_ids"]))
+        else:
+            serializer = FavoriteStatusRequestSerializer(data=request.query_params)
+            serializer.is_valid(raise_exception=True)
+            watch_ids = serializer.validated_data["watch_ids"]
+
+        favorites = favorite_watch_ids(request.user.id, watch_ids)
+        return Response(
+            [
+                {"watch_id": watch_id, "favorite": watch_id in favorites}
+                for watch_id in watch_ids
+            ],
+            status=status.HTTP_200_OK,
         )
-        response_serializer.is_valid(raise_exception=True)
-        return Response(response_serializer.validated_data, status=status.HTTP_200_OK)
@@ -4,3 +4,13 @@ USUAL_ORDERING = ["-updated_at"]
 DEFAULT_PAGE_SIZE = 10
 DEFAULT_MAX_PAGE_SIZE = 100
 DEFAULT_PAGE_SIZE_QUERY_PARAM = "page_size"
+DEFAULT_CURSOR_QUERY_PARAM = "cursor"
+DEFAULT_SYNC_QUERY_PARAM = "since"
+# Delta sync leaves out rows changed in the last seconds, so that a slower
+# concurrent transaction can not commit behind an already issued sync token.
+DEFAULT_SYNC_SETTLE_SECONDS = 2
+
+DEFAULT_MAX_BATCH_SIZE = 500
+DEFAULT_MAX_FAVORITE_STATUS_IDS = 5000
+# Long IN lists get poor plans on MySQL; larger lookups are split in chunks.
+DEFAULT_IN_CHUNK_SIZE = 500
@@ -1,9 +1,36 @@
 from django.db import models
 
 
+class SoftDeletedQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def dead(self):
+        return self.filter(deleted_at__isnull=False)
+
+
+class SoftDeletedManager(models.Manager.from_queryset(SoftDeletedQuerySet)):
+    """
+    Default manager of soft deleted models: only returns live rows.
+    Use ``with_deleted()`` or ``dead()`` to reach the tombstones.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().alive()
+
+    def with_deleted(self):
+        return SoftDeletedQuerySet(self.model, using=self._db)
+
+    def dead(self):
+        return self.with_deleted().dead()
+
+
 class SoftDeletedModel(models.Model):
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = SoftDeletedManager()
+    all_objects = SoftDeletedQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     "drf_spectacular",
     "wishlist.apps.WishlistConfig",
     "track.apps.TrackConfig",
+    "utils",
 ]
 
 MIDDLEWARE = [
@@ -122,9 +123,26 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # A file (rather than the shared in-memory default) lets concurrent
+            # test threads wait on the busy timeout instead of failing with
+            # "database table is locked".
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
+# Cache
+# The default is per process; point it at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) when running several workers,
+# so that cache invalidations reach all of them.
+CACHES = {
+    "default": {
+        "BACKEND": env.str(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env.str("CACHE_LOCATION", ""),
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -171,10 +189,12 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django Rest Framework
 # https://www.django-rest-framework.org/
 REST_FRAMEWORK = {
+    # Token first: each class only handles its own Authorization scheme, and
+    # the first one decides the 401 challenge.
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.BasicAuthentication",
+        "account.authentication.SignedTokenAuthentication",
+        "account.authentication.CachedBasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.AllowAny",
@@ -255,3 +275,107 @@ OSS_ACCESS_KEY_ID = env.str("OSS_ACCESS_KEY_ID")
 OSS_ACCESS_KEY_SECRET = env.str("OSS_ACCESS_KEY_SECRET")
 OSS_ENDPOINT = env.str("OSS_ENDPOINT")
 OSS_BUCKET = env.str("OSS_BUCKET")
+OSS_POOL_SIZE = env.int("OSS_POOL_SIZE", 10)
+OSS_CONNECT_TIMEOUT = env.float("OSS_CONNECT_TIMEOUT", 10.0)
+# Object storage behind OSSManager: "oss", "local" (files under STORAGE_LOCAL_ROOT,
+# for development) or "memory". Objects over STORAGE_MULTIPART_THRESHOLD bytes
+# and streams are uploaded in parts of STORAGE_PART_SIZE bytes.
+STORAGE_BACKEND = env.str("STORAGE_BACKEND", "oss")
+STORAGE_LOCAL_ROOT = env.str("STORAGE_LOCAL_ROOT", str(BASE_DIR / "storage"))
+STORAGE_MULTIPART_THRESHOLD = env.int("STORAGE_MULTIPART_THRESHOLD", 10 * 1024 * 1024)
+STORAGE_PART_SIZE = env.int("STORAGE_PART_SIZE", 5 * 1024 * 1024)
+# Public domain serving the bucket; object keys are appended to it.
+STATIC_DOMAIN = env.str("STATIC_DOMAIN", "")
+# WeChat avatars are stored in OSS as thumbnails in the background by AVATAR_INGEST_WORKERS
+# threads per process, with at most AVATAR_INGEST_MAX_PENDING queued. A download
+# may take AVATAR_DOWNLOAD_TIMEOUT seconds and AVATAR_MAX_BYTES bytes; transient
+# failures are retried AVATAR_INGEST_RETRIES times with exponential backoff, and
+# an avatar is given up after AVATAR_INGEST_MAX_ATTEMPTS failed attempts in total.
+AVATAR_INGEST_WORKERS = env.int("AVATAR_INGEST_WORKERS", 4)
+AVATAR_INGEST_MAX_PENDING = env.int("AVATAR_INGEST_MAX_PENDING", 100)
+AVATAR_DOWNLOAD_TIMEOUT = env.float("AVATAR_DOWNLOAD_TIMEOUT", 10.0)
+AVATAR_MAX_BYTES = env.int("AVATAR_MAX_BYTES", 5 * 1024 * 1024)
+AVATAR_INGEST_RETRIES = env.int("AVATAR_INGEST_RETRIES", 2)
+AVATAR_INGEST_RETRY_DELAY = env.float("AVATAR_INGEST_RETRY_DELAY", 1.0)
+AVATAR_INGEST_MAX_ATTEMPTS = env.int("AVATAR_INGEST_MAX_ATTEMPTS", 10)
+# Also store WebP thumbnails next to the JPEG ones.
+AVATAR_WEBP = env.bool("AVATAR_WEBP", False)
+
+# Track
+# "write_through" saves every visit in the request, "buffered" collects visits
+# in process and flushes them as bulk writes on a size or time trigger.
+TRACK_VISIT_INGEST_MODE = env.str("TRACK_VISIT_INGEST_MODE", "write_through")
+TRACK_VISIT_BUFFER_SIZE = env.int("TRACK_VISIT_BUFFER_SIZE", 500)
+TRACK_VISIT_FLUSH_INTERVAL = env.float("TRACK_VISIT_FLUSH_INTERVAL", 5.0)
+TRACK_VISIT_SHUTDOWN_FLUSH_TIMEOUT = env.float(
+    "TRACK_VISIT_SHUTDOWN_FLUSH_TIMEOUT", 10.0
+)
+# Append-only visit events are stored in one table per "day" or "month"
+# (native partitions on PostgreSQL); partitions older than the retention are dropped.
+TRACK_VISIT_EVENT_PARTITION = env.str("TRACK_VISIT_EVENT_PARTITION", "month")
+TRACK_VISIT_EVENT_RETENTION_DAYS = env.int("TRACK_VISIT_EVENT_RETENTION_DAYS", 90)
+# Trending watches are counted in process with count-min sketches of
+# width x depth counters per time bucket, keeping at most TRACK_TRENDING_CANDIDATES
+# heavy hitters per bucket. Responses are cached for TRACK_TRENDING_CACHE_TTL seconds.
+TRACK_TRENDING_SKETCH_WIDTH = env.int("TRACK_TRENDING_SKETCH_WIDTH", 2048)
+TRACK_TRENDING_SKETCH_DEPTH = env.int("TRACK_TRENDING_SKETCH_DEPTH", 4)
+TRACK_TRENDING_CANDIDATES = env.int("TRACK_TRENDING_CANDIDATES", 100)
+TRACK_TRENDING_CACHE_TTL = env.int("TRACK_TRENDING_CACHE_TTL", 30)
+
+# Wishlist
+# Each user's favorite watch ids are cached as a set for favorite_status in the
+# WISHLIST_FAVORITES_CACHE_ALIAS cache; wishlists larger than the max size are not
+# cached. The cache is only used when that alias is shared by all workers (e.g.
+# Redis or Memcached, not the default LocMemCache), since invalidations would not
+# reach the other workers. A TTL of 0 disables it.
+WISHLIST_FAVORITES_CACHE_TTL = env.int("WISHLIST_FAVORITES_CACHE_TTL", 300)
+WISHLIST_FAVORITES_CACHE_ALIAS = env.str("WISHLIST_FAVORITES_CACHE_ALIAS", "default")
+WISHLIST_FAVORITES_CACHE_MAX_SIZE = env.int("WISHLIST_FAVORITES_CACHE_MAX_SIZE", 1000)
+# Cancelled items are kept this long before the vacuum job removes them;
+# delta sync tokens older than this are refused.
+WISHLIST_TOMBSTONE_RETENTION_DAYS = env.int("WISHLIST_TOMBSTONE_RETENTION_DAYS", 30)
+
+# Outbound HTTP
+# Calls to WeChat and the WristCheck API share pooled keep-alive sessions per host
+# with (connect, read) timeouts in seconds and bounded retries with exponential
+# backoff. After HTTP_CLIENT_BREAKER_FAILURES consecutive failures a host is not
+# called for HTTP_CLIENT_BREAKER_RESET_TIMEOUT seconds.
+HTTP_CLIENT_CONNECT_TIMEOUT = env.float("HTTP_CLIENT_CONNECT_TIMEOUT", 3.05)
+HTTP_CLIENT_READ_TIMEOUT = env.float("HTTP_CLIENT_READ_TIMEOUT", 5.0)
+HTTP_CLIENT_RETRIES = env.int("HTTP_CLIENT_RETRIES", 2)
+HTTP_CLIENT_BACKOFF_FACTOR = env.float("HTTP_CLIENT_BACKOFF_FACTOR", 0.2)
+HTTP_CLIENT_POOL_SIZE = env.int("HTTP_CLIENT_POOL_SIZE", 10)
+HTTP_CLIENT_BREAKER_FAILURES = env.int("HTTP_CLIENT_BREAKER_FAILURES", 5)
+HTTP_CLIENT_BREAKER_RESET_TIMEOUT = env.float("HTTP_CLIENT_BREAKER_RESET_TIMEOUT", 30.0)
+
+# Auth cache
+# Tokens and users of CachedTokenAuthentication are kept in an in-process LRU of
+# AUTH_CACHE_SIZE entries for AUTH_CACHE_LOCAL_TTL seconds. Saves and deletes
+# invalidate entries through signals, but only in the process that made them:
+# other workers keep authenticating a deactivated user, a deleted token or a
+# revoked signed token for up to AUTH_CACHE_LOCAL_TTL seconds, which is the
+# staleness bound. Keep it short.
+# The optional shared tier keeps entries in the AUTH_CACHE_ALIAS cache for
+# AUTH_CACHE_SHARED_TTL seconds (0, the default, disables it). It is only used
+# when that alias is shared by all workers (e.g. Redis or Memcached), so that
+# invalidations clear it everywhere. Bulk updates that bypass signals are seen
+# after both TTLs.
+AUTH_CACHE_SIZE = env.int("AUTH_CACHE_SIZE", 10000)
+AUTH_CACHE_LOCAL_TTL = env.float("AUTH_CACHE_LOCAL_TTL", 5.0)
+AUTH_CACHE_SHARED_TTL = env.int("AUTH_CACHE_SHARED_TTL", 0)
+AUTH_CACHE_ALIAS = env.str("AUTH_CACHE_ALIAS", "default")
+# Basic credentials verified recently are remembered in process only, keyed by an
+# HMAC, so Basic clients do not pay a password hash on every request.
+AUTH_BASIC_CACHE_SIZE = env.int("AUTH_BASIC_CACHE_SIZE", 1000)
+AUTH_BASIC_CACHE_TTL = env.float("AUTH_BASIC_CACHE_TTL", 300.0)
+
+# Access tokens
+# "db" issues rest_framework.authtoken tokens, "signed" issues stateless signed
+# tokens valid for AUTH_SIGNED_TOKEN_TTL seconds, and "both" issues signed tokens
+# while still accepting database ones. Signed tokens can be refreshed until
+# AUTH_SIGNED_TOKEN_REFRESH_TTL seconds after the login they descend from.
+AUTH_TOKEN_FORMAT = env.str("AUTH_TOKEN_FORMAT", "db")
+AUTH_SIGNED_TOKEN_TTL = env.int("AUTH_SIGNED_TOKEN_TTL", 24 * 60 * 60)
+AUTH_SIGNED_TOKEN_REFRESH_TTL = env.int(
+    "AUTH_SIGNED_TOKEN_REFRESH_TTL", 14 * 24 * 60 * 60
+)